@@ -0,0 +1,143 @@
+"""
+Benchmark of results-table rendering: the previous row-wise apply + to_markdown
+path against the vectorized helpers in utils.streamlit_utils.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_table_render [--repeat 5]
+
+Uses synthetic data shaped like a 2,000-athlete race (Race Results page) and a
+500-race athlete history (Athlete Profile page).
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.streamlit_utils import (
+    get_flag, make_athlete_link, make_race_link,
+    athlete_link_column, flag_column, format_int_column, medal_fastest_column,
+    medal_place_column, race_link_column, render_html_table, to_display_strings,
+)
+
+COUNTRIES = ["Germany", "United States", "Australia", "Norway", "France", "Great Britain",
+             "Canada", "New Zealand", "Spain", "Switzerland", "Belgium", "Unknownland"]
+TIME_COLUMNS = {"swim_time": "Swim", "bike_time": "Bike", "run_time": "Run", "overall_time": "Finish Time"}
+
+
+def _fmt_time(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def make_race(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for place in range(1, n_rows + 1):
+        swim, bike, run = rng.uniform(1400, 2400), rng.uniform(7000, 9000), rng.uniform(4000, 6000)
+        rows.append({
+            "athlete_finishing_place": float(place) if rng.random() > 0.05 else np.nan,
+            "athlete_name": f"Athlete {place}",
+            "athlete_slug": f"athlete-{place}",
+            "athlete_country": rng.choice(COUNTRIES),
+            "swim_time": _fmt_time(swim),
+            "bike_time": _fmt_time(bike),
+            "run_time": _fmt_time(run),
+            "overall_time": _fmt_time(swim + bike + run),
+        })
+    return pd.DataFrame(rows)
+
+def make_history(n_races: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    return pd.DataFrame([{
+        "Date": f"20{10 + i % 15}-0{1 + i % 9}-1{i % 10}",
+        "Race": f"Race {i}",
+        "unique_race_id": f"race-{i}",
+        "Strength of Field": rng.uniform(50, 100),
+        "Place": float(rng.randint(1, 40)) if rng.random() > 0.1 else np.nan,
+        "Finish Time": _fmt_time(rng.uniform(12000, 30000)),
+    } for i in range(n_races)])
+
+
+# ── previous implementation ──────────────────────────────────────────────────
+def legacy_race(df: pd.DataFrame) -> str:
+    df = df.copy()
+    highlight = df.copy()
+    for col in TIME_COLUMNS:
+        highlight[col] = pd.to_timedelta(highlight[col], errors="coerce")
+        for i, medal in zip(highlight[col].nsmallest(3).index, ["🥇", "🥈", "🥉"]):
+            df.at[i, col] = f"{medal} {df.at[i, col]}"
+    display = df.rename(columns={"athlete_finishing_place": "Place", "athlete_name": "Athlete",
+                                 "athlete_country": "Country", **TIME_COLUMNS})
+    display["Place"] = display["Place"].apply(lambda x: str(int(x)) if pd.notna(x) else "")
+    for col in display.columns:
+        if col != "Place":
+            display[col] = display[col].apply(lambda x: "" if pd.isna(x) else str(x))
+    display["Athlete"] = display.apply(lambda row: make_athlete_link(row["Athlete"], row["athlete_slug"]), axis=1)
+    display = display.drop(columns=["athlete_slug"])
+    display["Country"] = display["Country"].apply(get_flag)
+    return display.to_markdown(index=False)
+
+def legacy_history(df: pd.DataFrame) -> str:
+    display = df.copy()
+    display["Race"] = display.apply(lambda row: make_race_link(row["Race"], row["unique_race_id"]), axis=1)
+    display = display.drop(columns=["unique_race_id"])
+    display["Place_numeric"] = pd.to_numeric(display["Place"], errors="coerce")
+    display["Place"] = display.apply(lambda row:
+        f"🥇 {int(row['Place_numeric'])}" if row['Place_numeric'] == 1 else
+        f"🥈 {int(row['Place_numeric'])}" if row['Place_numeric'] == 2 else
+        f"🥉 {int(row['Place_numeric'])}" if row['Place_numeric'] == 3 else
+        "❌ DNF" if pd.isna(row['Place_numeric']) else str(row["Place"]), axis=1)
+    display = display.drop(columns=["Place_numeric"])
+    return display.to_markdown(index=False)
+
+
+# ── vectorized implementation ────────────────────────────────────────────────
+def vectorized_race(df: pd.DataFrame) -> str:
+    display = df.rename(columns={"athlete_finishing_place": "Place", "athlete_name": "Athlete",
+                                 "athlete_country": "Country", **TIME_COLUMNS})
+    display["Place"] = format_int_column(display["Place"])
+    for col in display.columns:
+        if col != "Place":
+            display[col] = to_display_strings(display[col])
+    for raw_col, col in TIME_COLUMNS.items():
+        display[col] = medal_fastest_column(display[col], pd.to_timedelta(df[raw_col], errors="coerce"))
+    display["Athlete"] = athlete_link_column(display["Athlete"], df["athlete_slug"])
+    display = display.drop(columns=["athlete_slug"])
+    display["Country"] = flag_column(df["athlete_country"])
+    return render_html_table(display, html_columns=("Athlete", "Country"))
+
+def vectorized_history(df: pd.DataFrame) -> str:
+    display = df.copy()
+    display["Race"] = race_link_column(display["Race"], display["unique_race_id"])
+    display = display.drop(columns=["unique_race_id"])
+    display["Place"] = medal_place_column(display["Place"])
+    return render_html_table(display, html_columns=("Race",))
+
+
+def _time(fn, df: pd.DataFrame, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark results-table rendering.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("2,000-row race", make_race(2000), legacy_race, vectorized_race),
+        ("500-race athlete history", make_history(500), legacy_history, vectorized_history),
+    ]
+    print(f"{'case':<28}{'legacy ms':>12}{'vectorized ms':>16}{'speedup':>10}")
+    for name, df, legacy, vectorized in cases:
+        legacy_ms = _time(legacy, df, args.repeat)
+        vectorized_ms = _time(vectorized, df, args.repeat)
+        print(f"{name:<28}{legacy_ms:>12.1f}{vectorized_ms:>16.1f}{legacy_ms / vectorized_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
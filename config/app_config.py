@@ -16,4 +16,158 @@ BQ_CHATBOT_QUESTION_LOG = "trilytx.trilytx.chatbot_question_log"
 BQ_CHATBOT_VOTE_FEEDBACK = "trilytx.trilytx.chatbot_vote_feedback"
 BQ_RACE_SEARCH_LOG = "trilytx.trilytx.race_search_log"
 BQ_RACE_RECAP_LOG = "trilytx.trilytx.race_recap_generate_log"
-BQ_ATHLETE_SEARCH_LOG = "trilytx.trilytx.athlete_search_log"
\ No newline at end of file
+BQ_ATHLETE_SEARCH_LOG = "trilytx.trilytx.athlete_search_log"
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BigQuery Client Settings
+# ──────────────────────────────────────────────────────────────────────────────
+# Size of the HTTP connection pool behind the shared BigQuery client.
+BQ_HTTP_POOL_CONNECTIONS = 4   # Number of distinct hosts to keep pools for
+BQ_HTTP_POOL_MAXSIZE = 16      # Max keep-alive connections per host
+BQ_QUERY_MAX_WORKERS = 8       # Threads for utils.bq_utils.run_concurrently (shared by all sessions)
+BQ_STORAGE_MIN_ROWS = 10000    # Results with fewer rows are read over REST instead of the Storage Read API
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Query Result Cache (utils.bq_utils.run_bigquery)
+# ──────────────────────────────────────────────────────────────────────────────
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024   # In-memory budget for cached result frames
+QUERY_CACHE_DEFAULT_TTL_SECONDS = 3600     # Used for queries that touch no known table
+# Per-table TTLs, kept well under each table's refresh cadence so a refresh
+# shows up within one TTL. A query uses the smallest TTL of the tables it reads.
+QUERY_CACHE_TABLE_TTL_SECONDS = {
+    "fct_pto_scores_weekly": 24 * 3600,        # Gains a new reporting_week once a week
+    "fct_race_results": 6 * 3600,              # Loaded as races are published
+    "fct_race_results_vs_predict": 6 * 3600,
+    "fct_race_segment_positions": 6 * 3600,
+    "agg_race_predict_vs_results": 6 * 3600,
+    "agg_race_segment_positions": 6 * 3600,
+}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Telemetry Writer (utils.telemetry)
+# ──────────────────────────────────────────────────────────────────────────────
+TELEMETRY_QUEUE_MAX_ROWS = 10000          # Rows beyond this are dropped and counted
+TELEMETRY_BATCH_SIZE = 50                 # Records per spool append / drain batch (all tables mixed; inserts grouped per table)
+TELEMETRY_FLUSH_INTERVAL_SECONDS = 2.0    # Spool a partial batch once its oldest row has waited this long
+TELEMETRY_MAX_RETRIES = 5                 # Insert retries per batch before giving up
+TELEMETRY_BACKOFF_BASE_SECONDS = 0.5      # Backoff doubles after each failed attempt
+# Rows are written to a local append-only spool before being sent to BigQuery,
+# so they survive failed inserts and process restarts. Point this at a
+# persistent volume where one is available.
+TELEMETRY_SPOOL_DIR = ".telemetry_spool"
+TELEMETRY_SPOOL_SEGMENT_BYTES = 4 * 1024 * 1024   # Roll over to a new segment file at this size
+TELEMETRY_SPOOL_MAX_BYTES = 256 * 1024 * 1024     # Undelivered bytes beyond this are dropped
+# Only these tables may receive telemetry rows (including rows replayed from the spool)
+TELEMETRY_TABLES = {
+    BQ_CHATBOT_ERROR_LOG,
+    BQ_CHATBOT_ZERO_RESULT_LOG,
+    BQ_CHATBOT_QUESTION_LOG,
+    BQ_CHATBOT_VOTE_FEEDBACK,
+    BQ_RACE_SEARCH_LOG,
+    BQ_RACE_RECAP_LOG,
+    BQ_ATHLETE_SEARCH_LOG,
+}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chatbot Question -> SQL Cache (utils.question_cache)
+# ──────────────────────────────────────────────────────────────────────────────
+QUESTION_CACHE_SIMILARITY_THRESHOLD = 0.85   # Min Jaccard similarity of normalized question tokens
+QUESTION_CACHE_MAX_ENTRIES = 5000            # LRU capacity
+QUESTION_CACHE_NUM_PERM = 64                 # MinHash permutations
+QUESTION_CACHE_BANDS = 16                    # LSH bands (NUM_PERM must be divisible by this)
+# Optional JSONL/CSV export of BQ_CHATBOT_QUESTION_LOG used to warm the cache at startup.
+# models/ is tracked (data/ is gitignored), so a committed file ships with the git-pushed
+# Heroku deploy. Keep only question, generated_sql, summary and is_follow_up (no user_email).
+QUESTION_CACHE_WARM_START_PATH = "models/chatbot_question_log.jsonl"
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chatbot Table Router (utils.table_router)
+# ──────────────────────────────────────────────────────────────────────────────
+TABLE_ROUTER_MIN_CONFIDENCE = 0.75    # Below this, table selection falls back to GPT
+# Trained weights written by `python -m utils.evaluate_table_router --save`; rules only if missing.
+# Commit the saved file (models/ is tracked) so the Heroku deploy loads it.
+TABLE_ROUTER_MODEL_PATH = "models/table_router_model.json"
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Athlete Name Search (utils.athlete_search)
+# ──────────────────────────────────────────────────────────────────────────────
+ATHLETE_INDEX_REFRESH_SECONDS = 3600   # Rebuild the in-memory name index this often
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Country Flags (utils.country_flags)
+# ──────────────────────────────────────────────────────────────────────────────
+COUNTRY_FLAG_LRU_SIZE = 1024               # Spellings outside the precomputed table, incl. misses
+COUNTRY_FLAG_BUILD_BUDGET_SECONDS = 2.0    # Max time spent precomputing the table at startup
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Race Catalog (utils.race_catalog)
+# ──────────────────────────────────────────────────────────────────────────────
+RACE_CATALOG_REFRESH_SECONDS = 600            # Incrementally refresh recent races this often
+RACE_CATALOG_LOOKBACK_DAYS = 14               # Incremental refresh re-reads races this close to the newest one
+RACE_CATALOG_FULL_REFRESH_SECONDS = 24 * 3600 # Full reload (picks up corrections and deletions)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PTO Score Snapshots (utils.pto_snapshots)
+# ──────────────────────────────────────────────────────────────────────────────
+PTO_SNAPSHOT_DIR = "data/pto_snapshots"   # One Parquet file per reporting_week
+PTO_SNAPSHOT_SYNC_SECONDS = 3600          # Check BigQuery for weeks past the watermark this often
+PTO_SNAPSHOT_WEEK_CACHE_SIZE = 16         # Week frames kept in memory
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Local DuckDB Mirror (utils.local_mirror)
+# ──────────────────────────────────────────────────────────────────────────────
+LOCAL_MIRROR_ENABLED = 0                        # 1 to serve page queries from a local DuckDB copy
+LOCAL_MIRROR_PATH = "data/trilytx_mirror.duckdb"
+LOCAL_MIRROR_SYNC_SECONDS = 6 * 3600            # Re-copy the mirrored tables this often (in the background)
+LOCAL_MIRROR_RETRY_SECONDS = 600                # Minimum gap between sync attempts, e.g. after a failure
+# Tables copied into the mirror; queries touching any other table go to BigQuery
+LOCAL_MIRROR_TABLES = [
+    "trilytx_fct.fct_race_results",
+    "trilytx_fct.fct_race_results_vs_predict",
+    "trilytx_fct.fct_race_segment_positions",
+    "trilytx_fct.fct_pto_scores_weekly",
+    "trilytx_aggregate.agg_race_predict_vs_results",
+    "trilytx_aggregate.agg_race_segment_positions",
+]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Athlete Profile Data (utils.athlete_profile_data)
+# ──────────────────────────────────────────────────────────────────────────────
+ATHLETE_PROFILE_CACHE_MAX_BYTES = 32 * 1024 * 1024   # Shared by all sessions; LRU-evicted beyond this
+ATHLETE_PREFETCH_RECENT_RACES = 3       # Look for linked athletes in this many of the athlete's latest races
+ATHLETE_PREFETCH_PLACE_WINDOW = 2       # ...who finished within this many places of the athlete
+ATHLETE_PREFETCH_MAX_ATHLETES = 10      # Max linked athletes prefetched per profile view
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chatbot SQL Guard (utils.sql_guard)
+# ──────────────────────────────────────────────────────────────────────────────
+SQL_GUARD_MAX_ROWS = 200                             # LIMIT injected into (or lowered on) generated queries
+SQL_GUARD_DRY_RUN_BUDGET_BYTES = 2 * 1024 ** 3       # Dry-run estimate above this is pruned or rejected
+SQL_GUARD_MAX_BYTES_BILLED = 4 * 1024 ** 3           # Hard cap BigQuery enforces on every chatbot job
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Summary Prompt Compaction (utils.result_compaction)
+# ──────────────────────────────────────────────────────────────────────────────
+SUMMARY_RESULT_TOKEN_BUDGET = 4000   # Results larger than this are replaced by aggregates + a sample
+SUMMARY_TOP_K_ROWS = 10              # Leading rows (in the query's ORDER BY) always kept when compacting
+SUMMARY_MAX_CATEGORIES = 20          # Text columns with at most this many distinct values get group counts
+SUMMARY_TOP_CATEGORY_COUNTS = 5      # Group counts listed per such column
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chatbot Question Templates (utils.question_templates)
+# ──────────────────────────────────────────────────────────────────────────────
+QUESTION_TEMPLATE_MIN_ATHLETE_SCORE = 0.9   # Athlete-name match needed to answer without the LLM
+QUESTION_TEMPLATE_MAX_TOP_N = 50            # Largest N accepted by "top N ..." questions
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LLM Gateway (utils.llm_gateway)
+# ──────────────────────────────────────────────────────────────────────────────
+LLM_HTTP_MAX_CONNECTIONS = 20          # Connection pool of the shared OpenAI client
+LLM_HTTP_MAX_KEEPALIVE = 10            # Idle connections kept open for reuse
+LLM_REQUEST_TIMEOUT_SECONDS = 120
+LLM_MAX_RETRIES = 2                    # Client-side retries on connection errors / 429 / 5xx
+LLM_MAX_CONCURRENT_REQUESTS = 8        # In-flight completions per process; callers beyond this queue
+LLM_QUEUE_TIMEOUT_SECONDS = 60         # Give up waiting for a slot after this long
+# Requests per minute allowed per model (sliding window); unlisted models use the default
+LLM_MODEL_REQUESTS_PER_MINUTE = {"gpt-4": 60, "gpt-4o": 120}
+LLM_DEFAULT_REQUESTS_PER_MINUTE = 60
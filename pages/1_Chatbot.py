@@ -20,11 +20,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 import google.cloud.bigquery as bigquery
 
 from config.app_config import USE_LOCAL, BQ_CHATBOT_ERROR_LOG, BQ_CHATBOT_ZERO_RESULT_LOG, BQ_CHATBOT_QUESTION_LOG, BQ_CHATBOT_VOTE_FEEDBACK
-from utils.bq_utils import load_credentials, run_bigquery, extract_table_schema
-from utils.llm_utils import generate_sql_from_question_modular, summarize_results
+from utils.bq_utils import get_credentials, get_bq_client, run_bigquery, extract_table_schema, is_query_result_cached
+from utils.llm_utils import generate_sql_from_question_modular, stream_summarize_results
 from utils.streamlit_utils import log_vote_to_bq, log_chatbot_question_to_bq, log_error_to_bq, log_zero_result_to_bq, get_oauth,init_cookies_and_restore_user
 cookies = init_cookies_and_restore_user()
-from utils.security_utils import is_safe_sql
+from utils.sql_guard import UnsafeSQLError, enforce_dry_run_budget, guard_sql, guarded_job_config
+from utils.question_cache import get_question_cache
+from utils.question_templates import answer_from_template
 from utils.about_the_chatbot import render_about
 
 oauth2, redirect_uri = get_oauth()
@@ -98,7 +100,37 @@ def process_question(question_text: str, is_follow_up: bool, bq_client: bigquery
     summary = ""
     df = pd.DataFrame()
 
-    while st.session_state.query_attempts_count < max_attempts:
+    # Reuse validated SQL from a near-identical earlier question (first attempt only).
+    # Follow-ups depend on the conversation, so they always go to the LLM.
+    question_cache = get_question_cache()
+    active_filters = {
+        "athlete_name": athlete_name,
+        "race_distance": distance_filter,
+        "athlete_gender": gender_filter,
+        "organizer": organizer_filter,
+    }
+    cached_sql = None if is_follow_up else question_cache.lookup(question_text, active_filters)
+    sql_from_cache = False
+    # One entry per attempt: seconds spent generating, dry-running and executing the SQL
+    stage_timings = []
+
+    # Common question shapes ("who won X in 2024", "top 10 runners") are answered from a
+    # parameterized SQL template without calling the LLM. Anything that does not match
+    # exactly, follow-ups and questions with sidebar filters use the LLM pipeline.
+    template_answer = None
+    if not is_follow_up and not any(active_filters.values()):
+        stage_start = time.perf_counter()
+        template_answer = answer_from_template(question_text, bq_client)
+        if template_answer is not None:
+            template_intent, sql, df, summary = template_answer
+            st.session_state.query_attempts_count = 1
+            stage_timings.append({"attempt": 1, "generate_s": 0.0, "dry_run_s": None,
+                                  "execute_s": round(time.perf_counter() - stage_start, 3),
+                                  "estimated_bytes": None, "outcome": f"template:{template_intent}"})
+            st.markdown(summary)
+    st.session_state.last_template_intent = template_answer[0] if template_answer is not None else None
+
+    while template_answer is None and st.session_state.query_attempts_count < max_attempts:
         st.session_state.query_attempts_count += 1
         current_context_for_llm = llm_base_context
 
@@ -112,20 +144,61 @@ def process_question(question_text: str, is_follow_up: bool, bq_client: bigquery
             )
             current_context_for_llm += "Please revise the SQL to avoid these issues. Do not use columns or aliases not listed in the 'Important columns' section of the prompt, and ensure joins and filters are valid given the context."
 
+        timing = {"attempt": st.session_state.query_attempts_count, "generate_s": 0.0, "dry_run_s": None,
+                  "execute_s": None, "estimated_bytes": None, "outcome": ""}
+        stage_timings.append(timing)
         try:
-            sql = generate_sql_from_question_modular(current_context_for_llm, openai_key)
-
-            if not is_safe_sql(sql):
-                error_str = "Unsafe SQL detected. Execution blocked."
+            stage_start = time.perf_counter()
+            if cached_sql:
+                sql, cached_sql, sql_from_cache = cached_sql, None, True
+            else:
+                sql = generate_sql_from_question_modular(current_context_for_llm, openai_key, route_question=question_text)
+                sql_from_cache = False
+            timing["generate_s"] = round(time.perf_counter() - stage_start, 3)
+
+            # Parse the SQL: only a single SELECT may run, and its result rows are capped
+            try:
+                sql = guard_sql(sql)
+            except UnsafeSQLError as unsafe_error:
+                if sql_from_cache:
+                    # Drop the cached entry and generate fresh SQL instead of blocking the answer
+                    question_cache.invalidate(question_text, active_filters)
+                    timing["outcome"] = "cached_sql_blocked"
+                    continue
+                error_str = f"Unsafe SQL detected. Execution blocked. {unsafe_error}"
                 st.error(f"🚫 {error_str}")
                 log_error_to_bq(bq_client, BQ_CHATBOT_ERROR_LOG, question_text, sql, error_str, st.session_state.query_attempts_count)
-                summary = f"🚫 **Query blocked for safety**\n\n**Your question:** {question_text}\n\n**Reason:** Unsafe SQL detected."
+                summary = f"🚫 **Query blocked for safety**\n\n**Your question:** {question_text}\n\n**Reason:** {unsafe_error}"
                 df = pd.DataFrame()
+                timing["outcome"] = "blocked"
                 break
 
-            df = run_bigquery(sql, bq_client)
+            # Validate with a free dry run first so broken SQL goes back to the
+            # generator without paying for a real job (skipped when cached).
+            # Over-budget queries are pruned to core columns or sent back too.
+            if not is_query_result_cached(sql, guarded_job_config()):
+                stage_start = time.perf_counter()
+                try:
+                    sql, timing["estimated_bytes"] = enforce_dry_run_budget(sql, bq_client)
+                except Exception:
+                    timing["outcome"] = "dry_run_error"
+                    raise
+                finally:
+                    timing["dry_run_s"] = round(time.perf_counter() - stage_start, 3)
+
+            stage_start = time.perf_counter()
+            try:
+                df = run_bigquery(sql, bq_client, guarded_job_config())
+            except Exception:
+                timing["outcome"] = "execution_error"
+                raise
+            finally:
+                timing["execute_s"] = round(time.perf_counter() - stage_start, 3)
 
             if df.empty:
+                timing["outcome"] = "zero_rows"
+                if sql_from_cache:
+                    question_cache.invalidate(question_text, active_filters)
                 zero_result_history.append(f"[Attempt {st.session_state.query_attempts_count}] {sql}")
                 log_zero_result_to_bq(bq_client, BQ_CHATBOT_ZERO_RESULT_LOG, question_text, sql, st.session_state.query_attempts_count)
                 st.warning(f"Attempt {st.session_state.query_attempts_count} returned no results. Retrying...")
@@ -138,10 +211,17 @@ def process_question(question_text: str, is_follow_up: bool, bq_client: bigquery
                     )
                     break
                 continue
+            if not is_follow_up and not sql_from_cache:
+                question_cache.add(question_text, sql, active_filters)
+            timing["outcome"] = "ok"
             break # Exit loop on success with results
 
         except Exception as bq_error:
             error_str = str(bq_error)
+            if sql_from_cache:
+                # Stale or broken cached SQL must not be served to the next similar question
+                question_cache.invalidate(question_text, active_filters)
+            timing["outcome"] = timing["outcome"] or "generation_error"
             error_history.append(
                 f"[Attempt {st.session_state.query_attempts_count}]\nSQL:\n{sql}\nError:\n{error_str}"
             )
@@ -169,9 +249,14 @@ def process_question(question_text: str, is_follow_up: bool, bq_client: bigquery
                     f"- Relaxing filters like country, gender, or birth year\n"
                 )
         else:
-            summary = summarize_results(df, openai_key, question_text,
+            summary_stream = stream_summarize_results(df, openai_key, question_text,
                             conversational_history=st.session_state.history[-2:],  # last 2 turns (Q, A, SQL),
                             generated_sql=sql)
+            try:
+                summary = st.write_stream(summary_stream).strip()
+            finally:
+                # Stops the OpenAI stream if the user navigates away mid-answer
+                summary_stream.close()
 
     # Update session state with the result of the current processing
     st.session_state.last_duration_seconds = round(time.time() - start_time)
@@ -180,6 +265,8 @@ def process_question(question_text: str, is_follow_up: bool, bq_client: bigquery
     st.session_state.last_summary = summary
     st.session_state.last_df = df
     st.session_state.last_sql = sql
+    st.session_state.last_sql_from_cache = sql_from_cache
+    st.session_state.last_stage_timings = stage_timings
     st.session_state.last_question_was_follow_up = is_follow_up # Track if this question was a follow-up
 
     # Log interaction
@@ -215,8 +302,8 @@ def main():
     st.markdown("Ask a question about triathlon race data.")
     # st.write(f"DEBUG: Streamlit Version: {st.__version__}") # <--- ADD THIS LINE HERE
 
-    credentials, project_id, openai_key = load_credentials(USE_LOCAL)
-    bq_client = bigquery.Client(credentials=credentials, project=project_id)
+    _, _, openai_key = get_credentials()
+    bq_client = get_bq_client()
 
     # ───────────────────────────────
     # Session State Initialization
@@ -331,7 +418,15 @@ def main():
 
             query_attempts_display = st.session_state.query_attempts_count
             duration_display = st.session_state.last_duration_seconds
-            st.caption(f"🕒 Answer generated in {query_attempts_display} query attempt{'s' if query_attempts_display > 1 else ''} and {duration_display} seconds.")
+            cache_note = " (reused SQL from a similar earlier question)" if st.session_state.get("last_sql_from_cache") else ""
+            if st.session_state.get("last_template_intent"):
+                cache_note = " (answered from a question template, without the LLM)"
+            st.caption(f"🕒 Answer generated in {query_attempts_display} query attempt{'s' if query_attempts_display > 1 else ''} and {duration_display} seconds{cache_note}.")
+            stage_timings = st.session_state.get("last_stage_timings") or []
+            if stage_timings:
+                caught = sum(1 for t in stage_timings if t["outcome"] == "dry_run_error")
+                with st.expander(f"⏱️ Stage timings ({caught} broken quer{'y' if caught == 1 else 'ies'} caught by dry run before execution)"):
+                    st.dataframe(pd.DataFrame(stage_timings), hide_index=True)
 
             if not st.session_state.last_df.empty and len(st.session_state.last_df) > 7:
                 st.warning(f"Displaying {len(st.session_state.last_df)} rows. This table is large - Trilytx sometimes has trouble parsing larger datasets. Please consider refining your question.")
@@ -8,36 +8,29 @@ st.title("🏁 Race Results Viewer")
 # Imports
 import pandas as pd
 from google.cloud import bigquery
-from utils.bq_utils import load_credentials
+from utils.bq_utils import get_bq_client, fetch_dataframe, run_concurrently
 from config.app_config import USE_LOCAL, BQ_RACE_SEARCH_LOG, BQ_RACE_RECAP_LOG
-from utils.generate_race_recaps import generate_race_recap_for_id
-from utils.streamlit_utils import log_race_search, log_race_recap_generate, make_athlete_link,get_oauth, get_flag,init_cookies_and_restore_user
+from utils.generate_race_recaps import stream_race_recap_for_id
+from utils.race_catalog import get_race_catalog
+from utils.streamlit_utils import (
+    log_race_search, log_race_recap_generate, get_oauth, init_cookies_and_restore_user,
+    athlete_link_column, flag_column, format_int_column, medal_fastest_column, render_html_table, to_display_strings,
+)
 cookies = init_cookies_and_restore_user()
 import json
 oauth2, redirect_uri = get_oauth()
 
 
 # Load credentials and BigQuery client
-credentials, project_id, _ = load_credentials(USE_LOCAL)
-bq_client = bigquery.Client(credentials=credentials, project=project_id)
+bq_client = get_bq_client()
 # Handle incoming ?unique_race_id=... query param
 query_params = st.query_params
 if "unique_race_id" in query_params:
     st.session_state.selected_race_id = query_params["unique_race_id"]
 
     # Optional: lookup label for display
-    @st.cache_data(ttl=3600)
-    def get_race_label_map():
-        query = """
-        SELECT DISTINCT unique_race_id,
-            CONCAT(initcap(organizer), ' ', cleaned_race_name, ' ', initcap(race_gender), ' (', CAST(race_date AS STRING), ')') AS label
-        FROM `trilytx.trilytx_fct.fct_race_results`
-        """
-        df = bq_client.query(query).to_dataframe()
-        return {row["unique_race_id"]: row["label"] for _, row in df.iterrows()}
-
-    race_label_map = get_race_label_map()
-    st.session_state.selected_race_label = race_label_map.get(st.session_state.selected_race_id, "Selected Race")
+    race_label = get_race_catalog(bq_client).label(st.session_state.selected_race_id)
+    st.session_state.selected_race_label = race_label or "Selected Race"
     st.session_state.load_results_clicked = True
 
 
@@ -84,44 +77,8 @@ with st.sidebar:
             "year": None if race_year_filter == "All" else race_year_filter
         }
 
-        # Fetch races only when Search is clicked
-        query = """
-        SELECT DISTINCT
-            unique_race_id,
-            initcap(organizer) as organizer,
-            cleaned_race_name,
-            race_date,
-            DATE_TRUNC(race_date, YEAR) AS race_year,
-            initcap(race_gender) as race_gender,
-            race_distance
-        FROM `trilytx.trilytx_fct.fct_race_results`
-        WHERE unique_race_id IS NOT NULL
-        """
-        filters = []
-        params = []
-
-        if st.session_state.filters_applied["organizer"]:
-            filters.append("organizer = @organizer")
-            params.append(bigquery.ScalarQueryParameter("organizer", "STRING", st.session_state.filters_applied["organizer"]))
-        if st.session_state.filters_applied["gender"]:
-            filters.append("race_gender = @gender")
-            params.append(bigquery.ScalarQueryParameter("gender", "STRING", st.session_state.filters_applied["gender"]))
-        if st.session_state.filters_applied["distance"]:
-            filters.append("race_distance = @distance")
-            params.append(bigquery.ScalarQueryParameter("distance", "STRING", st.session_state.filters_applied["distance"]))
-        if st.session_state.filters_applied["year"]:
-            filters.append("EXTRACT(YEAR FROM race_date) = @year")
-            params.append(bigquery.ScalarQueryParameter("year", "INT64", int(st.session_state.filters_applied["year"])))
-
-        if filters:
-            query += " AND " + " AND ".join(filters)
-
-        query += " ORDER BY race_date DESC"
-
-        job_config = bigquery.QueryJobConfig(query_parameters=params)
-        df = bq_client.query(query, job_config=job_config).to_dataframe()
-        df["label"] = df["organizer"] + " " + df["cleaned_race_name"] + " " + df["race_gender"] + " (" + df["race_date"].astype(str) + ")"
-        st.session_state.races_df = df
+        # Filter the shared in-memory race catalog
+        st.session_state.races_df = get_race_catalog(bq_client).filter(**st.session_state.filters_applied)
 
 # ────────────────
 # Race Selector
@@ -156,7 +113,7 @@ def get_race_results(race_id):
     job_config = bigquery.QueryJobConfig(
         query_parameters=[bigquery.ScalarQueryParameter("race_id", "STRING", race_id)]
     )
-    return bq_client.query(query, job_config=job_config).to_dataframe()
+    return fetch_dataframe(query, bq_client, job_config, prefer_local=True)
 
 @st.cache_data(ttl=600)
 def get_race_segment_positions(race_id):
@@ -175,12 +132,17 @@ def get_race_segment_positions(race_id):
     job_config = bigquery.QueryJobConfig(
         query_parameters=[bigquery.ScalarQueryParameter("race_id", "STRING", race_id)]
     )
-    return bq_client.query(query, job_config=job_config).to_dataframe()
+    return fetch_dataframe(query, bq_client, job_config, prefer_local=True)
 
 if st.session_state.get("load_results_clicked", False):
     log_race_search(bq_client, st.session_state.selected_race_id, BQ_RACE_SEARCH_LOG)
     st.subheader(f"Results for {st.session_state.get('selected_race_label', 'Selected Race')}")
-    results_df = get_race_results(st.session_state.selected_race_id)
+    race_id = st.session_state.selected_race_id
+    race_data = run_concurrently({
+        "results": lambda: get_race_results(race_id),
+        "segments": lambda: get_race_segment_positions(race_id),
+    })
+    results_df = race_data["results"]
 
     if results_df.empty:
         st.warning("No results found for this race.")
@@ -224,14 +186,6 @@ if st.session_state.get("load_results_clicked", False):
             if col in highlight_df.columns:
                 highlight_df[col] = pd.to_timedelta(highlight_df[col], errors="coerce")
 
-        # Add medal emojis to top 3 before converting anything to string
-        for raw_col, medal_col in zip(columns_to_check, ["Swim", "Bike", "Run", "Finish Time"]):
-            if raw_col in highlight_df.columns:
-                top3_indices = highlight_df[raw_col].nsmallest(3).index
-                for i, medal in zip(top3_indices, ["🥇", "🥈", "🥉"]):
-                    results_df.at[i, raw_col] = f"{medal} {results_df.at[i, raw_col]}"
-
-
         # Drop only 'overall_seconds', keep athlete_slug
         display_df = results_df.drop(columns=["overall_seconds"])
 
@@ -240,20 +194,22 @@ if st.session_state.get("load_results_clicked", False):
 
         # Format Place as clean integers
         if "Place" in display_df.columns:
-            display_df["Place"] = display_df["Place"].apply(lambda x: str(int(x)) if pd.notna(x) else "")
+            display_df["Place"] = format_int_column(display_df["Place"])
 
         # Convert all other columns to safe strings
         for col in display_df.columns:
             if col != "Place":
-                display_df[col] = display_df[col].apply(lambda x: "" if pd.isna(x) else str(x))
+                display_df[col] = to_display_strings(display_df[col])
+
+        # Add medal emojis to the top 3 of each segment
+        for raw_col in columns_to_check:
+            if raw_col in highlight_df.columns:
+                medal_col = column_renames[raw_col]
+                display_df[medal_col] = medal_fastest_column(display_df[medal_col], highlight_df[raw_col])
 
         # Add hyperlinks (make sure 'athlete_slug' is still present)
         if "athlete_slug" in results_df.columns:
-            display_df["athlete_slug"] = results_df["athlete_slug"]
-            display_df["Athlete"] = display_df.apply(
-                lambda row: make_athlete_link(row["Athlete"], row["athlete_slug"]),
-                axis=1
-            )
+            display_df["Athlete"] = athlete_link_column(display_df["Athlete"], results_df["athlete_slug"])
             display_df.drop(columns=["athlete_slug",
                                      "race_category",
                                      "organizer",
@@ -267,15 +223,15 @@ if st.session_state.get("load_results_clicked", False):
 
         # Add country flags safely
         if "Country" in display_df.columns:
-            display_df["Country"] = display_df["Country"].apply(get_flag)
+            display_df["Country"] = flag_column(results_df["athlete_country"])
 
-        # Render markdown
-        st.markdown(display_df.to_markdown(index=False), unsafe_allow_html=True)
+        # Render table
+        st.markdown(render_html_table(display_df, html_columns=("Athlete", "Country")), unsafe_allow_html=True)
 
 
 
             # Optional segment rank table
-    segment_df = get_race_segment_positions(st.session_state.selected_race_id)
+    segment_df = race_data["segments"]
     if not segment_df.empty:
         st.markdown("### 🏊🚴🏃 Segment Rankings")
         display_df = segment_df.rename(columns={
@@ -290,20 +246,14 @@ if st.session_state.get("load_results_clicked", False):
 
         for col in display_df.columns:
             if col in numeric_columns:
-                display_df[col] = display_df[col].apply(lambda x: str(int(x)) if pd.notna(x) else "")
+                display_df[col] = format_int_column(display_df[col])
+            elif col != "Country":
+                display_df[col] = to_display_strings(display_df[col])
 
-        # Convert all other columns to safe strings
-        for col in display_df.columns:
-            if col not in numeric_columns:
-                display_df[col] = display_df[col].apply(lambda x: "" if pd.isna(x) else str(x))
-
-        display_df["Athlete"] = display_df.apply(
-            lambda row: make_athlete_link(row["Athlete"], row["athlete_slug"]),
-            axis=1
-        )
+        display_df["Athlete"] = athlete_link_column(display_df["Athlete"], display_df["athlete_slug"])
         display_df = display_df.drop(columns=["athlete_slug"])
-        display_df["Country"] = display_df["Country"].apply(get_flag)
-        st.markdown(display_df.to_markdown(index=False), unsafe_allow_html=True)
+        display_df["Country"] = flag_column(display_df["Country"])
+        st.markdown(render_html_table(display_df, html_columns=("Athlete", "Country")), unsafe_allow_html=True)
     else:
         st.info("No segment ranking data available for this race.")
     st.markdown("### 📋 LLM Generated Race Recap")
@@ -326,15 +276,20 @@ if st.session_state.get("load_results_clicked", False):
                 st.session_state.selected_race_id, 
                 BQ_RACE_RECAP_LOG
             )
-            with st.spinner("Generating recap - This might take 10-15 seconds..."):
-                instructions = st.session_state["recap_instructions"]
-                recap_text = generate_race_recap_for_id(
-                    st.session_state.selected_race_id, 
-                    instructions
-                )
-                st.session_state["race_recap_text"] = recap_text
-
-        if st.session_state.get("race_recap_text"):
+            instructions = st.session_state["recap_instructions"]
+            st.markdown("#### 📄 Recap Output")
+            recap_stream = stream_race_recap_for_id(
+                st.session_state.selected_race_id, 
+                instructions
+            )
+            try:
+                recap_text = st.write_stream(recap_stream)
+            finally:
+                # Stops the OpenAI stream if the user navigates away mid-recap
+                recap_stream.close()
+            st.session_state["race_recap_text"] = recap_text
+
+        elif st.session_state.get("race_recap_text"):
             st.markdown("#### 📄 Recap Output")
             st.markdown(st.session_state["race_recap_text"])
 
@@ -10,13 +10,16 @@ if "athlete_results_df" not in st.session_state:
     st.session_state.athlete_results_df = None
 
 
-import pandas as pd
-from google.cloud import bigquery
-from utils.bq_utils import load_credentials
+from utils.bq_utils import get_bq_client, run_concurrently
 from config.app_config import USE_LOCAL, BQ_ATHLETE_SEARCH_LOG
-from utils.streamlit_utils import get_oauth, log_athlete_search, make_race_link,init_cookies_and_restore_user
+from utils.streamlit_utils import (
+    get_oauth, log_athlete_search, init_cookies_and_restore_user,
+    medal_place_column, race_link_column, render_html_table,
+)
 cookies = init_cookies_and_restore_user()
-from utils.generate_athlete_summary import generate_athlete_summary_for_athlete
+from utils.generate_athlete_summary import stream_athlete_summary_for_athlete
+from utils.athlete_search import get_athlete_name_index
+from utils.athlete_profile_data import get_athlete_profile_store
 import os
 import json
 oauth2, redirect_uri = get_oauth()
@@ -24,103 +27,20 @@ oauth2, redirect_uri = get_oauth()
 
 
 # Load credentials and BigQuery client
-credentials, project_id, _ = load_credentials(USE_LOCAL)
-bq_client = bigquery.Client(credentials=credentials, project=project_id)
+bq_client = get_bq_client()
 
 # Support loading directly from ?athlete_name= query
-# Sidebar: athlete search
-from difflib import get_close_matches
-
-@st.cache_data(ttl=3600)
-def get_athlete_name_slug_map():
-    query = """
-        SELECT DISTINCT athlete_name, athlete_slug
-        FROM `trilytx.trilytx_fct.fct_race_results`
-        WHERE athlete_slug IS NOT NULL
-        ORDER BY athlete_name
-    """
-    df = bq_client.query(query).to_dataframe()
-    name_slug_map = {row["athlete_name"].lower(): (row["athlete_name"], row["athlete_slug"]) for _, row in df.iterrows()}
-    return name_slug_map
+athlete_index = get_athlete_name_index(bq_client)
+# Race results and PTO trends, cached per athlete across reruns and sessions
+profile_store = get_athlete_profile_store(bq_client)
 
 query_params = st.query_params
 if "athlete_slug" in query_params:
     st.session_state.selected_athlete_slug = query_params["athlete_slug"]
     # Reverse lookup for display name
-    name_slug_map = get_athlete_name_slug_map()
-    for name_lc, (display, slug) in name_slug_map.items():
-        if slug == st.session_state.selected_athlete_slug:
-            st.session_state.selected_athlete = display
-            break
-
-
-
-
-def get_athlete_race_results(client, athlete_slug: str) -> pd.DataFrame:
-    query = """
-    SELECT
-        athlete_name, athlete_slug, athlete_country, athlete_gender, race_date, organizer,
-        cleaned_race_name, unique_race_id, race_location, race_distance, race_tier, sof,
-        athlete_finishing_place, swim_time, bike_time, run_time, overall_time
-    FROM `trilytx.trilytx_fct.fct_race_results`
-    WHERE athlete_slug = @slug
-    ORDER BY race_date DESC
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("slug", "STRING", athlete_slug)]
-    )
-    return client.query(query, job_config=job_config).to_dataframe()
-
-
-def get_athlete_pto_score_trend(bq_client, athlete_slug: str) -> pd.DataFrame:
-    query = """
-    WITH scores AS (
-  SELECT * FROM `trilytx.trilytx_fct.fct_pto_scores_weekly`
-  WHERE athlete_slug = @athlete_slug
-    AND distance_group = 'Overall'
-    and reporting_week <= CURRENT_DATE()
-),
-weeks AS (
-  SELECT DISTINCT DATE(reporting_week) AS reporting_week FROM scores
-),
-reference_weeks AS (
-  SELECT MAX(reporting_week) AS most_recent_week FROM weeks
-),
-target_weeks AS (
-  SELECT 
-    most_recent_week,
-    DATE_SUB(most_recent_week, INTERVAL 6 MONTH) AS week_6mo_ago,
-    DATE_SUB(most_recent_week, INTERVAL 12 MONTH) AS week_12mo_ago,
-    DATE_SUB(most_recent_week, INTERVAL 24 MONTH) AS week_24mo_ago
-  FROM reference_weeks
-),
-filtered_targets AS (
-  SELECT MAX(reporting_week) AS reporting_week, '6 Months Ago' AS week_type
-  FROM weeks, target_weeks WHERE reporting_week <= week_6mo_ago
-  UNION ALL
-  SELECT MAX(reporting_week), '12 Months Ago'
-  FROM weeks, target_weeks WHERE reporting_week <= week_12mo_ago
-  UNION ALL
-  SELECT MAX(reporting_week), '24 Months Ago'
-  FROM weeks, target_weeks WHERE reporting_week <= week_24mo_ago
-  UNION ALL
-  SELECT most_recent_week, 'Current' FROM target_weeks
-),
-filtered AS (
-  SELECT t.*, f.week_type
-  FROM scores t
-  JOIN filtered_targets f ON DATE(t.reporting_week) = f.reporting_week
-)
-SELECT * FROM filtered
-ORDER BY reporting_week DESC
-"""
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("athlete_slug", "STRING", athlete_slug)
-        ]
-    )
-    df = bq_client.query(query, job_config=job_config).to_dataframe()
-    return df
+    display_name = athlete_index.slug_to_name(st.session_state.selected_athlete_slug)
+    if display_name:
+        st.session_state.selected_athlete = display_name
 
 
 
@@ -129,28 +49,20 @@ ORDER BY reporting_week DESC
 with st.sidebar:
     st.markdown("### 🔍 Find an Athlete")
 
-    name_slug_map = get_athlete_name_slug_map()
-    athlete_names_lower = list(name_slug_map.keys())
-
     search_input = st.text_input("Enter athlete name:", "")
 
     if search_input:
-        search_input_lc = search_input.lower()
-        close_matches_lc = get_close_matches(search_input_lc, athlete_names_lower, n=10, cutoff=0.5)
+        display_names = athlete_index.search(search_input, limit=10)
 
-        if close_matches_lc:
-            # recover original casing from the mapping
-            display_names = [name_slug_map[name][0] for name in close_matches_lc]
+        if display_names:
             selected_name_display = st.selectbox("Select a matching athlete", display_names)
 
             if st.button("🔍 Search Athlete"):
-                # recover the slug from the display name (reverse lookup)
-                for name_lc, (display, slug) in name_slug_map.items():
-                    if display == selected_name_display:
-                        st.session_state.selected_athlete = display
-                        st.session_state.selected_athlete_slug = slug
-                        st.query_params.clear()
-                        break
+                entry = athlete_index.get(selected_name_display)
+                if entry:
+                    st.session_state.selected_athlete = entry[0]
+                    st.session_state.selected_athlete_slug = entry[1]
+                    st.query_params.clear()
         else:
             st.warning("No close matches found. Try refining your input.")
     else:
@@ -165,7 +77,7 @@ with st.sidebar:
         for button_text, athlete_name in example_athletes.items():
             if st.button(button_text, key=f"example_{hash(athlete_name)}"):
                 st.session_state.selected_athlete = athlete_name
-                entry = name_slug_map.get(athlete_name.lower())
+                entry = athlete_index.get(athlete_name)
                 if entry:
                     st.session_state.selected_athlete = entry[0]  # original name
                     st.session_state.selected_athlete_slug = entry[1]  # slug
@@ -185,12 +97,18 @@ if "selected_athlete" in st.session_state and "selected_athlete_slug" in st.sess
 
     log_athlete_search(bq_client, athlete_slug, BQ_ATHLETE_SEARCH_LOG)
 
-    race_results_df = get_athlete_race_results(bq_client, athlete_slug)
-    trend_df = get_athlete_pto_score_trend(bq_client, athlete_slug)
+    athlete_data = run_concurrently({
+        "results": lambda: profile_store.race_results(athlete_slug),
+        "trend": lambda: profile_store.pto_score_trend(athlete_slug),
+    })
+    race_results_df = athlete_data["results"]
+    trend_df = athlete_data["trend"]
 
     if race_results_df.empty:
         st.warning(f"No race results found for **{athlete_name.title()}**.")
     else:
+        # Warm the cache for the athletes this one raced against most closely
+        profile_store.prefetch_linked(athlete_slug)
         athlete_country = race_results_df["athlete_country"].iloc[0]
         athlete_gender = race_results_df["athlete_gender"].iloc[0]
         athlete_overall_rank = trend_df["rank_overall_pto_score_by_distance_group_athlete_gender_reporting_week_desc"].iloc[0]
@@ -218,9 +136,12 @@ if "selected_athlete" in st.session_state and "selected_athlete_slug" in st.sess
             instructions = st.text_area("Optional LLM prompt instructions:")
 
             if st.button("🧠 Generate Athlete Recap"):
-                with st.spinner("Generating summary - This might take 10–15 seconds..."):
-                    summary = generate_athlete_summary_for_athlete(athlete_name, instructions)
-                    st.markdown(summary)
+                summary_stream = stream_athlete_summary_for_athlete(athlete_name, instructions, athlete_slug=athlete_slug)
+                try:
+                    st.write_stream(summary_stream)
+                finally:
+                    # Stops the OpenAI stream if the user navigates away mid-summary
+                    summary_stream.close()
         else:
             st.warning("🔒 Please log in on the home page to generate summaries.")
 
@@ -242,28 +163,13 @@ if "selected_athlete" in st.session_state and "selected_athlete_slug" in st.sess
             "run_time": "Run",
             "overall_time": "Finish Time"
         })
-        display_df["Race"] = display_df.apply(
-            lambda row: make_race_link(row["Race"], row["unique_race_id"]),
-            axis=1
-        )
+        display_df["Race"] = race_link_column(display_df["Race"], display_df["unique_race_id"])
         display_df.drop(columns=["athlete_slug", "unique_race_id", "athlete_name", "athlete_country", "athlete_gender"], inplace=True)
         # Add medal emojis for top 3 places
         if "Place" in display_df.columns:
-            # Convert to numeric, coercing errors to NaN.
-            display_df["Place_numeric"] = pd.to_numeric(display_df["Place"], errors='coerce')
-
-            # Apply emojis based on numeric place, handling NaN gracefully
-            display_df["Place"] = display_df.apply(lambda row: 
-                f"🥇 {int(row['Place_numeric'])}" if pd.notna(row['Place_numeric']) and row['Place_numeric'] == 1 else
-                f"🥈 {int(row['Place_numeric'])}" if pd.notna(row['Place_numeric']) and row['Place_numeric'] == 2 else
-                f"🥉 {int(row['Place_numeric'])}" if pd.notna(row['Place_numeric']) and row['Place_numeric'] == 3 else
-                "❌ DNF" if pd.isna(row['Place_numeric']) else str(row["Place"])
-            , axis=1)
-            
-            # Drop the temporary numeric column
-            display_df.drop(columns=["Place_numeric"], inplace=True)
+            display_df["Place"] = medal_place_column(display_df["Place"])
 
-        st.markdown(display_df.to_markdown(index=False), unsafe_allow_html=True)
+        st.markdown(render_html_table(display_df, html_columns=("Race",)), unsafe_allow_html=True)
         if trend_df.empty:
             st.warning("No PTO score trend data found.")
         else:
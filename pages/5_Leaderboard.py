@@ -14,51 +14,41 @@ For each segment, you’ll see the top performers ranked by time, along with the
 Whether you're scouting top talent or tracking trends, this is your podium view into the latest race data.
 """)
 
+import datetime
+
+import numpy as np
 import pandas as pd
-from google.cloud import bigquery
-from utils.bq_utils import load_credentials
+from utils.bq_utils import get_bq_client
+from utils.pto_snapshots import get_pto_snapshots
 from config.app_config import USE_LOCAL
-from utils.streamlit_utils import get_flag, make_athlete_link,init_cookies_and_restore_user
+from utils.streamlit_utils import athlete_link_column, flag_column, render_html_table, init_cookies_and_restore_user
 cookies = init_cookies_and_restore_user()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Setup
 # ──────────────────────────────────────────────────────────────────────────────
 
-credentials, project_id, _ = load_credentials(USE_LOCAL)
-bq_client = bigquery.Client(credentials=credentials, project=project_id)
+bq_client = get_bq_client()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Load Leaderboard Data
 # ──────────────────────────────────────────────────────────────────────────────
+LEADERBOARD_DISTANCE_GROUPS = ['Half-Iron (70.3 miles)', 'Iron (140.6 miles)', '100 km', 'Overall']
+
 @st.cache_data(ttl=3600)
 def get_leaderboard():
-    query = """
-            WITH base AS (
-            SELECT * FROM `trilytx.trilytx_fct.fct_pto_scores_weekly`
-            WHERE distance_group IN ('Half-Iron (70.3 miles)', 'Iron (140.6 miles)', '100 km', 'Overall')
-            ),
-            weeks AS (
-            SELECT
-                DATE_SUB(DATE_TRUNC(CURRENT_DATE(), WEEK), INTERVAL 1 WEEK) AS this_week,
-                DATE_SUB(DATE_TRUNC(CURRENT_DATE(), WEEK), INTERVAL 2 WEEK) AS last_week,
-                DATE_SUB(DATE_TRUNC(CURRENT_DATE(), WEEK), INTERVAL 26 WEEK) AS week_6mo_ago
-            )
-            SELECT 'this_week' AS week_name, b.*
-            FROM base b JOIN weeks w ON b.reporting_week = w.this_week
-
-            UNION ALL
-
-            SELECT 'last_week' AS week_name, b.*
-            FROM base b JOIN weeks w ON b.reporting_week = w.last_week
-
-            UNION ALL
-
-            SELECT '6mo_ago' AS week_name, b.*
-            FROM base b JOIN weeks w ON b.reporting_week = w.week_6mo_ago
-
-    """
-    return bq_client.query(query).to_dataframe()
+    # DATE_TRUNC(CURRENT_DATE(), WEEK) starts weeks on Sunday
+    today = datetime.date.today()
+    week_start = today - datetime.timedelta(days=(today.weekday() + 1) % 7)
+    weeks = {
+        "this_week": week_start - datetime.timedelta(weeks=1),
+        "last_week": week_start - datetime.timedelta(weeks=2),
+        "6mo_ago": week_start - datetime.timedelta(weeks=26),
+    }
+    df = get_pto_snapshots().frames_for_weeks(weeks)
+    if df.empty:
+        return df
+    return df[df["distance_group"].isin(LEADERBOARD_DISTANCE_GROUPS)].reset_index(drop=True)
 
 leaderboard = get_leaderboard()
 
@@ -120,59 +110,65 @@ if search_clicked:
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Filtered View
+# Rank Movement
 # ──────────────────────────────────────────────────────────────────────────────
-if st.session_state["filters_applied"]:
-    this_week = leaderboard[leaderboard["week_name"] == "this_week"].copy()
-    last_week = leaderboard[leaderboard["week_name"] == "last_week"].copy()
-    six_months_ago = leaderboard[leaderboard["week_name"] == "6mo_ago"].copy()
-
-    this_week = this_week[this_week["distance_group"] == st.session_state["distance_filter"]]
-    last_week = last_week[last_week["distance_group"] == st.session_state["distance_filter"]]
-    six_months_ago = six_months_ago[six_months_ago["distance_group"] == st.session_state["distance_filter"]]
-
-    if st.session_state["gender_filter"] != "All":
-        this_week = this_week[this_week["athlete_gender"] == st.session_state["gender_filter"]]
-        last_week = last_week[last_week["athlete_gender"] == st.session_state["gender_filter"]]
-        six_months_ago = six_months_ago[six_months_ago["athlete_gender"] == st.session_state["gender_filter"]]
-
-    if st.session_state["country_filter"] != "All":
-        this_week = this_week[this_week["athlete_country"] == st.session_state["country_filter"]]
-        last_week = last_week[last_week["athlete_country"] == st.session_state["country_filter"]]
-        six_months_ago = six_months_ago[six_months_ago["athlete_country"] == st.session_state["country_filter"]]
+SEGMENTS = ["swim_pto_score", "bike_pto_score", "run_pto_score", "overall_pto_score"]
+RANK_KEYS = ["athlete_name", "distance_group", "athlete_gender"]
+
+def format_movement(current_rank: pd.Series, comparison_rank: pd.Series) -> pd.Series:
+    delta = comparison_rank - current_rank
+    labels = np.select(
+        [current_rank.isna() | comparison_rank.isna(), delta > 0, delta < 0],
+        ["🆕", "🟩↑ " + delta.abs().astype("Int64").astype(str), "🟥↓ " + delta.abs().astype("Int64").astype(str)],
+        default="⬜–",
+    )
+    return pd.Series(labels, index=current_rank.index)
 
-    if st.session_state["yob_filter"] != "All":
-        this_week = this_week[this_week["athlete_year_of_birth"] == st.session_state["yob_filter"]]
-        last_week = last_week[last_week["athlete_year_of_birth"] == st.session_state["yob_filter"]]
-        six_months_ago = six_months_ago[six_months_ago["athlete_year_of_birth"] == st.session_state["yob_filter"]]
+@st.cache_data(ttl=3600)
+def get_leaderboard_with_movement(distance_filter, gender_filter, country_filter, yob_filter):
+    """
+    Returns this week's filtered leaderboard with 1W and 6M rank movement for every segment.
 
-    # ──────────────────────────────────────────────────────────────────────────────
-    # Movement Helper
-    # ──────────────────────────────────────────────────────────────────────────────
-    def get_rank(df, score_col):
-        return df.sort_values(score_col, ascending=False).reset_index(drop=True).assign(rank=lambda d: d.index + 1)
-
-    def get_movement(athlete, gender, distance_group, score_col, current_df, comparison_df):
-        cur_rank = get_rank(
-            current_df[(current_df["distance_group"] == distance_group) & (current_df["athlete_gender"] == gender)],
-            score_col
-        )
-        cmp_rank = get_rank(
-            comparison_df[(comparison_df["distance_group"] == distance_group) & (comparison_df["athlete_gender"] == gender)],
-            score_col
-        )
-        cur = cur_rank[cur_rank["athlete_name"] == athlete]["rank"].values
-        cmp = cmp_rank[cmp_rank["athlete_name"] == athlete]["rank"].values
-        if len(cur) == 0 or len(cmp) == 0:
-            return "🆕"
-        delta = cmp[0] - cur[0]
-        if delta > 0:
-            return f"🟩↑ {delta}"
-        elif delta < 0:
-            return f"🟥↓ {abs(delta)}"
-        else:
-            return "⬜–"
+    Ranks are computed for all weeks, segments, distance groups and genders in one
+    grouped pass over the filtered data and joined back onto this week in one merge.
+    Cached per filter combination, so changing filters is a single lookup.
+    """
+    df = get_leaderboard()
+    df = df[df["distance_group"] == distance_filter]
+    if gender_filter != "All":
+        df = df[df["athlete_gender"] == gender_filter]
+    if country_filter != "All":
+        df = df[df["athlete_country"] == country_filter]
+    if yob_filter != "All":
+        df = df[df["athlete_year_of_birth"] == yob_filter]
+
+    ranks = df.groupby(["week_name", "distance_group", "athlete_gender"])[SEGMENTS].rank(
+        method="first", ascending=False, na_option="bottom"
+    )
+    ranks = pd.concat([df[["week_name"] + RANK_KEYS], ranks], axis=1)
+    ranks = ranks.drop_duplicates(subset=["week_name"] + RANK_KEYS)
+    # One column per (segment, week_name)
+    wide = ranks.set_index(RANK_KEYS + ["week_name"])[SEGMENTS].unstack("week_name")
+    wide.columns = [f"{segment}__{week}" for segment, week in wide.columns]
+
+    this_week = df[df["week_name"] == "this_week"].merge(wide, left_on=RANK_KEYS, right_index=True, how="left")
+    for segment in SEGMENTS:
+        current = this_week.get(f"{segment}__this_week", pd.Series(np.nan, index=this_week.index))
+        for week, label in [("last_week", "1W"), ("6mo_ago", "6M")]:
+            comparison = this_week.get(f"{segment}__{week}", pd.Series(np.nan, index=this_week.index))
+            this_week[f"{segment}_movement_{label}"] = format_movement(current, comparison)
+    return this_week.drop(columns=list(wide.columns), errors="ignore")
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Filtered View
+# ──────────────────────────────────────────────────────────────────────────────
+if st.session_state["filters_applied"]:
+    this_week = get_leaderboard_with_movement(
+        st.session_state["distance_filter"],
+        st.session_state["gender_filter"],
+        st.session_state["country_filter"],
+        st.session_state["yob_filter"],
+    )
 
 
     # ──────────────────────────────────────────────────────────────────────────────
@@ -187,35 +183,14 @@ if st.session_state["filters_applied"]:
         "overall_pto_score": "🏆"
     }
 
-    for segment in ["swim_pto_score", "bike_pto_score", "run_pto_score", "overall_pto_score"]:
+    for segment in SEGMENTS:
         top_df = this_week.sort_values(segment, ascending=False).head(st.session_state["num_rows"]).copy()
 
         # Add rank as column
         top_df.insert(0, "Rank", range(1, len(top_df) + 1))
 
-        top_df["Rank Movement (1W)"] = top_df.apply(
-            lambda row: get_movement(
-                row['athlete_name'],
-                row['athlete_gender'],
-                row['distance_group'],
-                segment,
-                this_week,
-                last_week
-            ),
-            axis=1
-        )
-
-        top_df["Rank Movement (6M)"] = top_df.apply(
-            lambda row: get_movement(
-                row['athlete_name'],
-                row['athlete_gender'],
-                row['distance_group'],
-                segment,
-                this_week,
-                six_months_ago
-            ),
-            axis=1
-    )
+        top_df["Rank Movement (1W)"] = top_df[f"{segment}_movement_1W"]
+        top_df["Rank Movement (6M)"] = top_df[f"{segment}_movement_6M"]
 
 
         # Rename for display
@@ -228,19 +203,12 @@ if st.session_state["filters_applied"]:
             "Rank Movement (1W)": "Movement (vs Last Week)",
             "Rank Movement (6M)": "Movement (vs 6 Months Ago)"
         })
-                # Add hyperlinks (make sure 'athlete_slug' is still present)
-        if "athlete_slug" in display_df.columns:
-            display_df["athlete_slug"] = display_df["athlete_slug"]
-            display_df["Athlete"] = display_df.apply(
-                lambda row: make_athlete_link(row["Athlete"], row["athlete_slug"]),
-                axis=1
-            )
-            display_df.drop(columns=["athlete_slug"], inplace=True)
-                # Add country flags safely
-        if "Country" in display_df.columns:
-            display_df["Country"] = display_df["Country"].apply(get_flag)
+        # Add hyperlinks and country flags
+        display_df["Athlete"] = athlete_link_column(display_df["Athlete"], display_df["athlete_slug"])
+        display_df.drop(columns=["athlete_slug"], inplace=True)
+        display_df["Country"] = flag_column(display_df["Country"])
         emoji = segment_emojis.get(segment, "📊")
         label = segment.replace("_pto_score", "").capitalize()
 
         st.markdown(f"#### {emoji} {label}")
-        st.markdown(display_df.to_markdown(index=False), unsafe_allow_html=True)
+        st.markdown(render_html_table(display_df, html_columns=("Athlete", "Country")), unsafe_allow_html=True)
@@ -12,11 +12,10 @@ Use the filters in the sidebar to view podiums for a specific race distance and
 Each segment podium displays athletes ranked by time, along with their country and race name.
 """)
 
-import pandas as pd
 from google.cloud import bigquery
-from utils.bq_utils import load_credentials
+from utils.bq_utils import get_bq_client, fetch_dataframe
 from config.app_config import USE_LOCAL
-from utils.streamlit_utils import make_race_link, make_athlete_link, get_flag,init_cookies_and_restore_user
+from utils.streamlit_utils import athlete_link_column, race_link_column, flag_column, render_html_table, init_cookies_and_restore_user
 cookies = init_cookies_and_restore_user()
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -38,44 +37,125 @@ if "filters_initialized" not in st.session_state:
 
 
 
-credentials, project_id, _ = load_credentials(USE_LOCAL)
-bq_client = bigquery.Client(credentials=credentials, project=project_id)
+bq_client = get_bq_client()
 
-@st.cache_data(ttl=3600)
-def get_race_podiums(time_range: str):
+SEGMENT_TIME_COLUMNS = {
+    "swim_seconds": "swim_time",
+    "bike_seconds": "bike_time",
+    "run_seconds": "run_time",
+    "overall_seconds": "overall_time",
+}
+PODIUM_DISPLAY_COLUMNS = [
+    "athlete_slug", "unique_race_id", "athlete_name", "athlete_country", "race_date", "organizer", "cleaned_race_name",
+]
+BASE_RACE_FILTER = """
+    race_name IS NOT NULL
+    AND race_distance IS NOT NULL
+    AND race_distance != ''
+"""
+
+def get_date_filter(time_range: str) -> str:
     if time_range == "Last Week":
-        date_filter = "DATE_TRUNC(race_date, WEEK(SUNDAY)) = DATE_TRUNC(CURRENT_DATE(), WEEK(SUNDAY))"
+        return "DATE_TRUNC(race_date, WEEK(SUNDAY)) = DATE_TRUNC(CURRENT_DATE(), WEEK(SUNDAY))"
     elif time_range == "Current Calendar Month":
-        date_filter = "DATE_TRUNC(race_date, MONTH) = DATE_TRUNC(CURRENT_DATE(), MONTH)"
+        return "DATE_TRUNC(race_date, MONTH) = DATE_TRUNC(CURRENT_DATE(), MONTH)"
     elif time_range == "Current Calendar Year":
-        date_filter = "DATE_TRUNC(race_date, YEAR) = DATE_TRUNC(CURRENT_DATE(), YEAR)"
+        return "DATE_TRUNC(race_date, YEAR) = DATE_TRUNC(CURRENT_DATE(), YEAR)"
     elif time_range == "Last 365 Days":
-        date_filter = "race_date >= date_sub(CURRENT_DATE(), interval 365 day)"
+        return "race_date >= date_sub(CURRENT_DATE(), interval 365 day)"
     elif time_range == "Last 30 Days":
-        date_filter = "race_date >= date_sub(CURRENT_DATE(), interval 30 day)"
+        return "race_date >= date_sub(CURRENT_DATE(), interval 30 day)"
     elif time_range == "Last 90 Days":
-        date_filter = "race_date >= date_sub(CURRENT_DATE(), interval 90 day)"
+        return "race_date >= date_sub(CURRENT_DATE(), interval 90 day)"
     elif time_range == "Last 180 Days":
-        date_filter = "race_date >= date_sub(CURRENT_DATE(), interval 90 day)"
+        return "race_date >= date_sub(CURRENT_DATE(), interval 90 day)"
     else:
         raise ValueError("Invalid time_range")
 
+@st.cache_data(ttl=6 * 3600)
+def get_podium_facets():
+    """
+    Returns the sidebar options (distinct values over the last 365 days) from one single-row query.
+    """
     query = f"""
-        
-            SELECT * replace(
-              CASE 
-    WHEN swim_seconds IS  NULL or bike_seconds IS  NULL or run_seconds IS  NULL 
-    THEN NULL 
-    ELSE overall_seconds 
-  END AS overall_seconds
-  ) FROM `trilytx.trilytx_fct.fct_race_results`
-            WHERE {date_filter}
-              AND race_name IS NOT NULL
-              and race_distance IS NOT NULL
-              and race_distance != ''
+        SELECT
+            ARRAY_AGG(DISTINCT race_distance IGNORE NULLS) AS distances,
+            ARRAY_AGG(DISTINCT race_gender IGNORE NULLS) AS genders,
+            ARRAY_AGG(DISTINCT organizer IGNORE NULLS) AS organizers,
+            ARRAY_AGG(DISTINCT athlete_country IGNORE NULLS) AS countries,
+            ARRAY_AGG(DISTINCT athlete_year_of_birth IGNORE NULLS) AS birth_years
+        FROM `trilytx.trilytx_fct.fct_race_results`
+        WHERE {get_date_filter("Last 365 Days")}
+          AND {BASE_RACE_FILTER}
+    """
+    row = fetch_dataframe(query, bq_client, prefer_local=True).iloc[0]
+    # ARRAY_AGG over no rows is NULL
+    values = {col: list(row[col]) if row[col] is not None else [] for col in row.index}
+    return {
+        "distances": sorted(values["distances"]),
+        "genders": sorted(values["genders"]),
+        "organizers": sorted(values["organizers"]),
+        "countries": sorted(values["countries"]),
+        "birth_years": sorted(values["birth_years"], reverse=True),
+    }
+
+@st.cache_data(ttl=3600)
+def get_race_podiums(time_range: str, race_distance: str, race_gender: str, organizer: str,
+                     athlete_country: str, athlete_year_of_birth, num_rows: int):
+    """
+    Returns the top num_rows finishers per segment for the given filters, ranked in BigQuery.
+
+    Each row carries a 'segment' (e.g. 'swim_seconds'), its 'segment_rank' and the
+    segment's display time as 'segment_time'.
+    """
+    filters = [get_date_filter(time_range), BASE_RACE_FILTER, "race_distance = @race_distance"]
+    params = [
+        bigquery.ScalarQueryParameter("race_distance", "STRING", race_distance),
+        bigquery.ScalarQueryParameter("num_rows", "INT64", num_rows),
+    ]
+    for column, value in [("race_gender", race_gender), ("organizer", organizer), ("athlete_country", athlete_country)]:
+        if value != "All":
+            filters.append(f"{column} = @{column}")
+            params.append(bigquery.ScalarQueryParameter(column, "STRING", value))
+    if athlete_year_of_birth != "All":
+        yob = float(athlete_year_of_birth)
+        filters.append("athlete_year_of_birth = @athlete_year_of_birth")
+        params.append(bigquery.ScalarQueryParameter(
+            "athlete_year_of_birth", "INT64" if yob.is_integer() else "FLOAT64", int(yob) if yob.is_integer() else yob
+        ))
 
+    display_columns = ", ".join(PODIUM_DISPLAY_COLUMNS)
+    segment_queries = "\n        UNION ALL\n".join(f"""
+        SELECT
+            '{segment_col}' AS segment,
+            ROW_NUMBER() OVER (ORDER BY {segment_col} ASC NULLS LAST) AS segment_rank,
+            {display_columns},
+            {time_col} AS segment_time
+        FROM filtered
+        WHERE TRUE
+        QUALIFY segment_rank <= @num_rows"""
+        for segment_col, time_col in SEGMENT_TIME_COLUMNS.items()
+    )
+    where_clause = "\n          AND ".join(f.strip() for f in filters)
+    query = f"""
+        WITH filtered AS (
+            SELECT
+                {display_columns},
+                swim_seconds, bike_seconds, run_seconds,
+                -- Overall times only count when every segment was recorded
+                CASE
+                    WHEN swim_seconds IS NULL OR bike_seconds IS NULL OR run_seconds IS NULL
+                    THEN NULL
+                    ELSE overall_seconds
+                END AS overall_seconds,
+                swim_time, bike_time, run_time, overall_time
+            FROM `trilytx.trilytx_fct.fct_race_results`
+            WHERE {where_clause}
+        )
+        {segment_queries}
     """
-    return bq_client.query(query).to_dataframe()
+    job_config = bigquery.QueryJobConfig(query_parameters=params)
+    return fetch_dataframe(query, bq_client, job_config, prefer_local=True)
 
 # ─────────────────────────────────────────────
 # Sidebar filters + Submit Button
@@ -109,12 +189,12 @@ with st.sidebar:
         ].index(st.session_state.time_range)
     )
 
-    dummy_df = get_race_podiums("Last 365 Days")
-    distances = sorted(dummy_df["race_distance"].dropna().unique())
-    genders = sorted(dummy_df["race_gender"].dropna().unique())
-    organizers = sorted(dummy_df["organizer"].dropna().unique())
-    country_options = sorted(dummy_df["athlete_country"].dropna().unique())
-    birth_year_options = sorted(dummy_df["athlete_year_of_birth"].dropna().unique(), reverse=True)
+    facets = get_podium_facets()
+    distances = facets["distances"]
+    genders = facets["genders"]
+    organizers = facets["organizers"]
+    country_options = facets["countries"]
+    birth_year_options = facets["birth_years"]
 
     # Set default index for distance if value exists
     default_distance_idx = distances.index(st.session_state.selected_distance) if st.session_state.selected_distance in distances else 0
@@ -143,21 +223,17 @@ with st.sidebar:
 # Load + Filter Data Only After Button Press
 # ─────────────────────────────────────────────
 if st.session_state.search_triggered:
-    podium_df = get_race_podiums(st.session_state.time_range)
-
-    # Apply filters
-    filtered_df = podium_df[podium_df["race_distance"] == st.session_state.selected_distance]
-
-    if st.session_state.selected_organizer != "All":
-        filtered_df = filtered_df[filtered_df["organizer"] == st.session_state.selected_organizer]
-    if st.session_state.selected_country != "All":
-        filtered_df = filtered_df[filtered_df["athlete_country"] == st.session_state.selected_country]
-    if st.session_state.selected_gender != "All":
-        filtered_df = filtered_df[filtered_df["race_gender"] == st.session_state.selected_gender]
-    if st.session_state.selected_yob != "All":
-        filtered_df = filtered_df[filtered_df["athlete_year_of_birth"] == st.session_state.selected_yob]
+    podium_df = get_race_podiums(
+        st.session_state.time_range,
+        st.session_state.selected_distance,
+        st.session_state.selected_gender,
+        st.session_state.selected_organizer,
+        st.session_state.selected_country,
+        st.session_state.selected_yob,
+        st.session_state.num_rows,
+    )
 
-    if filtered_df.empty:
+    if podium_df.empty:
         st.warning("📭 No race podium data found for the selected filters.")
         st.stop()
 
@@ -169,8 +245,9 @@ if st.session_state.search_triggered:
     }
 
     for segment_col, (label, time_col) in segment_map.items():
-        top_df = filtered_df.sort_values(segment_col).head(st.session_state.num_rows).copy()
-        top_df.insert(0, "Rank", range(1, len(top_df) + 1))
+        top_df = podium_df[podium_df["segment"] == segment_col].sort_values("segment_rank").copy()
+        top_df.insert(0, "Rank", top_df["segment_rank"])
+        top_df[time_col] = top_df["segment_time"]
 
 
         display_df = top_df[[
@@ -183,21 +260,12 @@ if st.session_state.search_triggered:
             "cleaned_race_name": "Race",
             time_col: "Time"
         })
-        if "athlete_slug" in display_df.columns:
-            display_df["athlete_slug"] = display_df["athlete_slug"]
-            display_df["Athlete"] = display_df.apply(
-                lambda row: make_athlete_link(row["Athlete"], row["athlete_slug"]),
-                axis=1
-            )
-            display_df.drop(columns=["athlete_slug"], inplace=True)
-        display_df["Race"] = display_df.apply(
-                lambda row: make_race_link(row["Race"], row["unique_race_id"]),
-                axis=1
-            )
-        display_df.drop(columns=["unique_race_id"], inplace=True)
-        if "Country" in display_df.columns:
-            display_df["Country"] = display_df["Country"].apply(get_flag)
+        # Add hyperlinks and country flags
+        display_df["Athlete"] = athlete_link_column(display_df["Athlete"], display_df["athlete_slug"])
+        display_df["Race"] = race_link_column(display_df["Race"], display_df["unique_race_id"])
+        display_df.drop(columns=["athlete_slug", "unique_race_id"], inplace=True)
+        display_df["Country"] = flag_column(display_df["Country"])
 
         st.markdown(f"### {label} Podium")
-        st.markdown(display_df.to_markdown(index=False), unsafe_allow_html=True)
+        st.markdown(render_html_table(display_df, html_columns=("Athlete", "Race", "Country")), unsafe_allow_html=True)
 
@@ -0,0 +1,218 @@
+import datetime
+import logging
+import threading
+import time
+from typing import List
+
+import pandas as pd
+from google.cloud import bigquery
+
+from config.app_config import (
+    ATHLETE_PROFILE_CACHE_MAX_BYTES, ATHLETE_PREFETCH_RECENT_RACES, ATHLETE_PREFETCH_PLACE_WINDOW,
+    ATHLETE_PREFETCH_MAX_ATHLETES, PTO_SNAPSHOT_SYNC_SECONDS, QUERY_CACHE_DEFAULT_TTL_SECONDS,
+    QUERY_CACHE_TABLE_TTL_SECONDS,
+)
+from utils.bq_utils import fetch_dataframe, submit_query
+from utils.cache_utils import TTLDataFrameCache
+from utils.pto_snapshots import get_pto_snapshots
+
+logger = logging.getLogger(__name__)
+
+ATHLETE_RESULTS_COLUMNS = [
+    "athlete_name", "athlete_slug", "athlete_country", "athlete_gender", "race_date", "organizer",
+    "cleaned_race_name", "unique_race_id", "race_location", "race_distance", "race_tier", "sof",
+    "athlete_finishing_place", "swim_time", "bike_time", "run_time", "overall_time",
+]
+
+# Race results change as races are published; trend rows change when the snapshots sync
+RESULTS_TTL_SECONDS = QUERY_CACHE_TABLE_TTL_SECONDS.get("fct_race_results", QUERY_CACHE_DEFAULT_TTL_SECONDS)
+TREND_TTL_SECONDS = PTO_SNAPSHOT_SYNC_SECONDS
+
+_MAX_TRACKED_PREFETCHES = 4096
+
+
+class AthleteProfileStore:
+    """
+    Per-athlete cache of the Athlete Profile data, shared by all sessions.
+
+    Race results and the PTO score trend are cached per athlete_slug in one
+    TTLDataFrameCache, so reruns of the page (widget changes, button presses) and
+    other sessions viewing the same athlete do not query again. After a profile is
+    shown, prefetch_linked() loads the athletes who finished next to this one in
+    their latest races in the background, with one query for all of them.
+    """
+
+    def __init__(self, bq_client: bigquery.Client, max_bytes: int = ATHLETE_PROFILE_CACHE_MAX_BYTES):
+        self._bq_client = bq_client
+        self._cache = TTLDataFrameCache(max_bytes=max_bytes, default_ttl_seconds=RESULTS_TTL_SECONDS)
+        self._lock = threading.Lock()
+        self._prefetched = set()     # slugs loaded by a prefetch and not yet viewed
+        self._prefetching = set()    # slugs with a prefetch in flight
+        self._prefetched_sources = {}  # slug -> monotonic time its linked athletes can be prefetched again
+        self.prefetch_batches = 0
+        self.prefetched_athletes = 0
+        self.prefetch_hits = 0
+        self.prefetch_errors = 0
+        self.prefetch_skips = 0
+
+    # ── loading ───────────────────────────────────────────────────────────────
+    def _fetch_race_results(self, athlete_slugs: List[str]) -> pd.DataFrame:
+        query = f"""
+        SELECT
+            {", ".join(ATHLETE_RESULTS_COLUMNS)}
+        FROM `trilytx.trilytx_fct.fct_race_results`
+        WHERE athlete_slug IN UNNEST(@slugs)
+        ORDER BY race_date DESC
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("slugs", "STRING", athlete_slugs)]
+        )
+        return fetch_dataframe(query, self._bq_client, job_config, prefer_local=True)
+
+    def _fetch_linked_slugs(self, athlete_slug: str) -> List[str]:
+        query = f"""
+        WITH recent AS (
+            SELECT unique_race_id, athlete_finishing_place
+            FROM `trilytx.trilytx_fct.fct_race_results`
+            WHERE athlete_slug = @slug AND athlete_finishing_place IS NOT NULL
+            ORDER BY race_date DESC
+            LIMIT {int(ATHLETE_PREFETCH_RECENT_RACES)}
+        )
+        SELECT r.athlete_slug
+        FROM `trilytx.trilytx_fct.fct_race_results` r
+        JOIN recent ON r.unique_race_id = recent.unique_race_id
+        WHERE r.athlete_slug IS NOT NULL
+          AND r.athlete_slug != @slug
+          AND ABS(r.athlete_finishing_place - recent.athlete_finishing_place) <= @place_window
+        GROUP BY r.athlete_slug
+        ORDER BY MIN(ABS(r.athlete_finishing_place - recent.athlete_finishing_place)), r.athlete_slug
+        LIMIT {int(ATHLETE_PREFETCH_MAX_ATHLETES)}
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("slug", "STRING", athlete_slug),
+            bigquery.ScalarQueryParameter("place_window", "INT64", ATHLETE_PREFETCH_PLACE_WINDOW),
+        ])
+        return fetch_dataframe(query, self._bq_client, job_config, prefer_local=True)["athlete_slug"].tolist()
+
+    def _get(self, key: str, athlete_slug: str):
+        df = self._cache.get(key)
+        if df is not None:
+            with self._lock:
+                if athlete_slug in self._prefetched:
+                    self._prefetched.discard(athlete_slug)
+                    self.prefetch_hits += 1
+        return df
+
+    # ── lookups ───────────────────────────────────────────────────────────────
+    def race_results(self, athlete_slug: str) -> pd.DataFrame:
+        """
+        Returns the athlete's race results, newest first.
+        """
+        key = f"results:{athlete_slug}"
+        df = self._get(key, athlete_slug)
+        if df is None:
+            df = self._fetch_race_results([athlete_slug])
+            self._cache.set(key, df, ttl_seconds=RESULTS_TTL_SECONDS)
+        return df
+
+    def pto_score_trend(self, athlete_slug: str) -> pd.DataFrame:
+        """
+        Returns the athlete's Overall PTO scores for the Current / 6 / 12 / 24 months ago weeks.
+        """
+        key = f"trend:{athlete_slug}"
+        df = self._cache.get(key)
+        if df is None:
+            # Reference weeks come from the athlete's own Overall weeks
+            df = get_pto_snapshots().athlete_reference_scores(
+                athlete_slug=athlete_slug,
+                distance_group="Overall",
+                weeks_from="athlete",
+                max_week=datetime.date.today(),
+            )
+            self._cache.set(key, df, ttl_seconds=TREND_TTL_SECONDS)
+        return df
+
+    # ── prefetching ───────────────────────────────────────────────────────────
+    def prefetch_linked(self, athlete_slug: str) -> None:
+        """
+        Loads the race results and trends of athletes linked to athlete_slug in the background.
+        Runs at most once per athlete every RESULTS_TTL_SECONDS, so page reruns do not query again.
+        """
+        with self._lock:
+            if athlete_slug in self._prefetching:
+                return
+            if self._prefetched_sources.get(athlete_slug, 0) > time.monotonic():
+                self.prefetch_skips += 1
+                return
+            self._prefetching.add(athlete_slug)
+
+        def run():
+            try:
+                linked_slugs = self._fetch_linked_slugs(athlete_slug)
+                with self._lock:
+                    if len(self._prefetched_sources) > _MAX_TRACKED_PREFETCHES:
+                        now = time.monotonic()
+                        self._prefetched_sources = {s: t for s, t in self._prefetched_sources.items() if t > now}
+                    self._prefetched_sources[athlete_slug] = time.monotonic() + RESULTS_TTL_SECONDS
+                linked = [slug for slug in linked_slugs if f"results:{slug}" not in self._cache]
+                if not linked:
+                    return
+                results = self._fetch_race_results(linked)
+                for slug, df in results.groupby("athlete_slug", sort=False):
+                    self._cache.set(f"results:{slug}", df.reset_index(drop=True), ttl_seconds=RESULTS_TTL_SECONDS)
+                for slug in linked:
+                    if f"trend:{slug}" not in self._cache:
+                        self.pto_score_trend(slug)
+                with self._lock:
+                    if len(self._prefetched) > _MAX_TRACKED_PREFETCHES:
+                        self._prefetched.clear()
+                    self._prefetched.update(linked)
+                    self.prefetch_batches += 1
+                    self.prefetched_athletes += len(linked)
+            except Exception as e:
+                logger.warning("Prefetch of athletes linked to %s failed: %s", athlete_slug, e)
+                with self._lock:
+                    self.prefetch_errors += 1
+            finally:
+                with self._lock:
+                    self._prefetching.discard(athlete_slug)
+
+        submit_query(run)
+
+    def stats(self) -> dict:
+        """
+        Returns cache size, hit-rate and eviction counters plus prefetch effectiveness.
+        """
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update({
+                "prefetch_batches": self.prefetch_batches,
+                "prefetched_athletes": self.prefetched_athletes,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_hit_rate": round(self.prefetch_hits / self.prefetched_athletes, 4)
+                                     if self.prefetched_athletes else 0.0,
+                "prefetch_errors": self.prefetch_errors,
+                "prefetch_skips": self.prefetch_skips,
+            })
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_athlete_profile_store(bq_client: bigquery.Client) -> AthleteProfileStore:
+    """
+    Returns the process-wide athlete profile store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AthleteProfileStore(bq_client)
+    return _store
+
+def get_athlete_profile_cache_stats() -> dict:
+    """
+    Returns size, eviction and prefetch metrics for the athlete profile cache (empty before first use).
+    """
+    return _store.stats() if _store is not None else {}
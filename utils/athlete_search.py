@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+from config.app_config import ATHLETE_INDEX_REFRESH_SECONDS
+from utils.bq_utils import fetch_dataframe
+
+logger = logging.getLogger(__name__)
+
+
+def _trigrams(text: str) -> set:
+    # Pad so short queries and word starts still produce trigrams
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AthleteNameIndex:
+    """
+    In-memory athlete name search with a bidirectional name <-> slug map.
+
+    Names are indexed by character trigrams in an inverted index. A search only
+    scores names that share enough trigrams with the query (candidate pruning), ranks
+    them by Dice similarity of trigram sets, and boosts names where the query is a
+    prefix of the full name or of one of its words. This tolerates typos and partial
+    input without comparing the query against every name.
+    """
+
+    def __init__(self, records: Iterable[Tuple[str, str]]):
+        self._names: List[str] = []               # id -> display name
+        self._slugs: List[str] = []               # id -> slug
+        self._names_lower: List[str] = []
+        self._trigram_counts: List[int] = []
+        self._id_by_name: Dict[str, int] = {}     # lowercase name -> id
+        self._name_by_slug: Dict[str, str] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+        for name, slug in records:
+            if not name or not slug:
+                continue
+            self._name_by_slug[slug] = name
+            name_lc = name.lower()
+            if name_lc in self._id_by_name:
+                # Same name, different slug: keep the latest, as the old dict lookup did
+                self._slugs[self._id_by_name[name_lc]] = slug
+                continue
+            idx = len(self._names)
+            self._id_by_name[name_lc] = idx
+            self._names.append(name)
+            self._slugs.append(slug)
+            self._names_lower.append(name_lc)
+            grams = _trigrams(name_lc)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(idx)
+        self._postings = dict(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _scored(self, query: str, min_score: float) -> List[Tuple[float, str, int]]:
+        # (score, lowercase name, id) for every name scoring at least min_score, best first
+        query_lc = " ".join(query.lower().split())
+        if not query_lc:
+            return []
+        query_grams = _trigrams(query_lc)
+
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in query_grams))
+
+        # Dice >= min_score needs at least this many shared trigrams for even the shortest name
+        min_shared = max(1, int(min_score * len(query_grams) / 2))
+        scored = []
+        for idx, count in shared.items():
+            if count < min_shared:
+                continue
+            score = 2 * count / (len(query_grams) + self._trigram_counts[idx])
+            name_lc = self._names_lower[idx]
+            if name_lc.startswith(query_lc):
+                score += 0.5
+            elif f" {query_lc}" in f" {name_lc}":
+                score += 0.25
+            if score >= min_score:
+                scored.append((score, name_lc, idx))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[str]:
+        """
+        Returns up to limit display names that best match query, best first.
+
+        Args:
+            query (str): Full or partial athlete name, possibly misspelled.
+            limit (int): Maximum number of names to return.
+            min_score (float): Minimum similarity (0-1) for a name to be returned.
+        """
+        return [self._names[idx] for _, _, idx in self._scored(query, min_score)[:limit]]
+
+    def best_match(self, query: str, min_score: float = 0.9) -> Optional[Tuple[str, str, float]]:
+        """
+        Returns (display name, slug, score) of the single best match, or None if no name
+        scores at least min_score or the top two are tied (ambiguous).
+        """
+        exact = self.get(query.strip())
+        if exact:
+            return exact[0], exact[1], 1.5
+        scored = self._scored(query, min_score)
+        if not scored or (len(scored) > 1 and scored[0][0] == scored[1][0]):
+            return None
+        _, _, idx = scored[0]
+        return self._names[idx], self._slugs[idx], scored[0][0]
+
+    def get(self, name: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns (display name, slug) for an exact, case-insensitive name match.
+        """
+        idx = self._id_by_name.get(name.lower())
+        if idx is None:
+            return None
+        return self._names[idx], self._slugs[idx]
+
+    def name_to_slug(self, name: str) -> Optional[str]:
+        entry = self.get(name)
+        return entry[1] if entry else None
+
+    def slug_to_name(self, slug: str) -> Optional[str]:
+        return self._name_by_slug.get(slug)
+
+
+def load_athlete_name_index(bq_client: bigquery.Client) -> AthleteNameIndex:
+    """
+    Builds an AthleteNameIndex over every athlete in fct_race_results.
+    """
+    query = """
+        SELECT DISTINCT athlete_name, athlete_slug
+        FROM `trilytx.trilytx_fct.fct_race_results`
+        WHERE athlete_slug IS NOT NULL
+        ORDER BY athlete_name
+    """
+    df = fetch_dataframe(query, bq_client)
+    return AthleteNameIndex(zip(df["athlete_name"], df["athlete_slug"]))
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+def get_athlete_name_index(bq_client: bigquery.Client) -> AthleteNameIndex:
+    """
+    Returns the process-wide athlete name index, rebuilding it every ATHLETE_INDEX_REFRESH_SECONDS.
+    """
+    global _index, _index_built_at
+    if _index is None or time.monotonic() - _index_built_at > ATHLETE_INDEX_REFRESH_SECONDS:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index_built_at > ATHLETE_INDEX_REFRESH_SECONDS:
+                try:
+                    _index = load_athlete_name_index(bq_client)
+                except Exception as e:
+                    if _index is None:
+                        raise
+                    # Keep serving the previous index; retry on the next refresh interval
+                    logger.error("Failed to refresh athlete name index: %s", e)
+                _index_built_at = time.monotonic()
+    return _index
@@ -1,5 +1,16 @@
+import hashlib
 import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import db_dtypes
 import pandas as pd
+import pyarrow as pa
+import requests
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
 from google.oauth2 import service_account
 import os
@@ -30,6 +41,20 @@ except ImportError:
             return os.environ.get("OPENAI_API_KEY_LOCAL_DEV") # Or another local env var name
         return None
 
+from config.app_config import (
+    USE_LOCAL, BQ_HTTP_POOL_CONNECTIONS, BQ_HTTP_POOL_MAXSIZE, BQ_QUERY_MAX_WORKERS, BQ_STORAGE_MIN_ROWS, LOCAL_MIRROR_ENABLED,
+    QUERY_CACHE_MAX_BYTES, QUERY_CACHE_DEFAULT_TTL_SECONDS, QUERY_CACHE_TABLE_TTL_SECONDS,
+)
+from utils.cache_utils import TTLDataFrameCache
+
+try:
+    from google.cloud import bigquery_storage
+except ImportError:
+    # Without google-cloud-bigquery-storage every fetch falls back to the REST paginator.
+    bigquery_storage = None
+
+logger = logging.getLogger(__name__)
+
 def load_credentials(use_local: int):
     """
     Loads Google Cloud and OpenAI credentials based on the USE_LOCAL flag.
@@ -68,6 +93,109 @@ def load_credentials(use_local: int):
 
     return credentials, project_id, openai_key
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Process-wide Shared Client
+# ──────────────────────────────────────────────────────────────────────────────
+# Streamlit re-executes page scripts on every interaction, but imported modules
+# stay loaded for the lifetime of the process. Holding the credentials, the
+# HTTP session and the client here means every rerun, every session and the
+# recap generators share one connection pool instead of re-parsing the service
+# account key and re-doing the TLS handshake on each widget interaction.
+_CLIENT_LOCK = threading.Lock()
+_shared_credentials = None
+_shared_client = None
+_shared_adapter = None
+_shared_bqstorage_client = None
+_pool_counters = {"credential_loads": 0, "clients_created": 0, "client_requests": 0}
+
+def get_credentials(use_local: int = USE_LOCAL):
+    """
+    Returns the (credentials, project_id, openai_key) tuple, loading it only once per process.
+
+    Args:
+        use_local (int): Passed through to load_credentials on first use.
+
+    Returns:
+        tuple: (credentials, project_id, openai_key)
+    """
+    global _shared_credentials
+    if _shared_credentials is None:
+        with _CLIENT_LOCK:
+            if _shared_credentials is None:
+                _shared_credentials = load_credentials(use_local)
+                _pool_counters["credential_loads"] += 1
+    return _shared_credentials
+
+def get_bq_client(use_local: int = USE_LOCAL) -> bigquery.Client:
+    """
+    Returns the process-wide BigQuery client, creating it and its HTTP connection pool on first use.
+
+    Args:
+        use_local (int): Passed through to get_credentials on first use.
+
+    Returns:
+        bigquery.Client: A client shared across reruns, sessions and background helpers.
+    """
+    global _shared_client, _shared_adapter
+    credentials, project_id, _ = get_credentials(use_local)
+    with _CLIENT_LOCK:
+        _pool_counters["client_requests"] += 1
+        if _shared_client is None:
+            session = AuthorizedSession(credentials)
+            _shared_adapter = requests.adapters.HTTPAdapter(
+                pool_connections=BQ_HTTP_POOL_CONNECTIONS,
+                pool_maxsize=BQ_HTTP_POOL_MAXSIZE,
+            )
+            session.mount("https://", _shared_adapter)
+            _shared_client = bigquery.Client(credentials=credentials, project=project_id, _http=session)
+            _pool_counters["clients_created"] += 1
+        return _shared_client
+
+def get_bqstorage_client(use_local: int = USE_LOCAL):
+    """
+    Returns the process-wide BigQuery Storage Read API client, or None if the library is unavailable.
+
+    Args:
+        use_local (int): Passed through to get_credentials on first use.
+
+    Returns:
+        bigquery_storage.BigQueryReadClient | None: The shared read client.
+    """
+    global _shared_bqstorage_client
+    if bigquery_storage is None:
+        return None
+    credentials, _, _ = get_credentials(use_local)
+    with _CLIENT_LOCK:
+        if _shared_bqstorage_client is None:
+            _shared_bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=credentials)
+        return _shared_bqstorage_client
+
+def get_bq_pool_stats() -> dict:
+    """
+    Reports how often the shared client has been reused and the state of its connection pools.
+
+    Returns:
+        dict: Creation/reuse counters plus per-host connection and request counts.
+    """
+    with _CLIENT_LOCK:
+        stats = dict(_pool_counters)
+        stats["client_reuses"] = max(stats["client_requests"] - stats["clients_created"], 0)
+        stats["pool_maxsize"] = BQ_HTTP_POOL_MAXSIZE
+        hosts = {}
+        if _shared_adapter is not None:
+            pools = _shared_adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts[pool.host] = {
+                    "connections_opened": pool.num_connections,
+                    "requests_sent": pool.num_requests,
+                    "idle_connections": pool.pool.qsize() if pool.pool is not None else 0,
+                }
+        stats["hosts"] = hosts
+        return stats
+
 def extract_table_schema(client: bigquery.Client, dataset_id: str, table_id: str) -> dict:
     """
     Extracts the schema (description and field details) for a given BigQuery table.
@@ -91,21 +219,356 @@ def extract_table_schema(client: bigquery.Client, dataset_id: str, table_id: str
         st.error(f"Error extracting schema for {dataset_id}.{table_id}: {e}")
         return {"description": "", "fields": {}} # Return empty structure on error
 
-def run_bigquery(query: str, client: bigquery.Client) -> pd.DataFrame:
+# ──────────────────────────────────────────────────────────────────────────────
+# Arrow Fetch Path
+# ──────────────────────────────────────────────────────────────────────────────
+_FETCH_STATS_LOCK = threading.Lock()
+_fetch_stats = {
+    path: {"queries": 0, "rows": 0, "download_seconds": 0.0}
+    for path in ("storage", "rest")
+}
+
+# Same null-safe dtypes RowIterator.to_dataframe() produces by default, so callers
+# see identical columns whichever path served the rows.
+_ARROW_TYPES_MAPPER = {
+    pa.bool_(): pd.BooleanDtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.date32(): db_dtypes.DateDtype(),
+    pa.time64("us"): db_dtypes.TimeDtype(),
+}.get
+
+def _record_fetch(path: str, num_rows: int, seconds: float) -> None:
+    with _FETCH_STATS_LOCK:
+        stats = _fetch_stats[path]
+        stats["queries"] += 1
+        stats["rows"] += num_rows
+        stats["download_seconds"] += seconds
+    rows_per_sec = num_rows / seconds if seconds > 0 else float("inf")
+    logger.info("Fetched %d rows via %s in %.3fs (%.0f rows/sec)", num_rows, path, seconds, rows_per_sec)
+
+def get_fetch_stats() -> dict:
+    """
+    Returns row counts, download time and rows/sec for the Storage Read API and REST paths.
+    """
+    with _FETCH_STATS_LOCK:
+        report = {}
+        for path, stats in _fetch_stats.items():
+            seconds = stats["download_seconds"]
+            report[path] = {
+                **stats,
+                "rows_per_sec": round(stats["rows"] / seconds, 1) if seconds > 0 else 0.0,
+            }
+        return report
+
+def arrow_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """
+    Converts an Arrow table to a DataFrame with the same dtypes fetch_dataframe() produces.
+    """
+    return table.to_pandas(types_mapper=_ARROW_TYPES_MAPPER, integer_object_nulls=True)
+
+def _download_arrow(rows, bqstorage_client) -> pa.Table:
+    batches = list(rows.to_arrow_iterable(bqstorage_client=bqstorage_client))
+    if not batches:
+        # No batches means no rows; to_arrow still knows the schema
+        return rows.to_arrow(create_bqstorage_client=False)
+    return pa.Table.from_batches(batches)
+
+def fetch_arrow(query: str, client: bigquery.Client,
+                job_config: Optional[bigquery.QueryJobConfig] = None) -> pa.Table:
+    """
+    Executes a query and returns the result as an Arrow table.
+    Results of at least BQ_STORAGE_MIN_ROWS rows are streamed through the BigQuery
+    Storage Read API; smaller results, or any failure of the Storage API, use the
+    REST row paginator.
+
+    Args:
+        query (str): The SQL query string to execute.
+        client (bigquery.Client): An initialized BigQuery client.
+        job_config (bigquery.QueryJobConfig, optional): Query parameters and job options.
+
+    Returns:
+        pa.Table: The query results.
+    """
+    job = client.query(query, job_config=job_config)
+    rows = job.result()
+
+    bqstorage_client = None
+    try:
+        bqstorage_client = get_bqstorage_client()
+    except Exception as e:
+        logger.warning("BigQuery Storage client unavailable, using REST: %s", e)
+
+    # Small results come back in the first REST page; a Storage read session is not worth opening
+    if bqstorage_client is not None and (rows.total_rows or 0) < BQ_STORAGE_MIN_ROWS:
+        bqstorage_client = None
+    path = "storage" if bqstorage_client is not None else "rest"
+    start = time.perf_counter()
+    try:
+        table = _download_arrow(rows, bqstorage_client)
+    except Exception as e:
+        if bqstorage_client is None:
+            raise
+        logger.warning("Storage Read API fetch failed, retrying over REST: %s", e)
+        path = "rest"
+        start = time.perf_counter()
+        table = _download_arrow(job.result(), None)
+
+    _record_fetch(path, table.num_rows, time.perf_counter() - start)
+    return table
+
+def fetch_dataframe(query: str, client: bigquery.Client,
+                    job_config: Optional[bigquery.QueryJobConfig] = None,
+                    prefer_local: bool = False) -> pd.DataFrame:
+    """
+    Executes a query and builds a DataFrame from Arrow record batches (see fetch_arrow).
+
+    Args:
+        query (str): The SQL query string to execute.
+        client (bigquery.Client): An initialized BigQuery client.
+        job_config (bigquery.QueryJobConfig, optional): Query parameters and job options.
+        prefer_local (bool): Serve the query from the local DuckDB mirror when it is
+            enabled and can answer it, falling back to BigQuery otherwise. Only for
+            read-only page queries over the mirrored tables.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the query results.
+    """
+    if prefer_local and LOCAL_MIRROR_ENABLED:
+        # Imported here because utils.local_mirror builds on this module
+        from utils.local_mirror import get_local_mirror
+
+        mirror = get_local_mirror(client)
+        if mirror is not None:
+            df = mirror.query(query, job_config)
+            if df is not None:
+                return df
+    return arrow_to_dataframe(fetch_arrow(query, client, job_config))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Concurrent Queries
+# ──────────────────────────────────────────────────────────────────────────────
+# Shared by all sessions; sized below BQ_HTTP_POOL_MAXSIZE so concurrent queries
+# reuse keep-alive connections instead of opening new ones.
+_query_executor = ThreadPoolExecutor(max_workers=BQ_QUERY_MAX_WORKERS, thread_name_prefix="bq-query")
+
+def _with_script_run_ctx(fn: Callable[[], Any]) -> Callable[[], Any]:
+    # Worker threads need the calling script's context for st.cache_data and st.* calls
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return fn
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return fn
+
+    def run():
+        add_script_run_ctx(ctx=ctx)
+        return fn()
+    return run
+
+def submit_query(fn: Callable[[], Any]) -> Future:
+    """
+    Runs a zero-argument query function on the shared query thread pool.
+    """
+    return _query_executor.submit(_with_script_run_ctx(fn))
+
+def run_concurrently(calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Runs independent query functions at the same time and waits for all of them,
+    so the wait is the slowest query rather than the sum of all of them.
+
+    Args:
+        calls (dict): Name -> zero-argument callable, e.g.
+            {"results": lambda: get_race_results(race_id)}.
+
+    Returns:
+        dict: Name -> return value. If any call raised, the first failure (in
+        the order given) is re-raised once every call has finished.
+    """
+    if len(calls) <= 1:
+        return {name: fn() for name, fn in calls.items()}
+    futures = {name: submit_query(fn) for name, fn in calls.items()}
+    results, first_error = {}, None
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+    if first_error is not None:
+        raise first_error
+    return results
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Query Result Cache
+# ──────────────────────────────────────────────────────────────────────────────
+_query_cache = TTLDataFrameCache(
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    default_ttl_seconds=QUERY_CACHE_DEFAULT_TTL_SECONDS,
+)
+_TABLE_NAME_PATTERN = re.compile(r"\b((?:fct|agg)_[a-z0-9_]+)")
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonicalizes SQL text so trivially different spellings of the same query share a cache key.
+    Comments are removed, whitespace runs outside string literals collapse to one space,
+    and a trailing semicolon is dropped. Case is preserved because BigQuery table names
+    are case-sensitive.
+
+    Args:
+        query (str): The SQL query string.
+
+    Returns:
+        str: The normalized SQL.
+    """
+    out = []
+    i, n = 0, len(query)
+    pending_space = False
+    while i < n:
+        ch = query[i]
+        if ch in ("'", '"', "`"):
+            # Copy the literal/quoted identifier verbatim, honouring backslash escapes
+            j = i + 1
+            while j < n and query[j] != ch:
+                j += 2 if query[j] == "\\" else 1
+            token = query[i:j + 1]
+            i = j + 1
+        elif query.startswith("--", i) or ch == "#":
+            j = query.find("\n", i)
+            i = n if j == -1 else j
+            pending_space = True
+            continue
+        elif query.startswith("/*", i):
+            j = query.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        else:
+            token = ch
+            i += 1
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(token)
+    return "".join(out).rstrip("; ")
+
+def _is_cacheable(job_config: Optional[bigquery.QueryJobConfig]) -> bool:
+    # Dry runs return no rows and use_query_cache=False asks for a fresh execution
+    return job_config is None or not (job_config.dry_run or job_config.use_query_cache is False)
+
+def _query_cache_key(normalized_query: str, job_config: Optional[bigquery.QueryJobConfig]) -> str:
+    # The whole job config (parameters, maximum_bytes_billed, ...) is part of the key,
+    # so a result is only reused for a call that asked for the same job semantics
+    job = job_config.to_api_repr() if job_config is not None else {}
+    payload = json.dumps({"sql": normalized_query, "job": job}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _query_cache_ttl(normalized_query: str) -> float:
+    # A query is only as fresh as the most frequently refreshed table it reads
+    tables = set(_TABLE_NAME_PATTERN.findall(normalized_query))
+    ttls = [QUERY_CACHE_TABLE_TTL_SECONDS.get(t, QUERY_CACHE_DEFAULT_TTL_SECONDS) for t in tables]
+    return min(ttls) if ttls else QUERY_CACHE_DEFAULT_TTL_SECONDS
+
+def get_query_cache_stats() -> dict:
+    """
+    Returns hit/miss counters and memory usage of the run_bigquery result cache.
+    """
+    return _query_cache.stats()
+
+def run_bigquery(query: str, client: bigquery.Client,
+                 job_config: Optional[bigquery.QueryJobConfig] = None,
+                 use_cache: bool = True, prefer_local: bool = False) -> pd.DataFrame:
     """
     Executes a BigQuery SQL query and returns the results as a Pandas DataFrame.
+    Results are cached process-wide, keyed on the normalized SQL plus the job config
+    (query parameters and job options), with a TTL tied to the refresh cadence of the
+    tables the query reads. Dry runs and use_query_cache=False bypass the cache.
 
     Args:
         query (str): The SQL query string to execute.
         client (bigquery.Client): An initialized BigQuery client.
+        job_config (bigquery.QueryJobConfig, optional): Query parameters and job options.
+        use_cache (bool): Set to False to always execute against BigQuery.
+        prefer_local (bool): Passed to fetch_dataframe (serve from the local mirror when enabled).
 
     Returns:
         pd.DataFrame: A DataFrame containing the query results.
     """
+    cache_key = None
+    if use_cache and _is_cacheable(job_config):
+        normalized_query = normalize_sql(query)
+        cache_key = _query_cache_key(normalized_query, job_config)
+        cached_df = _query_cache.get(cache_key)
+        if cached_df is not None:
+            return cached_df
+
     try:
-        return client.query(query).to_dataframe()
+        df = fetch_dataframe(query, client, job_config, prefer_local=prefer_local)
     except Exception as e:
         # In a production app, you might re-raise after logging or
         # handle more gracefully, but for now, Streamlit's error logging
         # will catch it higher up.
-        raise e # Re-raise the exception to be caught in Home.py's try-except block
\ No newline at end of file
+        raise e # Re-raise the exception to be caught in Home.py's try-except block
+
+    if cache_key is not None:
+        _query_cache.set(cache_key, df, ttl_seconds=_query_cache_ttl(normalized_query))
+    return df
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Dry Runs
+# ──────────────────────────────────────────────────────────────────────────────
+_dry_run_stats = {"dry_runs": 0, "rejected": 0, "seconds": 0.0, "bytes_estimated": 0}
+
+def dry_run_query(query: str, client: bigquery.Client,
+                  job_config: Optional[bigquery.QueryJobConfig] = None) -> int:
+    """
+    Validates a query with a BigQuery dry run, which is free and reads no data.
+    Syntax errors, unknown tables/columns and type errors raise the same exception a
+    real run would.
+
+    Args:
+        query (str): The SQL query string to validate.
+        client (bigquery.Client): An initialized BigQuery client.
+        job_config (bigquery.QueryJobConfig, optional): Only its query parameters are used.
+
+    Returns:
+        int: Estimated bytes the query would process.
+    """
+    dry_run_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    if job_config is not None and job_config.query_parameters:
+        dry_run_config.query_parameters = job_config.query_parameters
+    start = time.perf_counter()
+    try:
+        job = client.query(query, job_config=dry_run_config)
+    except Exception:
+        with _FETCH_STATS_LOCK:
+            _dry_run_stats["dry_runs"] += 1
+            _dry_run_stats["rejected"] += 1
+            _dry_run_stats["seconds"] += time.perf_counter() - start
+        raise
+    estimated_bytes = job.total_bytes_processed or 0
+    with _FETCH_STATS_LOCK:
+        _dry_run_stats["dry_runs"] += 1
+        _dry_run_stats["seconds"] += time.perf_counter() - start
+        _dry_run_stats["bytes_estimated"] += estimated_bytes
+    return estimated_bytes
+
+def get_dry_run_stats() -> dict:
+    """
+    Returns how many dry runs were made, how many rejected a query (each one a real
+    execution avoided) and the time spent on them.
+    """
+    with _FETCH_STATS_LOCK:
+        return dict(_dry_run_stats)
+
+def is_query_result_cached(query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> bool:
+    """
+    Returns True if run_bigquery would answer the query from its result cache.
+    """
+    if not _is_cacheable(job_config):
+        return False
+    return _query_cache_key(normalize_sql(query), job_config) in _query_cache
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+
+
+class TTLDataFrameCache:
+    """
+    Thread-safe in-memory cache of DataFrames with a per-entry TTL and an LRU byte budget.
+
+    Entries are evicted least-recently-used first whenever the summed in-memory size
+    of the cached frames exceeds max_bytes. Expired entries are dropped on access.
+    Stored and returned frames are copies so callers can mutate their results freely.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.default_ttl_seconds = default_ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, nbytes, df)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Returns a copy of the cached DataFrame for key, or None on a miss or expired entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, nbytes, df = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return df.copy()
+
+    def __contains__(self, key: str) -> bool:
+        # Unexpired entry present; does not count as a hit or miss or refresh LRU order
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, key: str, df: pd.DataFrame, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Stores a copy of df under key. Frames larger than the whole budget are not cached.
+        """
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        ttl = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, nbytes, df.copy())
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._drop(oldest_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters and current memory usage.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _drop(self, key: str) -> None:
+        # Caller must hold self._lock
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
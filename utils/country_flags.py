@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import pycountry
+
+from config.app_config import COUNTRY_FLAG_LRU_SIZE, COUNTRY_FLAG_BUILD_BUDGET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Spellings pycountry does not resolve, mapped to flagicons codes
+COUNTRY_CODE_ALIASES = {
+    "great britain": "gb",
+    "england": "gb-eng",
+    "scotland": "gb-sct",
+    "wales": "gb-wls",
+    "northern ireland": "gb-nir",
+    "russia": "ru",
+    "korea": "kr",
+    "turkey": "tr",
+    "kosovo": "xk",
+}
+
+_MISSING = object()
+
+def _normalize(country: str) -> str:
+    return " ".join(str(country).split()).lower()
+
+def lookup_country_code(country: str) -> Optional[str]:
+    """
+    Resolves a country spelling to a lowercase flag code (usually ISO alpha-2) via pycountry.
+    Returns None if it cannot be resolved.
+    """
+    key = _normalize(country)
+    if not key:
+        return None
+    if key in COUNTRY_CODE_ALIASES:
+        return COUNTRY_CODE_ALIASES[key]
+    try:
+        return pycountry.countries.lookup(key).alpha_2.lower()
+    except LookupError:
+        return None
+
+
+class CountryFlagResolver:
+    """
+    Process-wide country -> flag code lookup.
+
+    A table precomputed from the distinct athlete_country values answers most lookups
+    with one dict access. Spellings not in the table are resolved with pycountry once
+    and kept in a bounded LRU; misses are cached too (as None), so an unknown country
+    is never searched for twice while it stays in the LRU.
+    """
+
+    def __init__(self, lru_size: int = COUNTRY_FLAG_LRU_SIZE):
+        self.lru_size = lru_size
+        self._table = {}            # normalized spelling -> code or None
+        self._lru = OrderedDict()   # normalized spelling -> code or None
+        self._lock = threading.Lock()
+        self.table_hits = 0
+        self.lru_hits = 0
+        self.lookups = 0
+        self.unresolved = 0
+
+    def build(self, countries: Iterable[str], time_budget_seconds: float = COUNTRY_FLAG_BUILD_BUDGET_SECONDS) -> int:
+        """
+        Precomputes codes for the given spellings, stopping once time_budget_seconds is spent.
+        Spellings left over are resolved lazily. Returns the number precomputed.
+        """
+        deadline = time.monotonic() + time_budget_seconds
+        table = {}
+        for country in countries:
+            if time.monotonic() > deadline:
+                logger.warning("Country flag table build stopped after %d entries (time budget %.1fs)",
+                               len(table), time_budget_seconds)
+                break
+            key = _normalize(country)
+            if key and key not in table:
+                table[key] = lookup_country_code(key)
+        with self._lock:
+            self._table.update(table)
+        return len(table)
+
+    def resolve(self, country: str) -> Optional[str]:
+        """
+        Returns the flag code for a country spelling, or None if it is unknown.
+        """
+        key = _normalize(country)
+        with self._lock:
+            code = self._table.get(key, _MISSING)
+            if code is not _MISSING:
+                self.table_hits += 1
+                if code is None:
+                    self.unresolved += 1
+                return code
+            code = self._lru.get(key, _MISSING)
+            if code is not _MISSING:
+                self._lru.move_to_end(key)
+                self.lru_hits += 1
+                if code is None:
+                    self.unresolved += 1
+                return code
+
+        code = lookup_country_code(key)
+        with self._lock:
+            self.lookups += 1
+            if code is None:
+                self.unresolved += 1
+            self._lru[key] = code
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return code
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.table_hits + self.lru_hits + self.lookups
+            return {
+                "table_entries": len(self._table),
+                "lru_entries": len(self._lru),
+                "table_hits": self.table_hits,
+                "lru_hits": self.lru_hits,
+                "lookups": self.lookups,
+                "unresolved": self.unresolved,
+                "hit_rate": round((self.table_hits + self.lru_hits) / total, 4) if total else 0.0,
+            }
+
+
+def load_athlete_countries() -> list:
+    """
+    Returns the distinct athlete_country spellings in fct_race_results.
+    """
+    from utils.bq_utils import get_bq_client, run_bigquery
+
+    query = """
+        SELECT DISTINCT athlete_country
+        FROM `trilytx.trilytx_fct.fct_race_results`
+        WHERE athlete_country IS NOT NULL
+    """
+    return run_bigquery(query, get_bq_client())["athlete_country"].tolist()
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_country_flag_resolver() -> CountryFlagResolver:
+    """
+    Returns the process-wide resolver, precomputing the table from fct_race_results on first use.
+    If the countries cannot be loaded, every spelling is resolved lazily instead.
+    """
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                resolver = CountryFlagResolver()
+                try:
+                    resolver.build(load_athlete_countries())
+                except Exception as e:
+                    logger.error("Could not precompute country flag table: %s", e)
+                _resolver = resolver
+    return _resolver
+
+def get_country_flag_stats() -> dict:
+    """
+    Returns hit-rate and size metrics for the country flag lookup.
+    """
+    return get_country_flag_resolver().stats()
@@ -0,0 +1,51 @@
+import sys
+
+from utils.question_cache import QuestionSQLCache
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Regression checks for the question -> SQL cache
+# ──────────────────────────────────────────────────────────────────────────────
+# Usage:
+#   python -m utils.evaluate_question_cache
+#
+# Each case caches SQL for the first question and looks up the second. Pairs whose
+# answers differ must miss; rephrasings of the same question should hit.
+
+MUST_MISS = [
+    ("which men finished with the fastest bike splits at Ironman Kona in 2024 among all pro athletes who started",
+     "which women finished with the fastest bike splits at Ironman Kona in 2024 among all pro athletes who started"),
+    ("show the fastest run splits of the male pros at Challenge Roth 2024 for every finisher in the field",
+     "show the fastest run splits of the female pros at Challenge Roth 2024 for every finisher in the field"),
+    ("how many races did Lionel Sanders win at Ironman events between 2019 and 2024 including championships",
+     "how many races did Lucy Charles-Barclay win at Ironman events between 2019 and 2024 including championships"),
+    ("which athletes finished the Ironman Kona 2024 race under eight hours with a run split under three",
+     "which athletes did not finish the Ironman Kona 2024 race under eight hours with a run split under three"),
+    ("who won Ironman Kona in 2023", "who won Ironman Kona in 2024"),
+]
+
+SHOULD_HIT = [
+    ("who won the women's race at Ironman Kona in 2024", "who won the womens race at Ironman Kona 2024?"),
+    ("show me the podium results for T100 San Francisco 2025", "give the podium results of the T100 San Francisco 2025 race"),
+]
+
+def run_cases():
+    failures = []
+    for cases, expect_hit in ((MUST_MISS, False), (SHOULD_HIT, True)):
+        for cached_question, question in cases:
+            cache = QuestionSQLCache()
+            cache.add(cached_question, "SELECT 1")
+            if (cache.lookup(question) is not None) != expect_hit:
+                failures.append((cached_question, question, "expected hit" if expect_hit else "expected miss"))
+    return failures
+
+def main():
+    failures = run_cases()
+    total = len(MUST_MISS) + len(SHOULD_HIT)
+    for cached_question, question, expected in failures:
+        print(f"FAIL ({expected}): {cached_question!r} -> {question!r}")
+    print(f"{total - len(failures)}/{total} question cache cases passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
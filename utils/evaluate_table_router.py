@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import time
+
+from config.app_config import QUESTION_CACHE_WARM_START_PATH, TABLE_ROUTER_MODEL_PATH, TABLE_ROUTER_MIN_CONFIDENCE
+from utils.llm_utils import extract_table_names
+from utils.question_cache import load_question_log_export
+from utils.table_router import TableRouter
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Offline evaluation of the local table router against the question log
+# ──────────────────────────────────────────────────────────────────────────────
+# Usage:
+#   python -m utils.evaluate_table_router [path/to/question_log.jsonl] [--save]
+#
+# Labels are the tables referenced by each logged question's generated SQL. The
+# log is split into train/test sets; the router is trained on the former and
+# scored on the latter, both with rules only and with the trained model.
+# The hand-labelled ROUTING_CASES below are scored on every run as well.
+
+# Question shapes the rules have routed wrongly with high confidence before.
+# A confident route here must be the labelled one.
+ROUTING_CASES = [
+    ("top 5 women at Challenge Roth 2024", ["fct_race_results"]),
+    ("top 10 men at Ironman Kona 2023", ["fct_race_results"]),
+    ("who were the top 3 at the 2024 T100 San Francisco", ["fct_race_results"]),
+    ("best bike splits at Challenge Roth 2024", ["fct_race_results"]),
+    ("who won the women's race at Ironman Frankfurt 2025", ["fct_race_results"]),
+    ("who are the top 10 runners by pto score", ["fct_pto_scores_weekly"]),
+    ("top 10 ranked cyclists right now", ["fct_pto_scores_weekly"]),
+    ("which athletes gained the most positions after the swim at Kona 2024", ["fct_race_segment_positions"]),
+    ("who overperformed their predicted finish the most in 2024", ["fct_race_results_vs_predict"]),
+]
+
+def load_labelled_questions(path: str):
+    """
+    Returns (question, tables) pairs from a question log export, skipping rows with no usable SQL.
+    """
+    examples = []
+    for record in load_question_log_export(path):
+        question = (record.get("question") or "").strip()
+        tables = sorted(extract_table_names(record.get("generated_sql") or ""))
+        if question and tables:
+            examples.append((question, tables))
+    return examples
+
+def evaluate(router: TableRouter, examples, threshold: float, llm_latency_seconds: float) -> dict:
+    exact = top1 = confident = confident_exact = 0
+    start = time.perf_counter()
+    for question, gold in examples:
+        tables, confidence = router.route(question)
+        is_exact = sorted(tables) == gold
+        exact += is_exact
+        top1 += bool(tables) and tables[0] in gold
+        if tables and confidence >= threshold:
+            confident += 1
+            confident_exact += is_exact
+    elapsed = time.perf_counter() - start
+    n = len(examples) or 1
+    return {
+        "questions": len(examples),
+        "exact_match_accuracy": round(exact / n, 4),
+        "top1_accuracy": round(top1 / n, 4),
+        "routed_locally": round(confident / n, 4),
+        "accuracy_when_routed_locally": round(confident_exact / confident, 4) if confident else 0.0,
+        "router_latency_us": round(elapsed / n * 1e6, 1),
+        "llm_calls_avoided": confident,
+        "llm_seconds_saved": round(confident * llm_latency_seconds, 1),
+    }
+
+def confident_mistakes(router: TableRouter, examples, threshold: float):
+    """
+    Returns (question, routed tables, confidence, expected tables) for every confident wrong route.
+    """
+    mistakes = []
+    for question, gold in examples:
+        tables, confidence = router.route(question)
+        if tables and confidence >= threshold and sorted(tables) != sorted(gold):
+            mistakes.append((question, tables, round(confidence, 3), gold))
+    return mistakes
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local chatbot table router.")
+    parser.add_argument("path", nargs="?", default=QUESTION_CACHE_WARM_START_PATH,
+                        help="JSONL/CSV export of the chatbot question log")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=TABLE_ROUTER_MIN_CONFIDENCE)
+    parser.add_argument("--llm-latency-seconds", type=float, default=2.0,
+                        help="Typical latency of the GPT table-selection call, for the savings estimate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", action="store_true",
+                        help=f"Train on the full log and write the model to {TABLE_ROUTER_MODEL_PATH}")
+    args = parser.parse_args()
+
+    print(f"Built-in routing cases: {len(ROUTING_CASES)}")
+    mistakes = confident_mistakes(TableRouter(), ROUTING_CASES, args.threshold)
+    for question, tables, confidence, gold in mistakes:
+        print(f"  CONFIDENT MISTAKE: {question!r} -> {tables} ({confidence}), expected {gold}")
+    print(f"  rules_only: {evaluate(TableRouter(), ROUTING_CASES, args.threshold, args.llm_latency_seconds)}\n")
+
+    examples = load_labelled_questions(args.path) if args.path and os.path.exists(args.path) else []
+    if not examples:
+        print(f"No labelled questions found in {args.path}")
+        return
+    random.Random(args.seed).shuffle(examples)
+    n_test = max(1, int(len(examples) * args.test_fraction))
+    test, train = examples[:n_test], examples[n_test:]
+
+    results = {"rules_only": evaluate(TableRouter(), test, args.threshold, args.llm_latency_seconds)}
+    if train:
+        model = TableRouter().fit([q for q, _ in train], [t for _, t in train], seed=args.seed)
+        results["trained"] = evaluate(model, test, args.threshold, args.llm_latency_seconds)
+
+    print(f"Train: {len(train)}  Test: {len(test)}  Threshold: {args.threshold}")
+    for name, metrics in results.items():
+        print(f"\n{name}")
+        for key, value in metrics.items():
+            print(f"  {key}: {value}")
+
+    if args.save:
+        TableRouter().fit([q for q, _ in examples], [t for _, t in examples], seed=args.seed).save(TABLE_ROUTER_MODEL_PATH)
+        print(f"\nSaved model trained on {len(examples)} questions to {TABLE_ROUTER_MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,41 +6,65 @@ import sys
 import json
 import pandas as pd
 from google.cloud import bigquery
-from openai import OpenAI 
 from datetime import datetime
+from typing import Dict, Iterator, List
 
-from utils.bq_utils import load_credentials
-from config.app_config import USE_LOCAL
+from utils.bq_utils import get_bq_client, get_credentials, run_bigquery
+from utils.llm_gateway import generate_text, stream_generated_text
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 1) Credentials & BigQuery Client
 # ──────────────────────────────────────────────────────────────────────────────
-
-def get_bq_client(credentials, project_id):
-    """
-    Returns a bigquery.Client authenticated with trilytx_credentials.
-    """
-    return bigquery.Client(
-        credentials=credentials,
-        project=project_id
-    )
+# The client is shared process-wide via utils.bq_utils.get_bq_client.
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 2) Data Pull & Aggregation
 # ──────────────────────────────────────────────────────────────────────────────
-def load_race_predict_v_results_data(bq_client):
-    query = """
-        SELECT * FROM trilytx.trilytx_aggregate.agg_race_predict_vs_results
+RACE_RESULTS_DETAIL_COLUMNS = [
+    "athlete_name","overall_pto_rank", "overall_actual_rank", "overall_delta",
+    "swim_delta", "swim_actual_rank", "bike_delta", "bike_actual_rank", "run_delta", "run_actual_rank", "swim_time", "bike_time", "run_time", "overall_time",
+    "sof","race_distance","race_gender","race_name", "race_location", "race_date",
+    "race_overall_delta_rank_desc", "race_overall_delta_rank_asc" ,
+    "race_swim_delta_rank_desc", "race_swim_delta_rank_asc" ,
+    "race_bike_delta_rank_desc", "race_bike_delta_rank_asc" ,
+    "race_run_delta_rank_desc", "race_run_delta_rank_asc" 
+]
+
+RACE_POSITION_DETAIL_COLUMNS = [
+    "athlete_name",  "cumulative_seconds_after_swim", "cumulative_seconds_after_t1", "cumulative_seconds_after_bike",
+    "cumulative_seconds_after_t2", "cumulative_seconds_after_run", "rank_after_swim", "rank_after_t1", "rank_after_bike",
+    "rank_after_t2", "rank_after_run", "position_change_in_t1", "position_change_on_bike", "position_change_in_t2", "position_change_on_run",
+    "race_position_change_bike_rank_desc", "race_position_change_run_rank_desc","race_position_change_bike_rank_asc", "race_position_change_run_rank_asc"
+]
+
+def _race_ids_job_config(race_ids: List[str]) -> bigquery.QueryJobConfig:
+    return bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("race_ids", "STRING", list(race_ids))]
+    )
+
+def load_race_predict_v_results_data(bq_client, race_ids: List[str]):
+    """
+    Loads predicted-vs-actual rows for the given races only, limited to the columns used in the recap prompt.
     """
-    return bq_client.query(query).to_dataframe()
+    query = f"""
+        SELECT unique_race_id, {", ".join(RACE_RESULTS_DETAIL_COLUMNS)}
+        FROM trilytx.trilytx_aggregate.agg_race_predict_vs_results
+        WHERE unique_race_id IN UNNEST(@race_ids)
+    """
+    return run_bigquery(query, bq_client, _race_ids_job_config(race_ids))
 
-def load_race_segment_positions_data(bq_client):
-    query = """
-        SELECT * FROM trilytx.trilytx_aggregate.agg_race_segment_positions
+def load_race_segment_positions_data(bq_client, race_ids: List[str]):
+    """
+    Loads segment position rows for the given races only, limited to the columns used in the recap prompt.
     """
-    return bq_client.query(query).to_dataframe()
+    query = f"""
+        SELECT unique_race_id, {", ".join(RACE_POSITION_DETAIL_COLUMNS)}
+        FROM trilytx.trilytx_aggregate.agg_race_segment_positions
+        WHERE unique_race_id IN UNNEST(@race_ids)
+    """
+    return run_bigquery(query, bq_client, _race_ids_job_config(race_ids))
 
 
 
@@ -49,18 +73,8 @@ def generate_race_results_detail(df: pd.DataFrame, race_id: str) -> str:
     if race_df.empty:
         return f"No data found for race: {race_id}"
 
-    selected_cols = [
-        "athlete_name","overall_pto_rank", "overall_actual_rank", "overall_delta",
-        "swim_delta", "swim_actual_rank", "bike_delta", "bike_actual_rank", "run_delta", "run_actual_rank", "swim_time", "bike_time", "run_time", "overall_time",
-        "sof","race_distance","race_gender","race_name", "race_location", "race_date",
-        "race_overall_delta_rank_desc", "race_overall_delta_rank_asc" ,
-        "race_swim_delta_rank_desc", "race_swim_delta_rank_asc" ,
-        "race_bike_delta_rank_desc", "race_bike_delta_rank_asc" ,
-        "race_run_delta_rank_desc", "race_run_delta_rank_asc" 
-    ]
-    
     df["race_date"] = pd.to_datetime(df["race_date"]).dt.strftime("%b %d, %Y")
-    race_df = race_df[selected_cols].sort_values("overall_actual_rank")
+    race_df = race_df[RACE_RESULTS_DETAIL_COLUMNS].sort_values("overall_actual_rank")
 
     return race_df.to_markdown(index=False)
 
@@ -69,16 +83,7 @@ def generate_race_position_detail(df: pd.DataFrame, race_id: str) -> str:
     if race_df.empty:
         return f"No data found for race: {race_id}"
 
-    selected_cols = [
-        "athlete_name",  "cumulative_seconds_after_swim", "cumulative_seconds_after_t1", "cumulative_seconds_after_bike",
-        "cumulative_seconds_after_t2", "cumulative_seconds_after_run", "rank_after_swim", "rank_after_t1", "rank_after_bike",
-        "rank_after_t2", "rank_after_run", "position_change_in_t1", "position_change_on_bike", "position_change_in_t2", "position_change_on_run",
-        "race_position_change_bike_rank_desc", "race_position_change_run_rank_desc","race_position_change_bike_rank_asc", "race_position_change_run_rank_asc"
-    ]
-    
-
-
-    race_df = race_df[selected_cols]
+    race_df = race_df[RACE_POSITION_DETAIL_COLUMNS]
     return race_df.to_markdown(index=False)
 
 
@@ -216,44 +221,46 @@ For the top 3 finishers:
 """
 
 
-def call_openai(prompt: str, openai_key: str) -> str:
-    api_client = OpenAI(api_key=openai_key)
-    try:
-        response = api_client.chat.completions.create(
-            model="gpt-4o",  # Replace with your appropriate model name if needed
-            # model="gpt-4-turbo",
-
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.85,
-            max_completion_tokens=5000,
-            top_p=1,
-            frequency_penalty=0.2,
-            presence_penalty=0.4
-        )
-        intro_text = response.choices[0].message.content.strip()
-        return intro_text
-    except Exception as e:
-        print(f"Error generating intro email: {e}")
-        return "Error generating AI content - please see the data below for detailed information."
-    
+def build_race_recap_prompts(bq_client, race_ids: List[str], instructions: str = "") -> Dict[str, str]:
+    """
+    Builds the recap prompt for each race, fetching their data in one scoped query per table.
+    """
+    race_predict_v_results_df = load_race_predict_v_results_data(bq_client, race_ids)
+    race_segment_position_df = load_race_segment_positions_data(bq_client, race_ids)
 
-def generate_race_recap_for_id(specific_race_id: str, instructions: str = ""):
-    credentials, project_id, openai_key = load_credentials(USE_LOCAL)
-    bq_client = get_bq_client(credentials, project_id)
+    prompts = {}
+    for race_id in race_ids:
+        specific_race_results_text = generate_race_results_detail(race_predict_v_results_df, race_id)
+        specific_race_positions_text = generate_race_position_detail(race_segment_position_df, race_id)
 
-    race_predict_v_results_df = load_race_predict_v_results_data(bq_client)
-    race_segment_position_df = load_race_segment_positions_data(bq_client)
-    specific_race_results_text = generate_race_results_detail(race_predict_v_results_df, specific_race_id)
-    specific_race_positions_text = generate_race_position_detail(race_segment_position_df, specific_race_id)
+        prompts[race_id] = construct_race_report_prompt(
+            specific_race_results_text, 
+            specific_race_positions_text,
+            instructions)
+    return prompts
 
+def generate_race_recaps_for_ids(race_ids: List[str], instructions: str = "") -> Dict[str, str]:
+    """
+    Generates recaps for several races while fetching their data in one scoped query per table.
+    """
+    _, _, openai_key = get_credentials()
+    bq_client = get_bq_client()
+
+    prompts = build_race_recap_prompts(bq_client, race_ids, instructions)
+    return {race_id: generate_text(openai_key, "race_recap", prompt) for race_id, prompt in prompts.items()}
+
+def generate_race_recap_for_id(specific_race_id: str, instructions: str = ""):
+    return generate_race_recaps_for_ids([specific_race_id], instructions)[specific_race_id]
 
-    race_report_prompt = construct_race_report_prompt(
-        specific_race_results_text, 
-        specific_race_positions_text,
-        instructions)
+def stream_race_recap_for_id(specific_race_id: str, instructions: str = "") -> Iterator[str]:
+    """
+    Streams the recap for one race, for use with st.write_stream().
+    """
+    _, _, openai_key = get_credentials()
+    bq_client = get_bq_client()
 
-    recap_response = call_openai(race_report_prompt, openai_key)
-    return recap_response
+    prompt = build_race_recap_prompts(bq_client, [specific_race_id], instructions)[specific_race_id]
+    yield from stream_generated_text(openai_key, "race_recap", prompt)
             
 
 
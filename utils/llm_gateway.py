@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+from typing import Dict, Iterator, Optional
+
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+
+from config.app_config import (
+    LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_REQUEST_TIMEOUT_SECONDS, LLM_MAX_RETRIES,
+    LLM_MAX_CONCURRENT_REQUESTS, LLM_QUEUE_TIMEOUT_SECONDS, LLM_MODEL_REQUESTS_PER_MINUTE,
+    LLM_DEFAULT_REQUESTS_PER_MINUTE,
+)
+from utils.llm_streaming import stream_chat_completion
+
+logger = logging.getLogger(__name__)
+
+
+class LLMGatewayBusyError(RuntimeError):
+    """No request slot became free within LLM_QUEUE_TIMEOUT_SECONDS."""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Shared Clients
+# ──────────────────────────────────────────────────────────────────────────────
+_clients: Dict[str, OpenAI] = {}  # api_key -> client
+_clients_lock = threading.Lock()
+_client_counters = {"client_requests": 0, "clients_created": 0}
+
+def get_openai_client(openai_key: str) -> OpenAI:
+    """
+    Returns the process-wide OpenAI client for openai_key, creating it and its
+    keep-alive HTTP connection pool on first use.
+    """
+    with _clients_lock:
+        _client_counters["client_requests"] += 1
+        client = _clients.get(openai_key)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE),
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+            )
+            client = OpenAI(api_key=openai_key, http_client=http_client, max_retries=LLM_MAX_RETRIES)
+            _clients[openai_key] = client
+            _client_counters["clients_created"] += 1
+        return client
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Concurrency and Rate Limits
+# ──────────────────────────────────────────────────────────────────────────────
+class _RequestRateLimiter:
+    """
+    Sliding one-minute window of request start times for one model. acquire() waits
+    until a request may start; the wait is computed under the lock but slept outside it.
+    """
+
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self._starts = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._starts and self._starts[0] <= now - 60:
+                    self._starts.popleft()
+                if len(self._starts) < self.requests_per_minute:
+                    self._starts.append(now)
+                    return
+                wait = self._starts[0] + 60 - now
+            if now + wait > deadline:
+                raise LLMGatewayBusyError(f"Rate limit of {self.requests_per_minute} requests/minute reached.")
+            time.sleep(wait)
+
+_request_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENT_REQUESTS)
+_rate_limiters: Dict[str, _RequestRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+def _rate_limiter(model: str) -> _RequestRateLimiter:
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(model)
+        if limiter is None:
+            limiter = _RequestRateLimiter(LLM_MODEL_REQUESTS_PER_MINUTE.get(model, LLM_DEFAULT_REQUESTS_PER_MINUTE))
+            _rate_limiters[model] = limiter
+        return limiter
+
+@contextmanager
+def _request_slot(call_site: str, model: str):
+    # Waits for the model's rate window first, without holding a global slot, so a
+    # throttled model cannot starve other models; then holds one of
+    # LLM_MAX_CONCURRENT_REQUESTS slots for the duration of the request
+    start = time.monotonic()
+    deadline = start + LLM_QUEUE_TIMEOUT_SECONDS
+    try:
+        _rate_limiter(model).acquire(deadline)
+    except LLMGatewayBusyError:
+        _record(call_site, "rejected")
+        raise
+    if not _request_slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        _record(call_site, "rejected")
+        raise LLMGatewayBusyError(f"All {LLM_MAX_CONCURRENT_REQUESTS} LLM request slots busy.")
+    try:
+        yield time.monotonic() - start
+    finally:
+        _request_slots.release()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Metrics
+# ──────────────────────────────────────────────────────────────────────────────
+_stats_lock = threading.Lock()
+_call_stats = {}  # call_site -> counters
+
+def _record(call_site: str, status: str, queue_seconds: float = 0.0, latency_seconds: float = 0.0,
+            usage=None) -> None:
+    with _stats_lock:
+        stats = _call_stats.setdefault(call_site, {
+            "requests": 0, "completed": 0, "cancelled": 0, "failed": 0, "rejected": 0,
+            "queue_seconds": 0.0, "latency_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        stats["requests"] += 1
+        stats[status] += 1
+        stats["queue_seconds"] += queue_seconds
+        stats["latency_seconds"] += latency_seconds
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_tokens or 0
+            stats["completion_tokens"] += usage.completion_tokens or 0
+
+def get_llm_gateway_stats() -> dict:
+    """
+    Returns per-call-site request counts, mean queue wait and latency, and token totals,
+    plus how often the shared clients were reused.
+    """
+    with _stats_lock:
+        report = {}
+        for call_site, stats in _call_stats.items():
+            admitted = stats["requests"] - stats["rejected"]
+            report[call_site] = {
+                **stats,
+                "mean_queue_seconds": round(stats["queue_seconds"] / admitted, 3) if admitted else 0.0,
+                "mean_latency_seconds": round(stats["latency_seconds"] / admitted, 3) if admitted else 0.0,
+            }
+    with _clients_lock:
+        clients = dict(_client_counters)
+    clients["client_reuses"] = max(clients["client_requests"] - clients["clients_created"], 0)
+    return {"call_sites": report, "clients": clients}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Completions
+# ──────────────────────────────────────────────────────────────────────────────
+def chat_completion(openai_key: str, call_site: str, **create_kwargs):
+    """
+    Runs client.chat.completions.create() on the shared client, within the global
+    concurrency limit and the model's rate limit.
+
+    Args:
+        openai_key (str): Your OpenAI API key.
+        call_site (str): Label the latency and token counters are kept under.
+        **create_kwargs: Passed to client.chat.completions.create(); must include model.
+
+    Returns:
+        ChatCompletion: The response.
+
+    Raises:
+        LLMGatewayBusyError: If no slot became free within LLM_QUEUE_TIMEOUT_SECONDS.
+    """
+    client = get_openai_client(openai_key)
+    with _request_slot(call_site, create_kwargs["model"]) as queue_seconds:
+        start = time.perf_counter()
+        try:
+            response = client.chat.completions.create(**create_kwargs)
+        except Exception:
+            _record(call_site, "failed", queue_seconds, time.perf_counter() - start)
+            raise
+    _record(call_site, "completed", queue_seconds, time.perf_counter() - start, response.usage)
+    return response
+
+def stream_chat(openai_key: str, call_site: str, **create_kwargs) -> Iterator[str]:
+    """
+    Streaming version of chat_completion(). Yields the completion text as it is
+    generated (see llm_streaming.stream_chat_completion); the request slot is held
+    until the stream ends or the consumer closes the generator.
+    """
+    client = get_openai_client(openai_key)
+    usage: Optional[object] = None
+
+    def on_usage(value):
+        nonlocal usage
+        usage = value
+
+    with _request_slot(call_site, create_kwargs["model"]) as queue_seconds:
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            yield from stream_chat_completion(client, call_site, on_usage=on_usage, **create_kwargs)
+            status = "completed"
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        finally:
+            # A stream closed early by the consumer still counts its tokens if they arrived
+            _record(call_site, status, queue_seconds, time.perf_counter() - start, usage)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Long-form Generation (race recaps, athlete summaries)
+# ──────────────────────────────────────────────────────────────────────────────
+GENERATION_ERROR_TEXT = "Error generating AI content - please see the data below for detailed information."
+
+_GENERATION_KWARGS = {
+    "model": "gpt-4o",
+    "temperature": 0.85,
+    "max_completion_tokens": 5000,
+    "top_p": 1,
+    "frequency_penalty": 0.2,
+    "presence_penalty": 0.4,
+}
+
+def generate_text(openai_key: str, call_site: str, prompt: str) -> str:
+    """
+    Generates long-form text for a prompt, or GENERATION_ERROR_TEXT if the request fails.
+    """
+    try:
+        response = chat_completion(openai_key, call_site, messages=[{"role": "user", "content": prompt}],
+                                   **_GENERATION_KWARGS)
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.error("LLM generation for %s failed: %s", call_site, e)
+        return GENERATION_ERROR_TEXT
+
+def stream_generated_text(openai_key: str, call_site: str, prompt: str) -> Iterator[str]:
+    """
+    Streaming version of generate_text(). Yields the text as it is generated. If the
+    request fails, yields GENERATION_ERROR_TEXT, on its own paragraph when some text
+    had already been shown.
+    """
+    yielded = False
+    stream = stream_chat(openai_key, call_site, messages=[{"role": "user", "content": prompt}],
+                         **_GENERATION_KWARGS)
+    try:
+        # closing() releases the request slot straight away if the consumer stops early
+        with closing(stream):
+            for chunk in stream:
+                yielded = yielded or bool(chunk)
+                yield chunk
+    except Exception as e:
+        if not yielded:
+            logger.error("LLM generation stream for %s failed: %s", call_site, e)
+            yield GENERATION_ERROR_TEXT
+            return
+        logger.error("LLM generation stream for %s failed mid-stream; output truncated: %s", call_site, e)
+        yield "\n\n" + GENERATION_ERROR_TEXT
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Streaming Chat Completions
+# ──────────────────────────────────────────────────────────────────────────────
+_STREAM_STATS_LOCK = threading.Lock()
+_stream_stats = {}  # call_site -> counters
+
+def _record_stream(call_site: str, ttft: float, total: float, chunks: int, status: str) -> None:
+    with _STREAM_STATS_LOCK:
+        stats = _stream_stats.setdefault(call_site, {
+            "streams": 0, "completed": 0, "cancelled": 0, "failed": 0,
+            "chunks": 0, "ttft_seconds": 0.0, "ttft_samples": 0, "total_seconds": 0.0,
+        })
+        stats["streams"] += 1
+        stats[status] += 1
+        stats["chunks"] += chunks
+        stats["total_seconds"] += total
+        if ttft is not None:
+            stats["ttft_seconds"] += ttft
+            stats["ttft_samples"] += 1
+    logger.info("LLM stream %s %s: ttft=%s total=%.2fs chunks=%d", call_site, status,
+                f"{ttft:.2f}s" if ttft is not None else "n/a", total, chunks)
+
+def get_stream_stats() -> dict:
+    """
+    Returns per-call-site stream counts and mean time-to-first-token / total duration.
+    """
+    with _STREAM_STATS_LOCK:
+        report = {}
+        for call_site, stats in _stream_stats.items():
+            report[call_site] = {
+                **stats,
+                "mean_ttft_seconds": round(stats["ttft_seconds"] / stats["ttft_samples"], 3) if stats["ttft_samples"] else 0.0,
+                "mean_total_seconds": round(stats["total_seconds"] / stats["streams"], 3) if stats["streams"] else 0.0,
+            }
+        return report
+
+def stream_chat_completion(client: OpenAI, call_site: str, on_usage: Optional[Callable] = None,
+                           **create_kwargs) -> Iterator[str]:
+    """
+    Yields the text of a chat completion as it is generated.
+
+    Suitable for st.write_stream(). If the consumer stops iterating early (e.g. the
+    user navigates away and Streamlit interrupts the script) the generator is closed
+    and the underlying HTTP stream is closed with it, so the completion is not read
+    to the end in the background.
+
+    Args:
+        client (OpenAI): The OpenAI client.
+        call_site (str): Label used for time-to-first-token metrics.
+        on_usage (callable, optional): Called with the final chunk's token usage;
+            requesting it adds stream_options={"include_usage": True}.
+        **create_kwargs: Passed to client.chat.completions.create().
+
+    Yields:
+        str: Successive pieces of the completion text.
+    """
+    start = time.perf_counter()
+    ttft = None
+    chunks = 0
+    status = "failed"
+    stream = None
+    try:
+        if on_usage is not None:
+            create_kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = client.chat.completions.create(stream=True, **create_kwargs)
+        for chunk in stream:
+            if on_usage is not None and getattr(chunk, "usage", None) is not None:
+                on_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks += 1
+            yield text
+        status = "completed"
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+        _record_stream(call_site, ttft, time.perf_counter() - start, chunks, status)
@@ -1,10 +1,12 @@
-from openai import OpenAI
 import pandas as pd
 import re
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 
 # Import prompts and table summaries from your data_prompts module
 from utils.data_prompts import TABLE_SUMMARIES, get_table_prompts, GENERAL_SQL_GUIDELINES
+from utils.table_router import route_tables
+from utils.llm_gateway import chat_completion, stream_chat
+from utils.result_compaction import compact_results
 
 def extract_table_names(text: str) -> List[str]:
     """
@@ -21,23 +23,17 @@ def extract_table_names(text: str) -> List[str]:
     candidates = re.findall(r"fct_[a-z_]+", text)
     return list(set(candidates) & set(TABLE_SUMMARIES.keys()))
 
-def generate_sql_from_question_modular(question: str, openai_key: str) -> str:
+def select_tables_with_llm(openai_key: str, question: str) -> List[str]:
     """
-    Generates a BigQuery SQL query based on a natural language question
-    using the OpenAI GPT model in a two-step process:
-    1. Selects the most relevant table(s).
-    2. Generates the SQL query using detailed table schema and guidelines.
+    Asks GPT which of the tables in TABLE_SUMMARIES are relevant to the question.
 
     Args:
-        question (str): The natural language question from the user.
         openai_key (str): Your OpenAI API key.
+        question (str): The natural language question (with any conversation context).
 
     Returns:
-        str: The generated BigQuery SQL query.
+        List[str]: The valid table names GPT selected (may be empty).
     """
-    client = OpenAI(api_key=openai_key)
-
-    # Step 1: Ask GPT to choose relevant tables
     table_selection_prompt = f"""
     The user asked: "{question}"
 
@@ -51,13 +47,37 @@ def generate_sql_from_question_modular(question: str, openai_key: str) -> str:
     - If the user is asking for specific times in a segment or segments or races, use fct_rae_results
     """
 
-    selection_response = client.chat.completions.create(
+    selection_response = chat_completion(
+        openai_key,
+        "table_selection",
         model="gpt-4", # Or "gpt-3.5-turbo" if you prefer
         messages=[{"role": "user", "content": table_selection_prompt}],
         temperature=0.0 # Keep temperature low for deterministic table selection
     )
     selected_raw = selection_response.choices[0].message.content
-    selected_tables = extract_table_names(selected_raw)
+    return extract_table_names(selected_raw)
+
+def generate_sql_from_question_modular(question: str, openai_key: str, route_question: Optional[str] = None) -> str:
+    """
+    Generates a BigQuery SQL query based on a natural language question
+    using the OpenAI GPT model in a two-step process:
+    1. Selects the most relevant table(s), locally via the table router when it is
+       confident, otherwise with GPT.
+    2. Generates the SQL query using detailed table schema and guidelines.
+
+    Args:
+        question (str): The natural language question from the user.
+        openai_key (str): Your OpenAI API key.
+        route_question (str, optional): The bare user question to route on, without the
+            conversation context included in question. Defaults to question.
+
+    Returns:
+        str: The generated BigQuery SQL query.
+    """
+    # Step 1: Choose relevant tables, only asking GPT when the local router is unsure
+    selected_tables, _, is_confident = route_tables(route_question or question)
+    if not is_confident:
+        selected_tables = select_tables_with_llm(openai_key, question)
 
     # If no valid tables are selected, provide a generic prompt or raise an error
     if not selected_tables:
@@ -89,7 +109,9 @@ Based on the user question below, generate only a valid BigQuery SQL query using
 Do not include explanations, comments, or markdown. Return SQL only.
     """
 
-    sql_response = client.chat.completions.create(
+    sql_response = chat_completion(
+        openai_key,
+        "sql_generation",
         model="gpt-4", # Or "gpt-4o" for better performance and cost in some cases
         messages=[{"role": "user", "content": final_prompt}],
         temperature=0.0 # Keep temperature low for reliable SQL generation
@@ -129,9 +151,38 @@ def summarize_results(df: pd.DataFrame, openai_key: str, question: str,
     Returns:
         str: A 1-3 sentence summary of the results.
     """
-    client = OpenAI(api_key=openai_key)
+    prompt = build_summary_prompt(df, question, conversational_history, generated_sql)
+    response = chat_completion(
+        openai_key,
+        "chatbot_summary",
+        model="gpt-4o", # Using gpt-4o for potentially better summarization
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2, # A bit of creativity for summarization
+    )
+    return response.choices[0].message.content.strip()
 
-    rows_as_sentences = "\n".join(row_to_sentence(row) for _, row in df.iterrows())
+def stream_summarize_results(df: pd.DataFrame, openai_key: str, question: str,
+                             conversational_history: list = None, generated_sql: str = "") -> Iterator[str]:
+    """
+    Streaming version of summarize_results(). Yields the summary text as it is generated,
+    for use with st.write_stream().
+    """
+    prompt = build_summary_prompt(df, question, conversational_history, generated_sql)
+    yield from stream_chat(
+        openai_key,
+        "chatbot_summary",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+    )
+
+def build_summary_prompt(df: pd.DataFrame, question: str,
+                         conversational_history: list = None, generated_sql: str = "") -> str:
+    """
+    Builds the summarization prompt for the query results and conversation so far.
+    """
+    # Bounded by SUMMARY_RESULT_TOKEN_BUDGET however many rows the query returned
+    rows_as_sentences = compact_results(df)
     history_context = ""
     if conversational_history:
         for q_prev, a_prev, df_result, sql_prev in conversational_history:
@@ -180,9 +231,4 @@ The goal is to maintain contextual consistency across turns without adding or ch
 Use Markdown formatting (e.g., `**name**`) in your summary.
 
 """
-    response = client.chat.completions.create(
-        model="gpt-4o", # Using gpt-4o for potentially better summarization
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2, # A bit of creativity for summarization
-    )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return prompt
\ No newline at end of file
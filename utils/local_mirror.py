@@ -0,0 +1,256 @@
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from google.cloud import bigquery
+
+from config.app_config import (
+    LOCAL_MIRROR_PATH, LOCAL_MIRROR_SYNC_SECONDS, LOCAL_MIRROR_RETRY_SECONDS, LOCAL_MIRROR_TABLES,
+)
+from utils.bq_utils import arrow_to_dataframe, fetch_arrow
+
+try:
+    import duckdb
+    import sqlglot
+    from sqlglot import exp
+except ImportError:
+    # Without duckdb/sqlglot the mirror is unavailable and every query goes to BigQuery.
+    duckdb = None
+    sqlglot = None
+
+logger = logging.getLogger(__name__)
+
+_BQ_PROJECT = "trilytx"
+_META_TABLE = "main._mirror_meta"
+
+
+@functools.lru_cache(maxsize=512)
+def translate_query(query: str, mirrored_tables: Tuple[str, ...]) -> Optional[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]:
+    """
+    Translates BigQuery SQL into DuckDB SQL for the mirror.
+
+    `trilytx.<dataset>.<table>` references become `<dataset>.<table>` and @name
+    parameters become $name, so the caller's QueryJobConfig parameters bind unchanged.
+
+    Returns:
+        tuple | None: (duckdb_sql, tables read, parameter names), or None if the query
+        cannot be parsed or reads a table that is not mirrored.
+    """
+    try:
+        tree = sqlglot.parse_one(query, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return None
+    if not isinstance(tree, (exp.Select, exp.Union)):
+        return None
+
+    cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    tables = set()
+    for table in tree.find_all(exp.Table):
+        if not table.db:
+            if table.name in cte_names:
+                continue
+            return None
+        if table.catalog and table.catalog != _BQ_PROJECT:
+            return None
+        name = f"{table.db}.{table.name}"
+        if name not in mirrored_tables:
+            return None
+        table.set("catalog", None)
+        tables.add(name)
+    params = {param.name for param in tree.find_all(exp.Parameter)}
+    return tree.sql(dialect="duckdb"), tuple(sorted(tables)), tuple(sorted(params))
+
+
+def _param_value(param):
+    if isinstance(param, bigquery.ArrayQueryParameter):
+        return list(param.values)
+    return param.value
+
+
+class LocalMirror:
+    """
+    Read-only DuckDB copy of the tables the pages query.
+
+    sync() copies each table in LOCAL_MIRROR_TABLES from BigQuery as Arrow and swaps
+    it in with CREATE OR REPLACE, so readers see either the old or the new copy.
+    query() runs a BigQuery page query against the copy, translating the dialect and
+    binding the same QueryJobConfig parameters. It returns None (and the caller uses
+    BigQuery) when a table has not been synced yet, the query cannot be translated, or
+    DuckDB rejects it; queries DuckDB rejected are not retried locally.
+    """
+
+    def __init__(self, path: str = LOCAL_MIRROR_PATH, tables: List[str] = LOCAL_MIRROR_TABLES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.tables = tuple(tables)
+        self._con = duckdb.connect(path)
+        try:
+            # Match BigQuery's TIMESTAMP semantics for TIMESTAMPTZ columns
+            self._con.execute("SET TimeZone = 'UTC'")
+        except duckdb.Error as e:
+            logger.warning("Could not set DuckDB time zone to UTC: %s", e)
+        for schema in sorted({table.split(".")[0] for table in self.tables}):
+            self._con.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        self._con.execute(f"CREATE TABLE IF NOT EXISTS {_META_TABLE} "
+                          "(table_name VARCHAR PRIMARY KEY, synced_at DOUBLE, num_rows BIGINT)")
+        self._lock = threading.Lock()
+        self._synced: Dict[str, float] = dict(
+            self._con.execute(f"SELECT table_name, synced_at FROM {_META_TABLE}").fetchall()
+        )
+        self._rejected = set()
+        self._syncing = False
+        self._sync_started_at = 0.0
+        self.local_queries = 0
+        self.local_seconds = 0.0
+        self.fallbacks = 0
+        self.last_sync_error = None
+
+    # ── syncing ───────────────────────────────────────────────────────────────
+    def sync_due(self) -> bool:
+        if any(table not in self._synced for table in self.tables):
+            return True
+        return time.time() - min(self._synced.values()) > LOCAL_MIRROR_SYNC_SECONDS
+
+    def sync(self, client: bigquery.Client) -> None:
+        """
+        Copies every mirrored table from BigQuery, replacing the local copy table by table.
+        """
+        for table in self.tables:
+            start = time.perf_counter()
+            arrow_table = fetch_arrow(f"SELECT * FROM `{_BQ_PROJECT}.{table}`", client)
+            con = self._con.cursor()
+            try:
+                con.register("_incoming", arrow_table)
+                con.execute("BEGIN TRANSACTION")
+                con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM _incoming")
+                synced_at = time.time()
+                con.execute(f"INSERT OR REPLACE INTO {_META_TABLE} VALUES (?, ?, ?)",
+                            [table, synced_at, arrow_table.num_rows])
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            finally:
+                con.close()
+            with self._lock:
+                self._synced[table] = synced_at
+            logger.info("Mirrored %s (%d rows) in %.1fs", table, arrow_table.num_rows, time.perf_counter() - start)
+        with self._lock:
+            self._rejected.clear()
+
+    def sync_in_background(self, client: bigquery.Client) -> None:
+        """
+        Starts a background sync unless one is running or started less than
+        LOCAL_MIRROR_RETRY_SECONDS ago (so a failing sync is not retried on every query).
+        """
+        with self._lock:
+            if self._syncing or time.time() - self._sync_started_at < LOCAL_MIRROR_RETRY_SECONDS:
+                return
+            self._syncing = True
+            self._sync_started_at = time.time()
+
+        def run():
+            try:
+                self.sync(client)
+                self.last_sync_error = None
+            except Exception as e:
+                logger.error("Local mirror sync failed: %s", e)
+                self.last_sync_error = str(e)
+            finally:
+                with self._lock:
+                    self._syncing = False
+
+        threading.Thread(target=run, name="local-mirror-sync", daemon=True).start()
+
+    # ── querying ──────────────────────────────────────────────────────────────
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Optional[pd.DataFrame]:
+        """
+        Runs a BigQuery page query against the mirror.
+
+        Returns:
+            pd.DataFrame | None: The results, or None if the query must go to BigQuery.
+        """
+        translated = translate_query(query, self.tables)
+        if translated is None or query in self._rejected:
+            return self._fallback()
+        duckdb_sql, tables, param_names = translated
+        if any(table not in self._synced for table in tables):
+            return self._fallback()
+
+        params = {}
+        if job_config is not None:
+            params = {p.name: _param_value(p) for p in job_config.query_parameters if p.name in param_names}
+
+        start = time.perf_counter()
+        con = self._con.cursor()
+        try:
+            table = con.execute(duckdb_sql, params).arrow()
+            if not hasattr(table, "to_pandas"):
+                table = table.read_all()
+        except duckdb.Error as e:
+            logger.warning("Local mirror could not run query, using BigQuery: %s", e)
+            with self._lock:
+                self._rejected.add(query)
+            return self._fallback()
+        finally:
+            con.close()
+        df = arrow_to_dataframe(table)
+        with self._lock:
+            self.local_queries += 1
+            self.local_seconds += time.perf_counter() - start
+        return df
+
+    def _fallback(self) -> None:
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tables_synced": len(self._synced),
+                "oldest_sync_age_seconds": round(time.time() - min(self._synced.values()), 1) if self._synced else None,
+                "syncing": self._syncing,
+                "local_queries": self.local_queries,
+                "avg_local_ms": round(1000 * self.local_seconds / self.local_queries, 2) if self.local_queries else 0.0,
+                "fallbacks": self.fallbacks,
+                "rejected_queries": len(self._rejected),
+                "last_sync_error": self.last_sync_error,
+            }
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_local_mirror(client: bigquery.Client) -> Optional[LocalMirror]:
+    """
+    Returns the process-wide mirror, or None if duckdb/sqlglot are not installed or it cannot be opened.
+    Starts a background sync when a table is missing or older than LOCAL_MIRROR_SYNC_SECONDS;
+    queries fall back to BigQuery until their tables have been copied.
+    """
+    global _mirror
+    if duckdb is None:
+        return None
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                try:
+                    _mirror = LocalMirror()
+                except Exception as e:
+                    logger.error("Could not open local mirror at %s: %s", LOCAL_MIRROR_PATH, e)
+                    return None
+    if _mirror.sync_due():
+        _mirror.sync_in_background(client)
+    return _mirror
+
+def get_local_mirror_stats() -> dict:
+    """
+    Returns sync state and local/fallback query counts for the mirror (empty if it was never opened).
+    """
+    return _mirror.stats() if _mirror is not None else {}
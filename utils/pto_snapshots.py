@@ -0,0 +1,299 @@
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from config.app_config import PTO_SNAPSHOT_DIR, PTO_SNAPSHOT_SYNC_SECONDS, PTO_SNAPSHOT_WEEK_CACHE_SIZE
+from utils.bq_utils import arrow_to_dataframe, fetch_dataframe, get_bq_client
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_PATTERN = re.compile(r"^reporting_week=(\d{4}-\d{2}-\d{2})\.parquet$")
+_INDEX_COLUMNS = ["athlete_slug", "athlete_name", "distance_group"]
+
+# Reference weeks used by the athlete trend and summary, relative to the most recent week
+REFERENCE_WEEK_OFFSETS = [
+    ("6 Months Ago", 6),
+    ("12 Months Ago", 12),
+    ("24 Months Ago", 24),
+]
+
+def _to_date(value) -> datetime.date:
+    return pd.Timestamp(value).date()
+
+
+class PTOScoreSnapshots:
+    """
+    Local copy of fct_pto_scores_weekly stored as one Parquet file per reporting_week.
+
+    sync() only queries weeks at or after the newest stored week (the watermark), so a
+    refresh costs one or two weeks of rows instead of the full history; the newest
+    stored week is re-read in case it was restated. A compact (athlete, distance
+    group, week) index is kept in memory so athlete lookups only open the partitions
+    they need, and recently used week frames are kept in an LRU.
+
+    Frames returned by week_frame() are shared; callers must not modify them in place.
+    """
+
+    def __init__(self, directory: str = PTO_SNAPSHOT_DIR,
+                 client_factory: Callable[[], bigquery.Client] = get_bq_client,
+                 week_cache_size: int = PTO_SNAPSHOT_WEEK_CACHE_SIZE):
+        self.directory = directory
+        self.week_cache_size = week_cache_size
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._week_cache = OrderedDict()   # date -> DataFrame
+        self._index = pd.DataFrame(columns=_INDEX_COLUMNS + ["reporting_week"])
+        self._weeks: List[datetime.date] = []
+        self._synced_at = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.weeks_fetched = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # ── storage ───────────────────────────────────────────────────────────────
+    def _partition_path(self, week: datetime.date) -> str:
+        return os.path.join(self.directory, f"reporting_week={week.isoformat()}.parquet")
+
+    def _stored_weeks(self) -> List[datetime.date]:
+        weeks = []
+        for name in os.listdir(self.directory):
+            match = _PARTITION_PATTERN.match(name)
+            if match:
+                weeks.append(datetime.date.fromisoformat(match.group(1)))
+        return sorted(weeks)
+
+    def _index_partition(self, week: datetime.date, df: pd.DataFrame) -> pd.DataFrame:
+        index = df[_INDEX_COLUMNS].copy()
+        index["athlete_name"] = index["athlete_name"].str.lower()
+        index["reporting_week"] = week
+        return index
+
+    def _load_index(self) -> None:
+        parts = []
+        weeks = self._stored_weeks()
+        for week in weeks:
+            table = pq.read_table(self._partition_path(week), columns=_INDEX_COLUMNS)
+            parts.append(self._index_partition(week, table.to_pandas()))
+        self._install_index(parts, weeks)
+
+    def _install_index(self, parts: List[pd.DataFrame], weeks: List[datetime.date]) -> None:
+        index = pd.concat(parts, ignore_index=True) if parts else self._index.iloc[0:0]
+        for col in _INDEX_COLUMNS:
+            index[col] = index[col].astype("category")
+        with self._lock:
+            self._index = index
+            self._weeks = weeks
+
+    @property
+    def watermark(self) -> Optional[datetime.date]:
+        weeks = self._weeks
+        return weeks[-1] if weeks else None
+
+    # ── syncing ───────────────────────────────────────────────────────────────
+    def sync(self) -> int:
+        """
+        Fetches weeks at or after the watermark from BigQuery and stores them as partitions.
+
+        Returns:
+            int: The number of weeks written.
+        """
+        watermark = self.watermark
+        query = "SELECT * FROM `trilytx.trilytx_fct.fct_pto_scores_weekly`"
+        job_config = None
+        if watermark is not None:
+            query += " WHERE DATE(reporting_week) >= @watermark"
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("watermark", "DATE", watermark)]
+            )
+        df = fetch_dataframe(query, self._client_factory(), job_config)
+
+        written = []
+        if not df.empty:
+            week_keys = df["reporting_week"].map(_to_date)
+            for week, week_df in df.groupby(week_keys, sort=True):
+                week_df = week_df.reset_index(drop=True)
+                path = self._partition_path(week)
+                tmp_path = path + ".tmp"
+                week_df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+                written.append((week, week_df))
+
+        if written:
+            with self._lock:
+                for week, week_df in written:
+                    self._week_cache.pop(week, None)
+                index = self._index
+                weeks = list(self._weeks)
+            rewritten = {week for week, _ in written}
+            parts = [index[~index["reporting_week"].isin(rewritten)].astype({c: "object" for c in _INDEX_COLUMNS})]
+            parts += [self._index_partition(week, week_df) for week, week_df in written]
+            self._install_index(parts, sorted(set(weeks) | rewritten))
+            self.weeks_fetched += len(written)
+        self._synced_at = time.monotonic()
+        return len(written)
+
+    def maybe_sync(self) -> None:
+        if time.monotonic() - self._synced_at > PTO_SNAPSHOT_SYNC_SECONDS:
+            try:
+                self.sync()
+            except Exception as e:
+                # Keep serving the stored snapshot; try again on the next interval
+                logger.error("PTO score snapshot sync failed: %s", e)
+                self._synced_at = time.monotonic()
+
+    # ── lookups ───────────────────────────────────────────────────────────────
+    def weeks(self) -> List[datetime.date]:
+        return list(self._weeks)
+
+    def week_frame(self, week: datetime.date) -> pd.DataFrame:
+        """
+        Returns every row for one reporting week (empty if the week is not stored).
+        """
+        with self._lock:
+            df = self._week_cache.get(week)
+            if df is not None:
+                self._week_cache.move_to_end(week)
+                self.cache_hits += 1
+                return df
+            self.cache_misses += 1
+        path = self._partition_path(week)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        df = arrow_to_dataframe(pq.read_table(path))
+        with self._lock:
+            self._week_cache[week] = df
+            while len(self._week_cache) > self.week_cache_size:
+                self._week_cache.popitem(last=False)
+        return df
+
+    def frames_for_weeks(self, weeks: Dict[str, datetime.date]) -> pd.DataFrame:
+        """
+        Concatenates whole weeks, labelling each row with a 'week_name' column (e.g. {"this_week": date}).
+        """
+        parts = []
+        for week_name, week in weeks.items():
+            df = self.week_frame(week)
+            if not df.empty:
+                parts.append(df.assign(week_name=week_name))
+        if not parts:
+            return pd.DataFrame(columns=["week_name"])
+        out = pd.concat(parts, ignore_index=True)
+        return out[["week_name"] + [c for c in out.columns if c != "week_name"]]
+
+    def _athlete_mask(self, index: pd.DataFrame, athlete_slug: Optional[str], athlete_name: Optional[str]):
+        if athlete_slug:
+            return index["athlete_slug"] == athlete_slug
+        return index["athlete_name"] == (athlete_name or "").lower()
+
+    def athlete_weeks(self, athlete_slug: Optional[str] = None, athlete_name: Optional[str] = None,
+                      distance_group: Optional[str] = None) -> List[datetime.date]:
+        """
+        Returns the weeks an athlete has scores in, from the in-memory index.
+        The slug is preferred; the case-insensitive name is used when no slug is given.
+        """
+        index = self._index
+        mask = self._athlete_mask(index, athlete_slug, athlete_name)
+        if distance_group is not None:
+            mask &= index["distance_group"] == distance_group
+        return sorted(set(index.loc[mask, "reporting_week"]))
+
+    def reference_weeks(self, weeks: List[datetime.date]) -> List[Tuple[datetime.date, str]]:
+        """
+        Returns (week, week_type) for the most recent week and the latest weeks at least
+        6, 12 and 24 months before it, matching DATE_SUB(..., INTERVAL n MONTH).
+        """
+        if not weeks:
+            return []
+        most_recent = max(weeks)
+        targets = []
+        for week_type, months in REFERENCE_WEEK_OFFSETS:
+            cutoff = (pd.Timestamp(most_recent) - pd.DateOffset(months=months)).date()
+            earlier = [w for w in weeks if w <= cutoff]
+            if earlier:
+                targets.append((max(earlier), week_type))
+        targets.append((most_recent, "Current"))
+        return targets
+
+    def athlete_reference_scores(self, athlete_slug: Optional[str] = None, athlete_name: Optional[str] = None,
+                                 distance_group: Optional[str] = None, weeks_from: str = "athlete",
+                                 max_week: Optional[datetime.date] = None) -> pd.DataFrame:
+        """
+        Returns an athlete's rows for the Current / 6 / 12 / 24 months ago reference weeks,
+        with a 'week_type' column, most recent first.
+
+        Args:
+            weeks_from (str): "athlete" to pick reference weeks from the athlete's own
+                scored weeks, or "table" to pick them from every stored week.
+            max_week (date, optional): Ignore weeks after this date.
+        """
+        if weeks_from == "athlete":
+            candidate_weeks = self.athlete_weeks(athlete_slug, athlete_name, distance_group)
+        else:
+            candidate_weeks = self.weeks()
+        if max_week is not None:
+            candidate_weeks = [w for w in candidate_weeks if w <= max_week]
+
+        parts = []
+        for week, week_type in self.reference_weeks(candidate_weeks):
+            df = self.week_frame(week)
+            if df.empty:
+                continue
+            if athlete_slug:
+                mask = df["athlete_slug"] == athlete_slug
+            else:
+                mask = df["athlete_name"].str.lower() == (athlete_name or "").lower()
+            if distance_group is not None:
+                mask &= df["distance_group"] == distance_group
+            parts.append(df[mask.fillna(False)].assign(week_type=week_type))
+        if not parts:
+            return pd.DataFrame()
+        out = pd.concat(parts, ignore_index=True)
+        order = out["reporting_week"].map(_to_date).sort_values(ascending=False, kind="stable").index
+        return out.loc[order].reset_index(drop=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "weeks": len(self._weeks),
+                "watermark": self.watermark.isoformat() if self._weeks else None,
+                "index_rows": len(self._index),
+                "cached_weeks": len(self._week_cache),
+                "cache_hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+                "weeks_fetched": self.weeks_fetched,
+            }
+
+
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+def get_pto_snapshots() -> PTOScoreSnapshots:
+    """
+    Returns the process-wide PTO score snapshots, syncing new weeks from BigQuery at most
+    every PTO_SNAPSHOT_SYNC_SECONDS.
+    """
+    global _snapshots
+    if _snapshots is None:
+        with _snapshots_lock:
+            if _snapshots is None:
+                snapshots = PTOScoreSnapshots()
+                snapshots.sync()
+                _snapshots = snapshots
+                return _snapshots
+    # Only one caller syncs; the others keep reading the stored weeks meanwhile
+    if _snapshots_lock.acquire(blocking=False):
+        try:
+            _snapshots.maybe_sync()
+        finally:
+            _snapshots_lock.release()
+    return _snapshots
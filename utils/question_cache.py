@@ -0,0 +1,299 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config.app_config import (
+    QUESTION_CACHE_SIMILARITY_THRESHOLD, QUESTION_CACHE_MAX_ENTRIES,
+    QUESTION_CACHE_NUM_PERM, QUESTION_CACHE_BANDS, QUESTION_CACHE_WARM_START_PATH,
+)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Question Normalization
+# ──────────────────────────────────────────────────────────────────────────────
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "for", "to", "is", "are", "was", "were",
+    "be", "did", "do", "does", "me", "show", "tell", "please", "what", "which", "who",
+    "and", "or", "by", "with", "from", "this", "that", "there", "their", "his", "her",
+    "can", "you", "i", "give", "list", "has", "have", "had", "got", "get",
+    "s",  # possessive "'s"
+}
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_NUMBER_PATTERN = re.compile(r"^[0-9]+(?:\.[0-9]+)?$")
+
+# Summaries that mean the question did not produce usable SQL
+_FAILED_SUMMARY_PREFIXES = ("❌", "🚫", "### ⚠️")
+# First line of SQL answered by utils.question_templates; it uses bound @parameters
+TEMPLATE_SQL_MARKER = "-- template:"
+
+def _stem(token: str) -> str:
+    # Plural -> singular, so "races"/"race" count as the same word (numbers are kept)
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not _NUMBER_PATTERN.match(token):
+        return token[:-1]
+    return token
+
+def normalize_question(question: str) -> FrozenSet[str]:
+    """
+    Lowercases a question and reduces it to its set of content tokens, singularized.
+    Numbers such as years and "70.3" are kept intact.
+    """
+    tokens = _TOKEN_PATTERN.findall(question.lower())
+    return frozenset(_stem(t) for t in tokens if t not in _STOPWORDS)
+
+# Wording that may differ between two questions with the same answer. Every other
+# content token (gender words, athlete and race names, numbers, negations) changes
+# the answer and must match exactly.
+_PHRASING_TOKENS = {
+    "athlete", "triathlete", "pro", "professional", "race", "triathlon", "result",
+    "ever", "data", "find", "know", "want", "would", "like", "name", "see",
+}
+
+def _answer_tokens(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    """
+    Returns the tokens that must be identical for two questions to share SQL.
+    """
+    return frozenset(t for t in tokens if t not in _PHRASING_TOKENS)
+
+def _filters_key(filters: Optional[Dict[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v).strip().lower()) for k, v in (filters or {}).items() if v))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# MinHash / LSH
+# ──────────────────────────────────────────────────────────────────────────────
+_MERSENNE_PRIME = (1 << 61) - 1
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _permutations(num_perm: int) -> List[Tuple[int, int]]:
+    # Deterministic (a, b) pairs so signatures are stable across processes
+    perms = []
+    for i in range(num_perm):
+        digest = hashlib.blake2b(f"minhash-{i}".encode("utf-8"), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        perms.append((a, b))
+    return perms
+
+
+class QuestionSQLCache:
+    """
+    Similarity index over previously successful question -> SQL pairs.
+
+    Questions are reduced to normalized token sets. MinHash signatures split into
+    LSH bands find candidates in roughly constant time, and candidates are then
+    verified with the exact Jaccard similarity of their token sets. A cached SQL is
+    only reused when the sidebar filters are identical and the questions differ
+    only in phrasing words (_PHRASING_TOKENS): a different gender, name, number or
+    negation changes the answer while barely changing the similarity of a long
+    question. Entries are evicted least-recently-used.
+    """
+
+    def __init__(self, threshold: float = QUESTION_CACHE_SIMILARITY_THRESHOLD,
+                 max_entries: int = QUESTION_CACHE_MAX_ENTRIES,
+                 num_perm: int = QUESTION_CACHE_NUM_PERM,
+                 bands: int = QUESTION_CACHE_BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self._perms = _permutations(num_perm)
+        self._entries = OrderedDict()  # entry_key -> dict
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [_token_hash(t) for t in tokens] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        r = self.rows_per_band
+        return [(i, signature[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def lookup(self, question: str, filters: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Returns the SQL of the most similar cached question above the threshold, if any.
+
+        Args:
+            question (str): The user's question.
+            filters (dict, optional): Active sidebar filters; must match exactly.
+
+        Returns:
+            str | None: Previously validated SQL, or None on a miss.
+        """
+        tokens = normalize_question(question)
+        if not tokens:
+            return None
+        signature = self._signature(tokens)
+
+        with self._lock:
+            best_key = self._best_match(tokens, signature, _filters_key(filters))
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._entries[best_key]["hits"] += 1
+            self.hits += 1
+            return self._entries[best_key]["sql"]
+
+    def invalidate(self, question: str, filters: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Removes the entry lookup() would return for this question, e.g. after its SQL
+        failed or returned no rows. Returns True if an entry was removed.
+        """
+        tokens = normalize_question(question)
+        if not tokens:
+            return False
+        signature = self._signature(tokens)
+
+        with self._lock:
+            best_key = self._best_match(tokens, signature, _filters_key(filters))
+            if best_key is None:
+                return False
+            self._remove(best_key)
+            self.invalidations += 1
+            return True
+
+    def _best_match(self, tokens: FrozenSet[str], signature: Tuple[int, ...], filters_key) -> Optional[tuple]:
+        # Caller must hold self._lock
+        answer_tokens = _answer_tokens(tokens)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates |= self._buckets.get(band_key, set())
+
+        best_key, best_score = None, 0.0
+        for key in candidates:
+            entry = self._entries[key]
+            if entry["filters"] != filters_key or entry["answer_tokens"] != answer_tokens:
+                continue
+            score = len(tokens & entry["tokens"]) / len(tokens | entry["tokens"])
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key if best_score >= self.threshold else None
+
+    def add(self, question: str, sql: str, filters: Optional[Dict[str, str]] = None) -> None:
+        """
+        Records a question whose SQL ran successfully and returned rows.
+        """
+        tokens = normalize_question(question)
+        if not tokens or not sql:
+            return
+        filters_key = _filters_key(filters)
+        key = (tokens, filters_key)
+        signature = self._signature(tokens)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["sql"] = sql
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = {
+                "tokens": tokens,
+                "answer_tokens": _answer_tokens(tokens),
+                "filters": filters_key,
+                "signature": signature,
+                "sql": sql,
+                "hits": 0,
+            }
+            for band_key in self._band_keys(signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        # Caller must hold self._lock
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+    def _remove(self, key) -> None:
+        # Caller must hold self._lock
+        entry = self._entries.pop(key)
+        for band_key in self._band_keys(entry["signature"]):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def warm_start(self, records: List[dict]) -> int:
+        """
+        Loads question -> SQL pairs, e.g. from load_question_log_export(). Returns the number added.
+        """
+        added = 0
+        for record in records:
+            question = record.get("question") or ""
+            sql = record.get("generated_sql") or ""
+            summary = record.get("summary") or ""
+            if not question or not sql or summary.startswith(_FAILED_SUMMARY_PREFIXES):
+                continue
+            if sql.lstrip().startswith(TEMPLATE_SQL_MARKER):
+                continue  # Needs the template's query parameters, which are not logged
+            if str(record.get("is_follow_up", "false")).lower() == "true":
+                continue  # Follow-ups depend on conversation context
+            self.add(question, sql)
+            added += 1
+        return added
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def load_question_log_export(path: str) -> List[dict]:
+    """
+    Reads an export of the chatbot question log (BQ_CHATBOT_QUESTION_LOG) as JSONL or CSV.
+
+    Args:
+        path (str): Path to a .jsonl/.json (one object per line) or .csv export.
+
+    Returns:
+        List[dict]: Rows with at least 'question' and 'generated_sql' keys.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_question_cache() -> QuestionSQLCache:
+    """
+    Returns the process-wide question -> SQL cache, warm-started from
+    QUESTION_CACHE_WARM_START_PATH on first use when that file exists.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = QuestionSQLCache()
+                if QUESTION_CACHE_WARM_START_PATH and os.path.exists(QUESTION_CACHE_WARM_START_PATH):
+                    cache.warm_start(load_question_log_export(QUESTION_CACHE_WARM_START_PATH))
+                _cache = cache
+    return _cache
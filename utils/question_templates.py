@@ -0,0 +1,286 @@
+import logging
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+from google.cloud import bigquery
+
+from config.app_config import QUESTION_TEMPLATE_MIN_ATHLETE_SCORE, QUESTION_TEMPLATE_MAX_TOP_N
+from utils.athlete_search import get_athlete_name_index
+from utils.bq_utils import run_bigquery
+from utils.question_cache import TEMPLATE_SQL_MARKER
+from utils.sql_guard import guarded_job_config
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Question Patterns
+# ──────────────────────────────────────────────────────────────────────────────
+_WINNER_PATTERNS = [
+    re.compile(r"^who won (?:the )?(?P<race>.+?),? (?:in )?(?P<year>(?:19|20)\d{2})$"),
+    re.compile(r"^who won (?:the )?(?P<year>(?:19|20)\d{2}) (?P<race>.+)$"),
+]
+_WINS_PATTERN = re.compile(
+    r"^how many (?:wins|victories|races has|races did) (?:does |did |has )?(?P<athlete>.+?)"
+    r"(?: (?:have|had|got|won|win))?(?: (?:at|in) (?:the )?(?P<race>.+?))?$"
+)
+_TOP_PATTERN = re.compile(
+    r"^(?:(?:who are|show me|list|what are) )?(?:the )?top (?P<n>\d{1,3}) "
+    r"(?:(?P<gender>men|women|male|female|mens|womens)(?:'s)? )?"
+    r"(?P<role>cyclists|bikers|swimmers|runners|athletes|triathletes)"
+    r"(?: (?:at|in|for|over) (?:the )?(?P<distance>.+?))?(?: right now| currently| today)?$"
+)
+
+_GENDER_WORDS = {
+    "men": "men", "mens": "men", "male": "men", "man": "men",
+    "women": "women", "womens": "women", "female": "women", "woman": "women",
+}
+_RACE_STOPWORDS = {"the", "race", "a", "an", "of", "'s", "s"}
+_ROLE_SCORE_COLUMNS = {
+    "cyclists": "bike_pto_score", "bikers": "bike_pto_score",
+    "swimmers": "swim_pto_score", "runners": "run_pto_score",
+    "athletes": "overall_pto_score", "triathletes": "overall_pto_score",
+}
+_DISTANCE_GROUPS = [
+    (re.compile(r"70\.3|half|middle"), "Half-Iron (70.3 miles)"),
+    (re.compile(r"140\.6|\biron(?:man)?\b|\bfull\b|long"), "Iron (140.6 miles)"),
+    (re.compile(r"t100|100 ?km"), "100 km"),
+    (re.compile(r"overall|all distances|any distance"), "Overall"),
+]
+
+def _normalize_question(question: str) -> str:
+    text = question.lower().replace("’", "'")
+    text = re.sub(r"[?!.]+\s*$", "", text.strip())
+    return " ".join(text.split())
+
+def _race_words(race: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Splits a race phrase into lowercase words to match against the organizer and race name,
+    pulling out a gender word ("women's") as an athlete_gender filter.
+    """
+    words, gender = [], None
+    for word in re.findall(r"[a-z0-9.]+(?:'s)?", race):
+        base = word[:-2] if word.endswith("'s") else word
+        if base in _GENDER_WORDS:
+            gender = _GENDER_WORDS[base]
+        elif base not in _RACE_STOPWORDS:
+            words.append(base)
+    return words, gender
+
+def _distance_group(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return "Overall"
+    for pattern, group in _DISTANCE_GROUPS:
+        if pattern.search(text):
+            return group
+    return None
+
+def _bold(value) -> str:
+    return f"**{value}**"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Templates
+# Each returns (sql, query parameters, render) for a matched question, or None.
+# ──────────────────────────────────────────────────────────────────────────────
+# Every word must appear in the organizer + race name ("ironman kona" -> organizer IRONMAN, race "Kona")
+_RACE_WORDS_FILTER = (
+    "(SELECT LOGICAL_AND(STRPOS(LOWER(CONCAT(IFNULL(organizer, ''), ' ', cleaned_race_name)), word) > 0) "
+    "FROM UNNEST(@race_words) AS word)"
+)
+
+def _race_winner(question: str, bq_client: bigquery.Client):
+    match = next((m for m in (p.match(question) for p in _WINNER_PATTERNS) if m), None)
+    if match is None:
+        return None
+    words, gender = _race_words(match["race"])
+    if not words:
+        return None
+    year = int(match["year"])
+    params = [
+        bigquery.ScalarQueryParameter("year", "INT64", year),
+        bigquery.ArrayQueryParameter("race_words", "STRING", words),
+    ]
+    gender_filter = ""
+    if gender:
+        gender_filter = "AND athlete_gender = @athlete_gender"
+        params.append(bigquery.ScalarQueryParameter("athlete_gender", "STRING", gender))
+    sql = f"""
+SELECT cleaned_race_name, race_date, athlete_gender, athlete_name, athlete_country, overall_time
+FROM `trilytx.trilytx_fct.fct_race_results`
+WHERE athlete_finishing_place = 1
+  AND EXTRACT(YEAR FROM race_date) = @year
+  AND {_RACE_WORDS_FILTER}
+  {gender_filter}
+ORDER BY race_date, athlete_gender
+LIMIT 20
+"""
+
+    def render(df: pd.DataFrame) -> str:
+        lines = [
+            f"- {_bold(name)} ({country}) won the {race} on {date} in {_bold(time_)}."
+            for race, date, name, country, time_ in zip(
+                df["cleaned_race_name"], df["race_date"], df["athlete_name"], df["athlete_country"], df["overall_time"]
+            )
+        ]
+        answer = lines[0][2:] if len(lines) == 1 else "\n" + "\n".join(lines)
+        return (
+            f"**ANSWER:** {answer}\n\n"
+            f"**LOGIC USED:** In order to answer this question, I found the {year} races in fct_race_results whose "
+            f"organizer and name contain \"{' '.join(words)}\"{f' ({gender})' if gender else ''} and took the athlete with "
+            f"athlete_finishing_place = 1 in each."
+        )
+    return sql, params, render
+
+def _athlete_wins(question: str, bq_client: bigquery.Client):
+    match = _WINS_PATTERN.match(question)
+    if match is None:
+        return None
+    athlete = get_athlete_name_index(bq_client).best_match(match["athlete"], QUESTION_TEMPLATE_MIN_ATHLETE_SCORE)
+    if athlete is None:
+        return None
+    athlete_name, athlete_slug, _ = athlete
+    params = [bigquery.ScalarQueryParameter("athlete_slug", "STRING", athlete_slug)]
+    race_filter, words = "", []
+    if match["race"]:
+        words, _ = _race_words(match["race"])
+        if not words:
+            return None
+        race_filter = f"AND {_RACE_WORDS_FILTER}"
+        params.append(bigquery.ArrayQueryParameter("race_words", "STRING", words))
+    sql = f"""
+SELECT
+  COUNTIF(athlete_finishing_place = 1) AS wins,
+  COUNT(*) AS races,
+  MAX(IF(athlete_finishing_place = 1, race_date, NULL)) AS latest_win_date
+FROM `trilytx.trilytx_fct.fct_race_results`
+WHERE athlete_slug = @athlete_slug
+  {race_filter}
+"""
+    at_race = f" at races matching \"{' '.join(words)}\"" if words else ""
+
+    def render(df: pd.DataFrame) -> Optional[str]:
+        wins, races, latest = df["wins"].iloc[0], df["races"].iloc[0], df["latest_win_date"].iloc[0]
+        if not races:
+            return None
+        latest_text = f" The most recent win was on {latest}." if wins else ""
+        return (
+            f"**ANSWER:** {_bold(athlete_name)} has {_bold(int(wins))} win{'s' if wins != 1 else ''} "
+            f"from {int(races)} race{'s' if races != 1 else ''}{at_race}.{latest_text}\n\n"
+            f"**LOGIC USED:** In order to answer this question, I counted the rows in fct_race_results for "
+            f"athlete_slug = '{athlete_slug}'{at_race} and how many have athlete_finishing_place = 1."
+        )
+    return sql, params, render
+
+def _top_athletes(question: str, bq_client: bigquery.Client):
+    match = _TOP_PATTERN.match(question)
+    if match is None:
+        return None
+    n = int(match["n"])
+    distance_group = _distance_group(match["distance"])
+    if not 1 <= n <= QUESTION_TEMPLATE_MAX_TOP_N or distance_group is None:
+        return None
+    score_col = _ROLE_SCORE_COLUMNS[match["role"]]
+    params = [bigquery.ScalarQueryParameter("distance_group", "STRING", distance_group)]
+    gender = _GENDER_WORDS.get(match["gender"] or "")
+    gender_filter = ""
+    if gender:
+        gender_filter = "AND athlete_gender = @athlete_gender"
+        params.append(bigquery.ScalarQueryParameter("athlete_gender", "STRING", gender))
+    sql = f"""
+SELECT athlete_name, athlete_gender, athlete_country, {score_col}, reporting_week
+FROM `trilytx.trilytx_fct.fct_pto_scores_weekly`
+WHERE reporting_week = (
+    SELECT MAX(reporting_week) FROM `trilytx.trilytx_fct.fct_pto_scores_weekly` WHERE reporting_week <= CURRENT_DATE()
+  )
+  AND distance_group = @distance_group
+  AND {score_col} IS NOT NULL
+  {gender_filter}
+ORDER BY {score_col} DESC
+LIMIT {n}
+"""
+    who = f"{gender} " if gender else ""
+    segment = score_col.split("_")[0]
+
+    def render(df: pd.DataFrame) -> str:
+        lines = [
+            f"{i}. {_bold(name)} ({country}) — {score:.1f}"
+            for i, (name, country, score) in enumerate(zip(df["athlete_name"], df["athlete_country"], df[score_col]), 1)
+        ]
+        return (
+            f"**ANSWER:** The top {len(df)} {who}{match['role']} by {segment} PTO score ({distance_group}) "
+            f"for the week of {df['reporting_week'].iloc[0]}:\n\n" + "\n".join(lines) + "\n\n"
+            f"**LOGIC USED:** In order to answer this question, I took the latest reporting_week in "
+            f"fct_pto_scores_weekly, filtered to distance_group = '{distance_group}'"
+            f"{f' and athlete_gender = {gender!r}' if gender else ''} and ordered by {score_col}."
+        )
+    return sql, params, render
+
+QUESTION_TEMPLATES: List[Tuple[str, Callable]] = [
+    ("race_winner", _race_winner),
+    ("athlete_wins", _athlete_wins),
+    ("top_athletes", _top_athletes),
+]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Matching
+# ──────────────────────────────────────────────────────────────────────────────
+_stats_lock = threading.Lock()
+_template_stats = {"questions": 0, "answered": 0, "no_rows": 0, "errors": 0, "seconds": 0.0, "by_intent": {}}
+
+def answer_from_template(question: str, bq_client: bigquery.Client) -> Optional[Tuple[str, str, pd.DataFrame, str]]:
+    """
+    Answers a question from a parameterized SQL template and templated text, without the LLM.
+
+    Returns:
+        tuple | None: (intent, sql, results, answer markdown), or None when no template
+        matches, an entity cannot be resolved unambiguously, the query returns no rows
+        or it fails; the caller then uses the LLM pipeline.
+    """
+    start = time.perf_counter()
+    normalized = _normalize_question(question)
+    outcome = None
+    try:
+        for intent, template in QUESTION_TEMPLATES:
+            matched = template(normalized, bq_client)
+            if matched is None:
+                continue
+            sql, params, render = matched
+            # Same maximum_bytes_billed cap as LLM-generated chatbot SQL
+            job_config = guarded_job_config()
+            job_config.query_parameters = params
+            df = run_bigquery(sql, bq_client, job_config, prefer_local=True)
+            answer = render(df) if not df.empty else None
+            if answer is None:
+                outcome = "no_rows"
+                return None
+            outcome = intent
+            # The marker keeps this parameterized SQL (meaningless without its
+            # job_config) out of the question cache when the question log is replayed
+            return intent, f"{TEMPLATE_SQL_MARKER}{intent}\n{sql.strip()}", df, answer
+        return None
+    except Exception as e:
+        logger.warning("Question template failed, falling back to the LLM: %s", e)
+        outcome = "errors"
+        return None
+    finally:
+        with _stats_lock:
+            _template_stats["questions"] += 1
+            _template_stats["seconds"] += time.perf_counter() - start
+            if outcome in ("no_rows", "errors"):
+                _template_stats[outcome] += 1
+            elif outcome is not None:
+                _template_stats["answered"] += 1
+                _template_stats["by_intent"][outcome] = _template_stats["by_intent"].get(outcome, 0) + 1
+
+def get_question_template_stats() -> dict:
+    """
+    Returns how many questions were answered from templates, by intent.
+    """
+    with _stats_lock:
+        stats = dict(_template_stats, by_intent=dict(_template_stats["by_intent"]))
+    stats["hit_rate"] = round(stats["answered"] / stats["questions"], 4) if stats["questions"] else 0.0
+    return stats
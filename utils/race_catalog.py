@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import pandas as pd
+from google.cloud import bigquery
+
+from config.app_config import (
+    RACE_CATALOG_REFRESH_SECONDS, RACE_CATALOG_FULL_REFRESH_SECONDS, RACE_CATALOG_LOOKBACK_DAYS,
+)
+from utils.bq_utils import fetch_dataframe
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ["organizer", "race_gender", "race_distance"]
+
+_CATALOG_QUERY = """
+    SELECT
+        unique_race_id,
+        ANY_VALUE(organizer) AS organizer,
+        ANY_VALUE(race_gender) AS race_gender,
+        ANY_VALUE(race_distance) AS race_distance,
+        ANY_VALUE(cleaned_race_name) AS cleaned_race_name,
+        ANY_VALUE(race_date) AS race_date,
+        ANY_VALUE(EXTRACT(YEAR FROM race_date)) AS race_year,
+        ANY_VALUE(CONCAT(initcap(organizer), ' ', cleaned_race_name, ' ', initcap(race_gender), ' (', CAST(race_date AS STRING), ')')) AS label
+    FROM `trilytx.trilytx_fct.fct_race_results`
+    WHERE unique_race_id IS NOT NULL
+    {date_filter}
+    GROUP BY unique_race_id
+"""
+
+
+class RaceCatalog:
+    """
+    In-memory catalog of every race, one row per unique_race_id.
+
+    Organizer, gender and distance are stored as categoricals so filters are integer
+    comparisons on their codes combined as boolean masks. Labels are kept in a dict
+    for O(1) id -> label lookups. refresh() only re-reads races dated within
+    RACE_CATALOG_LOOKBACK_DAYS of the newest race (new and late-loaded results) and
+    upserts them; a full reload happens every RACE_CATALOG_FULL_REFRESH_SECONDS.
+    """
+
+    def __init__(self, bq_client: bigquery.Client):
+        self._bq_client = bq_client
+        self._lock = threading.Lock()
+        self._races = pd.DataFrame()
+        self._labels: Dict[str, str] = {}
+        self._refreshed_at = 0.0
+        self._full_refreshed_at = 0.0
+        self.refreshes = 0
+        self.full_refreshes = 0
+        self._load_full()
+
+    # ── loading ───────────────────────────────────────────────────────────────
+    def _fetch(self, since=None) -> pd.DataFrame:
+        if since is None:
+            return fetch_dataframe(_CATALOG_QUERY.format(date_filter=""), self._bq_client)
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("since", "DATE", since)]
+        )
+        return fetch_dataframe(_CATALOG_QUERY.format(date_filter="AND race_date >= @since"), self._bq_client, job_config)
+
+    def _install(self, races: pd.DataFrame) -> None:
+        races = races.drop_duplicates(subset="unique_race_id", keep="last")
+        races = races.sort_values("race_date", ascending=False, na_position="last").reset_index(drop=True)
+        for col in CATEGORICAL_COLUMNS:
+            races[col] = races[col].astype("category")
+        races["label"] = races["label"].fillna(races["cleaned_race_name"]).fillna(races["unique_race_id"])
+        labels = dict(zip(races["unique_race_id"], races["label"]))
+        with self._lock:
+            # Swap whole objects so concurrent readers always see a consistent snapshot
+            self._races = races
+            self._labels = labels
+            self._refreshed_at = time.monotonic()
+
+    def _load_full(self) -> None:
+        self._install(self._fetch())
+        self._full_refreshed_at = time.monotonic()
+        self.full_refreshes += 1
+
+    def refresh(self) -> None:
+        """
+        Upserts recently dated races, or reloads everything when a full refresh is due.
+        """
+        if time.monotonic() - self._full_refreshed_at > RACE_CATALOG_FULL_REFRESH_SECONDS or self._races.empty:
+            self._load_full()
+            return
+        newest = self._races["race_date"].max()
+        since = (pd.Timestamp(newest) - pd.Timedelta(days=RACE_CATALOG_LOOKBACK_DAYS)).date()
+        recent = self._fetch(since)
+        base = self._races.astype({col: "object" for col in CATEGORICAL_COLUMNS})
+        self._install(pd.concat([base, recent], ignore_index=True))
+        self.refreshes += 1
+
+    def maybe_refresh(self) -> None:
+        if time.monotonic() - self._refreshed_at > RACE_CATALOG_REFRESH_SECONDS:
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the current catalog; try again on the next interval
+                logger.error("Race catalog refresh failed: %s", e)
+                self._refreshed_at = time.monotonic()
+
+    # ── lookups ───────────────────────────────────────────────────────────────
+    def label(self, race_id: str) -> Optional[str]:
+        return self._labels.get(race_id)
+
+    def filter(self, organizer: Optional[str] = None, gender: Optional[str] = None,
+               distance: Optional[str] = None, year: Optional[str] = None) -> pd.DataFrame:
+        """
+        Returns matching races, newest first, with unique_race_id, race_date and label columns.
+        None means no filter on that field.
+        """
+        races = self._races
+        mask = pd.Series(True, index=races.index)
+        for col, value in [("organizer", organizer), ("race_gender", gender), ("race_distance", distance)]:
+            if value is None:
+                continue
+            categories = races[col].cat.categories
+            if value not in categories:
+                return races.iloc[0:0][["unique_race_id", "race_date", "label"]]
+            mask &= races[col].cat.codes.to_numpy() == categories.get_loc(value)
+        if year is not None:
+            mask &= (races["race_year"] == int(year)).fillna(False).to_numpy(dtype=bool)
+        return races.loc[mask, ["unique_race_id", "race_date", "label"]].reset_index(drop=True)
+
+    def stats(self) -> dict:
+        races = self._races
+        return {
+            "races": len(races),
+            "bytes": int(races.memory_usage(deep=True).sum()),
+            "refreshes": self.refreshes,
+            "full_refreshes": self.full_refreshes,
+            "seconds_since_refresh": round(time.monotonic() - self._refreshed_at, 1),
+        }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_race_catalog(bq_client: bigquery.Client) -> RaceCatalog:
+    """
+    Returns the process-wide race catalog shared by all sessions, refreshing it when its TTL has passed.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = RaceCatalog(bq_client)
+                return _catalog
+    # Only one session refreshes; the others keep reading the current snapshot meanwhile
+    if _catalog_lock.acquire(blocking=False):
+        try:
+            _catalog.maybe_refresh()
+        finally:
+            _catalog_lock.release()
+    return _catalog
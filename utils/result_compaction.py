@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from config.app_config import (
+    SUMMARY_RESULT_TOKEN_BUDGET, SUMMARY_TOP_K_ROWS, SUMMARY_MAX_CATEGORIES, SUMMARY_TOP_CATEGORY_COUNTS,
+)
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # Without tiktoken (or its encoding files) tokens are estimated from the character count.
+    _ENCODING = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Returns the token count of text for GPT-4o, or ~4 characters per token without tiktoken.
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def rows_to_sentences(df: pd.DataFrame) -> pd.Series:
+    """
+    Formats every row as "col: value. col: value." (the llm_utils.row_to_sentence
+    format), one column at a time instead of row by row.
+    """
+    if df.empty or len(df.columns) == 0:
+        return pd.Series([], dtype=object)
+    parts = [f"{col}: " + df[col].astype(str) for col in df.columns]
+    return parts[0].str.cat(parts[1:], sep=". ") + "."
+
+def _numeric_summary(df: pd.DataFrame) -> list:
+    numeric = df.select_dtypes(include="number")
+    if numeric.columns.empty:
+        return []
+    stats = numeric.agg(["min", "max", "mean"]).T
+    return [
+        f"{col}: min {low:g}, max {high:g}, mean {mean:.4g}."
+        for col, low, high, mean in zip(stats.index, stats["min"], stats["max"], stats["mean"])
+        if pd.notna(mean)
+    ]
+
+def _category_counts(df: pd.DataFrame) -> list:
+    lines = []
+    for col in df.select_dtypes(include=["object", "string", "category"]).columns:
+        counts = df[col].value_counts(dropna=True)
+        if counts.empty or len(counts) > SUMMARY_MAX_CATEGORIES:
+            continue
+        top = counts.head(SUMMARY_TOP_CATEGORY_COUNTS)
+        listed = ", ".join(f"{value} ({count})" for value, count in top.items())
+        lines.append(f"{col}: {len(counts)} distinct; most common {listed}.")
+    return lines
+
+def compact_results(df: pd.DataFrame, token_budget: int = SUMMARY_RESULT_TOKEN_BUDGET) -> str:
+    """
+    Returns the query results as prompt text that stays within token_budget.
+
+    Results that fit are listed row by row. Larger results are replaced by the row
+    count, per-column min/max/mean, group counts for low-cardinality columns, the
+    first SUMMARY_TOP_K_ROWS rows (the query's own ordering, so usually the top-k)
+    and an evenly spaced sample of the remaining rows, added while the budget allows.
+
+    Args:
+        df (pd.DataFrame): Query results.
+        token_budget (int): Maximum estimated tokens for the returned text.
+
+    Returns:
+        str: Results text for the summary prompt.
+    """
+    sentences = rows_to_sentences(df)
+    full_text = "\n".join(sentences)
+    full_tokens = estimate_tokens(full_text)
+    if full_tokens <= token_budget:
+        return full_text
+
+    header = [f"The query returned {len(df)} rows; too many to list, so aggregates and a sample are shown."]
+    aggregates = _numeric_summary(df) + _category_counts(df)
+    if aggregates:
+        header += ["Column aggregates over all rows:"] + aggregates
+    top_k = min(SUMMARY_TOP_K_ROWS, len(df))
+    header.append(f"First {top_k} rows, in query order:")
+    text = "\n".join(header)
+    used = estimate_tokens(text)
+
+    lines = []
+    for sentence in sentences.iloc[:top_k]:
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(sentence)
+        used += cost
+
+    remaining = len(df) - top_k
+    if remaining > 0 and len(lines) == top_k:
+        sample_label = "Evenly spaced sample of the remaining rows:"
+        used += estimate_tokens(sample_label) + 1
+        # Upper bound on how many rows could fit, from the average row size
+        avg_cost = max(1, full_tokens // len(df))
+        n_sample = int(min(remaining, max(0, token_budget - used) // avg_cost))
+        if n_sample > 0:
+            positions = np.unique(np.linspace(top_k, len(df) - 1, n_sample).round().astype(int))
+            sample = []
+            for sentence in sentences.iloc[positions]:
+                cost = estimate_tokens(sentence) + 1
+                if used + cost > token_budget:
+                    break
+                sample.append(sentence)
+                used += cost
+            if sample:
+                lines += [sample_label] + sample
+    return "\n".join([text] + lines)
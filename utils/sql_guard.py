@@ -0,0 +1,175 @@
+import logging
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+import sqlglot
+from sqlglot import exp
+from google.cloud import bigquery
+
+from config.app_config import SQL_GUARD_MAX_ROWS, SQL_GUARD_MAX_BYTES_BILLED, SQL_GUARD_DRY_RUN_BUDGET_BYTES
+from utils.bq_utils import dry_run_query
+
+logger = logging.getLogger(__name__)
+
+# Columns kept when a `SELECT *` over a large table is pruned to fit the budget.
+# Any other column the query references is kept as well.
+CORE_COLUMNS = {
+    "fct_race_results": [
+        "unique_race_id", "race_date", "organizer", "cleaned_race_name", "race_distance", "race_gender",
+        "athlete_name", "athlete_slug", "athlete_country", "athlete_finishing_place",
+        "swim_time", "bike_time", "run_time", "overall_time",
+    ],
+    "fct_race_results_vs_predict": [
+        "unique_race_id", "race_date", "cleaned_race_name", "race_distance", "athlete_name", "athlete_slug",
+        "overall_pto_rank", "overall_actual_rank", "overall_delta", "athlete_finishing_place", "overall_time",
+    ],
+    "fct_race_segment_positions": [
+        "unique_race_id", "race_date", "cleaned_race_name", "athlete_name", "athlete_slug",
+        "rank_after_swim", "rank_after_bike", "rank_after_run",
+    ],
+    "fct_pto_scores_weekly": [
+        "reporting_week", "distance_group", "athlete_name", "athlete_slug", "athlete_gender", "athlete_country",
+        "swim_pto_score", "bike_pto_score", "run_pto_score", "overall_pto_score",
+    ],
+}
+
+# Statement types that may never run, wherever they appear in the tree
+_FORBIDDEN_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter,
+    exp.Command, exp.Grant, exp.TruncateTable,
+)
+
+
+class UnsafeSQLError(ValueError):
+    """The SQL is not a single read-only SELECT; it must not run and should not be retried."""
+
+
+class QueryBudgetError(ValueError):
+    """The query would process more bytes than allowed; the generator should narrow it."""
+
+
+def _parse_single_select(sql: str) -> exp.Expression:
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="bigquery") if s is not None]
+    except sqlglot.errors.ParseError as e:
+        raise UnsafeSQLError(f"SQL could not be parsed: {e}") from e
+    if len(statements) != 1:
+        raise UnsafeSQLError(f"Expected exactly one statement, found {len(statements)}.")
+    tree = statements[0]
+    # SELECT, or a set operation of SELECTs (UNION / EXCEPT / INTERSECT)
+    if not isinstance(tree, exp.Query):
+        raise UnsafeSQLError(f"Only SELECT queries are allowed, found {tree.key.upper()}.")
+    forbidden = next(tree.find_all(*_FORBIDDEN_NODES), None)
+    if forbidden is not None:
+        raise UnsafeSQLError(f"{forbidden.key.upper()} is not allowed.")
+    return tree
+
+def guard_sql(sql: str, max_rows: int = SQL_GUARD_MAX_ROWS) -> str:
+    """
+    Checks that LLM-generated SQL is a single read-only SELECT and caps its result rows.
+
+    The outermost query gets `LIMIT max_rows` if it has no LIMIT, and a literal LIMIT
+    above max_rows is lowered to it.
+
+    Args:
+        sql (str): BigQuery SQL.
+        max_rows (int): Maximum rows the query may return.
+
+    Returns:
+        str: The rewritten SQL.
+
+    Raises:
+        UnsafeSQLError: If the SQL does not parse, has several statements or is not a SELECT.
+    """
+    tree = _parse_single_select(sql)
+    limit = tree.args.get("limit")
+    if limit is None:
+        tree = tree.limit(max_rows, copy=False)
+    else:
+        value = limit.expression
+        if not (isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows):
+            limit.set("expression", exp.Literal.number(max_rows))
+    return tree.sql(dialect="bigquery")
+
+
+_table_columns: Dict[str, Set[str]] = {}
+_table_columns_lock = threading.Lock()
+
+def _get_table_columns(client: bigquery.Client, table: exp.Table) -> Optional[Set[str]]:
+    table_id = ".".join(part for part in (table.catalog, table.db, table.name) if part)
+    with _table_columns_lock:
+        if table_id in _table_columns:
+            return _table_columns[table_id]
+    try:
+        columns = {field.name for field in client.get_table(table_id).schema}
+    except Exception as e:
+        logger.warning("Could not read schema of %s: %s", table_id, e)
+        return None
+    with _table_columns_lock:
+        _table_columns[table_id] = columns
+    return columns
+
+def prune_select_star(sql: str, client: bigquery.Client) -> Optional[str]:
+    """
+    Replaces `SELECT *` over a base table in CORE_COLUMNS with its core columns plus
+    any other column of that table the query references.
+
+    Returns:
+        str | None: The rewritten SQL, or None if there was nothing to prune.
+    """
+    tree = sqlglot.parse_one(sql, read="bigquery")
+    referenced = {column.name for column in tree.find_all(exp.Column)}
+    changed = False
+    for select in tree.find_all(exp.Select):
+        if not any(isinstance(e, exp.Star) for e in select.expressions):
+            continue
+        # The FROM clause is stored under "from_" in newer sqlglot releases
+        source = select.args.get("from_") or select.args.get("from")
+        table = source.this if source is not None else None
+        if not isinstance(table, exp.Table) or table.name not in CORE_COLUMNS or select.args.get("joins"):
+            continue
+        columns = _get_table_columns(client, table)
+        if columns is None:
+            continue
+        keep = [c for c in CORE_COLUMNS[table.name] if c in columns]
+        keep += sorted((referenced & columns) - set(keep))
+        others = [e for e in select.expressions if not isinstance(e, exp.Star)]
+        select.set("expressions", [exp.column(c) for c in keep] + others)
+        changed = True
+    return tree.sql(dialect="bigquery") if changed else None
+
+def enforce_dry_run_budget(sql: str, client: bigquery.Client,
+                           budget_bytes: int = SQL_GUARD_DRY_RUN_BUDGET_BYTES) -> Tuple[str, int]:
+    """
+    Dry-runs the query and, if its estimate is over budget, tries pruning `SELECT *`
+    to core columns before giving up.
+
+    Returns:
+        tuple: (SQL to run, estimated bytes processed)
+
+    Raises:
+        QueryBudgetError: If the query is still over budget.
+        Exception: Any BigQuery error from the dry run (invalid SQL).
+    """
+    estimated_bytes = dry_run_query(sql, client)
+    if estimated_bytes <= budget_bytes:
+        return sql, estimated_bytes
+
+    pruned = prune_select_star(sql, client)
+    if pruned is not None:
+        pruned_bytes = dry_run_query(pruned, client)
+        logger.info("Pruned SELECT * from %d to %d estimated bytes", estimated_bytes, pruned_bytes)
+        if pruned_bytes <= budget_bytes:
+            return pruned, pruned_bytes
+        estimated_bytes = pruned_bytes
+
+    raise QueryBudgetError(
+        f"Query would process {estimated_bytes / 1e9:.2f} GB, over the {budget_bytes / 1e9:.2f} GB budget. "
+        "Select only the columns needed and filter on race_date, reporting_week or the athlete instead of scanning whole tables."
+    )
+
+def guarded_job_config() -> bigquery.QueryJobConfig:
+    """
+    Returns a job config that makes BigQuery fail the job rather than bill more than SQL_GUARD_MAX_BYTES_BILLED.
+    """
+    return bigquery.QueryJobConfig(maximum_bytes_billed=SQL_GUARD_MAX_BYTES_BILLED)
@@ -1,5 +1,7 @@
 import datetime
+import html
 import streamlit as st
+import numpy as np
 import pandas as pd
 from google.cloud import bigquery
 import requests as pyrequests
@@ -8,6 +10,8 @@ import json
 import requests as pyrequests  # rename to avoid conflict with google.auth.transport.requests
 from streamlit_oauth import OAuth2Component
 from config.app_config import USE_LOCAL
+from utils.telemetry import enqueue_telemetry_row
+from utils.country_flags import get_country_flag_resolver
 import requests as pyrequests
 import os
 import json
@@ -23,9 +27,7 @@ def log_athlete_search(bq_client: bigquery.Client,  athlete_slug: str, full_tabl
         "user_email": user_email,
         "timestamp": datetime.datetime.utcnow().isoformat()
     }
-    errors = bq_client.insert_rows_json(full_table_path, [row])
-    if errors:
-        st.error(f"Failed logging search: {errors}")
+    enqueue_telemetry_row(bq_client, full_table_path, row)
 
 def log_race_search(bq_client: bigquery.Client,  race_id: str, full_table_path: str,):
     user_email = st.session_state.get("user", {}).get("email", "unknown")
@@ -35,9 +37,7 @@ def log_race_search(bq_client: bigquery.Client,  race_id: str, full_table_path:
         "user_email": user_email,
         "timestamp": datetime.datetime.utcnow().isoformat()
     }
-    errors = bq_client.insert_rows_json(full_table_path, [row])
-    if errors:
-        st.error(f"Failed logging search: {errors}")
+    enqueue_telemetry_row(bq_client, full_table_path, row)
 def log_race_recap_generate(bq_client: bigquery.Client,  race_id: str, full_table_path: str,):
     user_email = st.session_state.get("user", {}).get("email", "unknown")
 
@@ -46,9 +46,7 @@ def log_race_recap_generate(bq_client: bigquery.Client,  race_id: str, full_tabl
         "user_email": user_email,
         "timestamp": datetime.datetime.utcnow().isoformat()
     }
-    errors = bq_client.insert_rows_json(full_table_path, [row])
-    if errors:
-        st.error(f"Failed logging recap: {errors}")
+    enqueue_telemetry_row(bq_client, full_table_path, row)
 def log_vote_to_bq(client: bigquery.Client, full_table_path: str, vote_type: str, question: str, summary: str):
     """
     Logs user feedback (upvote/downvote) to a specified BigQuery table.
@@ -62,17 +60,15 @@ def log_vote_to_bq(client: bigquery.Client, full_table_path: str, vote_type: str
     """
     user_email = st.session_state.get("user", {}).get("email", "unknown")
     question_id = st.session_state.get("question_id", "unknown")
-    rows = [{
+    row = {
         "vote_type": vote_type,
         "question_id": question_id,
         "user_email": user_email,
         "question_id": question_id,
         "user_email": user_email,
         "timestamp": datetime.datetime.utcnow().isoformat()
-    }]
-    errors = client.insert_rows_json(full_table_path, rows)
-    if errors:
-        st.error(f"🔴 Error logging vote to BigQuery: {errors}")
+    }
+    enqueue_telemetry_row(client, full_table_path, row)
 
 def log_chatbot_question_to_bq(client: bigquery.Client, full_table_path: str, question: str, sql: str, summary: str, is_follow_up=False, previous_question=None, context_history=None):
     """
@@ -89,7 +85,7 @@ def log_chatbot_question_to_bq(client: bigquery.Client, full_table_path: str, qu
     user_email = st.session_state.get("user", {}).get("email", "unknown")
     question_id = st.session_state.get("question_id", "unknown")
     user_email = st.session_state.get("user", {}).get("email", "unknown")
-    rows = [{
+    row = {
         "question": question,
         "question_id": question_id,
         "user_email": user_email,
@@ -101,10 +97,8 @@ def log_chatbot_question_to_bq(client: bigquery.Client, full_table_path: str, qu
         "is_follow_up": str(is_follow_up).lower(),
         "previous_question": previous_question or "",
         "context_history": context_history or ""
-    }]
-    errors = client.insert_rows_json(full_table_path, rows)
-    if errors:
-        st.error(f"🔴 Error logging interaction to BigQuery: {errors}")
+    }
+    enqueue_telemetry_row(client, full_table_path, row)
 
 
 def log_error_to_bq(client: bigquery.Client, full_table_path: str, question: str, sql: str, error_msg: str, attempt: int):
@@ -119,16 +113,14 @@ def log_error_to_bq(client: bigquery.Client, full_table_path: str, question: str
         error_msg (str): The error message.
         attempt (int): The attempt number at which the error occurred.
     """
-    rows = [{
+    row = {
         "timestamp": datetime.datetime.utcnow().isoformat(),
         "question": question,
         "generated_sql": sql,
         "error_message": error_msg,
         "attempt": attempt
-    }]
-    errors = client.insert_rows_json(full_table_path, rows)
-    if errors:
-        st.error(f"🔴 Failed to log error to BigQuery: {errors}")
+    }
+    enqueue_telemetry_row(client, full_table_path, row)
 
 def log_zero_result_to_bq(bq_client: bigquery.Client, table_name: str, question: str, sql: str, attempt_number: int):
     """
@@ -141,15 +133,13 @@ def log_zero_result_to_bq(bq_client: bigquery.Client, table_name: str, question:
         sql (str): The SQL query that returned no results.
         attempt_number (int): The attempt number at which zero results were returned.
     """
-    rows_to_insert = [{
+    row = {
         "question": question,
         "sql": sql,
         "attempt_number": attempt_number,
         "timestamp": datetime.datetime.utcnow().isoformat()
-    }]
-    errors = bq_client.insert_rows_json(table_name, rows_to_insert)
-    if errors:
-        st.error(f"🔴 Failed to log zero result to BigQuery: {errors}")
+    }
+    enqueue_telemetry_row(bq_client, table_name, row)
 
 
 
@@ -249,24 +239,128 @@ import urllib.parse
 def make_athlete_link(name: str, slug: str) -> str:
     import urllib.parse
     encoded_slug = urllib.parse.quote(slug)
-    return f'<a href="/Athlete_Profile?athlete_slug={encoded_slug}" target="_self">{name}</a>'
+    return f'<a href="/Athlete_Profile?athlete_slug={encoded_slug}" target="_self">{html.escape(str(name))}</a>'
 
 def make_race_link(name: str, race_id: str) -> str:
     import urllib.parse
     encoded_id = urllib.parse.quote(race_id)
-    return f'<a href="/Race_Results?unique_race_id={encoded_id}" target="_self">{name}</a>'
-
-import pycountry
+    return f'<a href="/Race_Results?unique_race_id={encoded_id}" target="_self">{html.escape(str(name))}</a>'
 
 def get_flag(country_value):
-    try:
-        country = pycountry.countries.lookup(country_value)
-        code = country.alpha_2.lower()
-
-        # Build emoji flag from country code
-        return f"<img src='https://flagicons.lipis.dev/flags/4x3/{code}.svg' height='16' style='vertical-align:middle; margin-right:4px;'> {country_value}"
-    except:
-        pass
+    """
+    Returns a flag image followed by the country name, or just the country name if
+    no flag is known for it. Missing values give an empty string.
+    """
+    if country_value is None or pd.isna(country_value) or str(country_value).strip() == "":
+        return ""
+    code = get_country_flag_resolver().resolve(country_value)
+    country = html.escape(str(country_value))
+    if code is None:
+        return country
+    # Build emoji flag from country code
+    return f"<img src='https://flagicons.lipis.dev/flags/4x3/{code}.svg' height='16' style='vertical-align:middle; margin-right:4px;'> {country}"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Vectorized Table Rendering
+# ──────────────────────────────────────────────────────────────────────────────
+MEDALS = ["🥇", "🥈", "🥉"]
+
+def to_display_strings(series: pd.Series) -> pd.Series:
+    """
+    Converts a column to strings, with missing values as empty strings.
+    Floats use "%g" formatting, matching the tabulate/to_markdown output the pages used before.
+    """
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        formatted = pd.Series(np.char.mod("%g", values), index=series.index).astype(object)
+        return formatted.where(series.notna(), "")
+    return series.astype(object).where(series.notna(), "").astype(str)
+
+def format_int_column(series: pd.Series) -> pd.Series:
+    """
+    Formats a numeric column (e.g. places, ranks) as whole numbers, with missing values as empty strings.
+    """
+    numeric = np.trunc(pd.to_numeric(series, errors="coerce")).astype("Int64")
+    return to_display_strings(numeric)
+
+def _quoted(values: pd.Series) -> pd.Series:
+    import urllib.parse
+    values = to_display_strings(values)
+    # Quote each distinct value once rather than once per row
+    return values.map({v: urllib.parse.quote(v) for v in values.unique()})
+
+def _escaped(values: pd.Series) -> pd.Series:
+    values = to_display_strings(values)
+    return values.map({v: html.escape(v) for v in values.unique()})
+
+def athlete_link_column(names: pd.Series, slugs: pd.Series) -> pd.Series:
+    """
+    Vectorized make_athlete_link() over whole columns.
+    """
+    return ('<a href="/Athlete_Profile?athlete_slug=' + _quoted(slugs)
+            + '" target="_self">' + _escaped(names) + "</a>")
+
+def race_link_column(names: pd.Series, race_ids: pd.Series) -> pd.Series:
+    """
+    Vectorized make_race_link() over whole columns.
+    """
+    return ('<a href="/Race_Results?unique_race_id=' + _quoted(race_ids)
+            + '" target="_self">' + _escaped(names) + "</a>")
+
+def flag_column(countries: pd.Series) -> pd.Series:
+    """
+    Vectorized get_flag() over a column; each distinct country is looked up once.
+    """
+    flags = {c: get_flag(c) for c in countries.dropna().unique()}
+    return countries.map(flags).fillna("").astype(str)
+
+def medal_fastest_column(display: pd.Series, values: pd.Series, n: int = 3) -> pd.Series:
+    """
+    Prefixes the n smallest values (e.g. fastest times) with 🥇/🥈/🥉.
+
+    Args:
+        display (pd.Series): Strings to show.
+        values (pd.Series): Sortable values (e.g. timedeltas) aligned with display.
+    """
+    ranks = values.rank(method="first")
+    out = display.copy()
+    for place, medal in enumerate(MEDALS[:n], start=1):
+        mask = ranks == place
+        out[mask] = medal + " " + out[mask]
+    return out
+
+def medal_place_column(places: pd.Series) -> pd.Series:
+    """
+    Formats finishing places with 🥇/🥈/🥉 for the podium and "❌ DNF" when there is no place.
+    """
+    numeric = pd.to_numeric(places, errors="coerce")
+    out = to_display_strings(places)
+    out = out.where(numeric.isna(), format_int_column(numeric))
+    for place, medal in enumerate(MEDALS, start=1):
+        mask = numeric == place
+        out[mask] = medal + " " + out[mask]
+    out[numeric.isna()] = "❌ DNF"
+    return out
+
+def render_html_table(df: pd.DataFrame, html_columns=()) -> str:
+    """
+    Renders a DataFrame as an HTML table in one pass, for st.markdown(..., unsafe_allow_html=True).
+
+    Cells are HTML-escaped, except in html_columns, which must hold the output of
+    athlete_link_column / race_link_column / flag_column (those escape their own text).
+    Missing values become empty cells.
+    """
+    header = "".join(f"<th>{html.escape(str(col))}</th>" for col in df.columns)
+    if df.empty:
+        return f"<table><thead><tr>{header}</tr></thead><tbody></tbody></table>"
+    cells = None
+    for col in df.columns:
+        text = to_display_strings(df[col]) if col in html_columns else _escaped(df[col])
+        column = "<td>" + text + "</td>"
+        cells = column if cells is None else cells + column
+    body = "".join("<tr>" + cells + "</tr>")
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>"
 
 
 def init_cookies_and_restore_user():
@@ -0,0 +1,194 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config.app_config import TABLE_ROUTER_MODEL_PATH, TABLE_ROUTER_MIN_CONFIDENCE
+from utils.data_prompts import TABLE_SUMMARIES
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Keyword Rules
+# ──────────────────────────────────────────────────────────────────────────────
+# Each pattern is a strong hint that the question needs that table. These encode
+# the same guidance the table-selection prompt gives the LLM.
+TABLE_KEYWORD_RULES = {
+    "fct_pto_scores_weekly": re.compile(
+        r"\b(pto|scores?|ranks?|ranked|rankings?|top \d+|best|strongest|fastest (swimmer|cyclist|runner)s?"
+        r"|(swimmer|cyclist|runner)s?|today|currently|right now|this week|trend(s|ing)?|over time)\b"
+    ),
+    "fct_race_segment_positions": re.compile(
+        r"\b(after the (swim|bike|run)|positions?|moved up|move up|gained|lost (places|positions|ground)"
+        r"|overt(ook|ake|aking)|transitions?|t1|t2|mid-race|during the (swim|bike|run)|lead(er|ing)? after)\b"
+    ),
+    "fct_race_results_vs_predict": re.compile(
+        r"\b(predict(ed|ion|ions)?|expected|expectations?|over-?perform(ed|ance|ers?)?|under-?perform(ed|ance|ers?)?"
+        r"|delta|surpris(e|ing|ed))\b"
+    ),
+    "fct_race_results": re.compile(
+        r"\b(won|wins?|winners?|podiums?|finish(ed|ing)?|times?|splits?|results?|races?|placed|dnf|field|fastest"
+        r"|ironman|challenge|t100|wtcs|championships?|(19|20)\d{2})\b"
+    ),
+}
+
+# Rules alone are only trusted when this many keyword hits all point at one table;
+# a single loose hit ("top 5") is not enough to skip the LLM.
+RULES_ONLY_MIN_HITS = 2
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+def _features(question: str) -> List[str]:
+    tokens = _TOKEN_PATTERN.findall(question.lower())
+    features = [f"w:{t}" for t in tokens]
+    features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    features += [f"rule:{table}" for table, pattern in TABLE_KEYWORD_RULES.items() if pattern.search(question.lower())]
+    features.append("bias")
+    return features
+
+def _rule_hits(question: str) -> Dict[str, int]:
+    text = question.lower()
+    return {table: len(pattern.findall(text)) for table, pattern in TABLE_KEYWORD_RULES.items()}
+
+def _rule_scores(question: str) -> Dict[str, float]:
+    matches = _rule_hits(question)
+    total = sum(matches.values())
+    if not total:
+        return {table: 0.0 for table in TABLE_KEYWORD_RULES}
+    return {table: count / total for table, count in matches.items()}
+
+def _sigmoid(x: float) -> float:
+    if x < -30:
+        return 0.0
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+class TableRouter:
+    """
+    Local table selector for generated SQL.
+
+    Keyword rules give a prior over the tables in TABLE_SUMMARIES. When a model has
+    been trained on logged questions, one-vs-rest logistic regression over word,
+    bigram and rule features gives a per-table probability that is averaged with the
+    rule prior. route() returns the chosen tables and a confidence; callers should
+    defer to the LLM when the confidence is below TABLE_ROUTER_MIN_CONFIDENCE.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, Dict[str, float]]] = None):
+        self.tables = list(TABLE_SUMMARIES.keys())
+        self.weights = weights or {}
+
+    @property
+    def is_trained(self) -> bool:
+        return bool(self.weights)
+
+    def predict_proba(self, question: str) -> Dict[str, float]:
+        rules = _rule_scores(question)
+        if not self.is_trained:
+            return rules
+        features = _features(question)
+        probs = {}
+        for table in self.tables:
+            w = self.weights.get(table, {})
+            model_p = _sigmoid(sum(w.get(f, 0.0) for f in features))
+            probs[table] = 0.5 * model_p + 0.5 * rules.get(table, 0.0)
+        return probs
+
+    def route(self, question: str, max_tables: int = 2) -> Tuple[List[str], float]:
+        """
+        Picks up to max_tables tables for a question.
+
+        Returns:
+            tuple: (tables, confidence). Confidence is the score of the weakest selected table.
+        """
+        probs = self.predict_proba(question)
+        ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
+        best_table, best_p = ranked[0]
+        if best_p <= 0:
+            return [], 0.0
+        selected = [best_table]
+        confidence = best_p
+        if max_tables > 1 and len(ranked) > 1:
+            second_table, second_p = ranked[1]
+            # A second table is only worth adding when it is nearly as likely as the first
+            if second_p >= 0.5 and second_p >= 0.8 * best_p:
+                selected.append(second_table)
+                confidence = second_p
+        if not self.is_trained:
+            # Rules alone are only trusted when several hits point at a single table;
+            # otherwise confidence stays below TABLE_ROUTER_MIN_CONFIDENCE and the LLM decides
+            hits = _rule_hits(question)
+            single_table = len([p for p in probs.values() if p > 0]) == 1
+            if single_table and hits[best_table] >= RULES_ONLY_MIN_HITS:
+                confidence = best_p
+            else:
+                confidence = min(best_p * 0.5, TABLE_ROUTER_MIN_CONFIDENCE * 0.5)
+        return selected, confidence
+
+    def fit(self, questions: List[str], labels: List[List[str]], epochs: int = 15,
+            learning_rate: float = 0.2, l2: float = 1e-4, seed: int = 0) -> "TableRouter":
+        """
+        Trains one-vs-rest logistic regression with SGD.
+
+        Args:
+            questions (List[str]): Logged user questions.
+            labels (List[List[str]]): Tables each question's SQL actually used.
+        """
+        rng = random.Random(seed)
+        examples = [(_features(q), set(l)) for q, l in zip(questions, labels) if l]
+        self.weights = {table: {} for table in self.tables}
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for features, gold in examples:
+                for table in self.tables:
+                    w = self.weights[table]
+                    p = _sigmoid(sum(w.get(f, 0.0) for f in features))
+                    gradient = (1.0 if table in gold else 0.0) - p
+                    for f in features:
+                        w[f] = w.get(f, 0.0) * (1 - learning_rate * l2) + learning_rate * gradient
+        # Drop near-zero weights to keep the saved model small
+        self.weights = {t: {f: round(v, 5) for f, v in w.items() if abs(v) > 1e-3} for t, w in self.weights.items()}
+        return self
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"tables": self.tables, "weights": self.weights}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "TableRouter":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(weights=data.get("weights"))
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_table_router() -> TableRouter:
+    """
+    Returns the process-wide router, loading the trained model from TABLE_ROUTER_MODEL_PATH if present.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                if TABLE_ROUTER_MODEL_PATH and os.path.exists(TABLE_ROUTER_MODEL_PATH):
+                    _router = TableRouter.load(TABLE_ROUTER_MODEL_PATH)
+                else:
+                    _router = TableRouter()
+    return _router
+
+def route_tables(question: str) -> Tuple[List[str], float, bool]:
+    """
+    Routes a question to tables locally.
+
+    Returns:
+        tuple: (tables, confidence, is_confident) where is_confident means the
+               LLM table-selection call can be skipped.
+    """
+    tables, confidence = get_table_router().route(question)
+    return tables, confidence, bool(tables) and confidence >= TABLE_ROUTER_MIN_CONFIDENCE
@@ -0,0 +1,238 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from google.cloud import bigquery
+
+from config.app_config import (
+    TELEMETRY_QUEUE_MAX_ROWS, TELEMETRY_BATCH_SIZE, TELEMETRY_FLUSH_INTERVAL_SECONDS,
+    TELEMETRY_MAX_RETRIES, TELEMETRY_BACKOFF_BASE_SECONDS,
+    TELEMETRY_SPOOL_DIR, TELEMETRY_SPOOL_SEGMENT_BYTES, TELEMETRY_SPOOL_MAX_BYTES, TELEMETRY_TABLES,
+)
+from utils.bq_utils import get_bq_client
+from utils.telemetry_spool import TelemetrySpool
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryWriter:
+    """
+    Background writer that spools telemetry rows to disk and drains them to BigQuery.
+
+    Request threads put rows on a bounded in-memory queue (never blocking; rows are
+    dropped and counted when it is full). A spooler thread appends them to a local
+    TelemetrySpool in batches with one fsync per batch, and a drainer thread replays
+    spooled records to BigQuery in per-table batches, retrying with exponential
+    backoff. Every record carries an insert_id that is sent as the BigQuery row ID.
+    Within a process, ids delivered from a batch are remembered until its checkpoint
+    is committed, so retrying a partly delivered batch skips those rows. After a
+    restart, replayed rows rely on BigQuery's best-effort insertId deduplication
+    (about a minute), so delivery is at-least-once with best-effort dedup.
+    """
+
+    def __init__(self, spool: Optional[TelemetrySpool] = None,
+                 max_queue_size: int = TELEMETRY_QUEUE_MAX_ROWS,
+                 batch_size: int = TELEMETRY_BATCH_SIZE,
+                 flush_interval_seconds: float = TELEMETRY_FLUSH_INTERVAL_SECONDS,
+                 max_retries: int = TELEMETRY_MAX_RETRIES,
+                 backoff_base_seconds: float = TELEMETRY_BACKOFF_BASE_SECONDS,
+                 spool_max_bytes: int = TELEMETRY_SPOOL_MAX_BYTES,
+                 client_factory: Callable[[], bigquery.Client] = get_bq_client):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.spool_max_bytes = spool_max_bytes
+        self._spool = spool or TelemetrySpool(TELEMETRY_SPOOL_DIR, TELEMETRY_SPOOL_SEGMENT_BYTES)
+        self._client_factory = client_factory
+        self._client = None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._delivered_ids = set()  # insert_ids delivered in the batch being drained (in memory only)
+        self._counter_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0, "dropped": 0, "spooled": 0, "written": 0,
+            "duplicates_skipped": 0, "failed": 0, "retries": 0, "batches": 0,
+        }
+        self._spooled_event = threading.Event()
+        self._spooler = threading.Thread(target=self._run_spooler, name="telemetry-spooler", daemon=True)
+        self._drainer = threading.Thread(target=self._run_drainer, name="telemetry-drainer", daemon=True)
+        self._spooler.start()
+        self._drainer.start()
+        # Replay anything left in the spool by a previous process
+        self._spooled_event.set()
+
+    def enqueue(self, client: bigquery.Client, full_table_path: str, row: dict) -> bool:
+        """
+        Queues a row for durable asynchronous insertion. Never blocks.
+
+        Returns:
+            bool: False if the queue was full and the row was dropped.
+        """
+        if full_table_path not in TELEMETRY_TABLES:
+            logger.error("Refusing telemetry row for unknown table %s", full_table_path)
+            self._count("dropped")
+            return False
+        if client is not None:
+            self._client = client
+        record = {"insert_id": uuid.uuid4().hex, "table": full_table_path, "row": row}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """
+        Waits up to timeout seconds for queued rows to be spooled and the spool drained.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0 and self._spool.pending_bytes() == 0:
+                return
+            self._spooled_event.set()
+            time.sleep(0.05)
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats["queued"] = self._queue.qsize()
+        stats["spool_pending_bytes"] = self._spool.pending_bytes()
+        stats["spool_corrupt_records"] = self._spool.corrupt_records
+        return stats
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    # ── spooler: memory queue -> disk ─────────────────────────────────────────
+    def _run_spooler(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if self._spool.pending_bytes() > self.spool_max_bytes:
+                    logger.error("Telemetry spool over %d bytes; dropping %d rows", self.spool_max_bytes, len(batch))
+                    self._count("dropped", len(batch))
+                else:
+                    self._spool.append(batch)
+                    self._count("spooled", len(batch))
+                    self._spooled_event.set()
+            except OSError as e:
+                logger.error("Could not spool %d telemetry rows: %s", len(batch), e)
+                self._count("dropped", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # ── drainer: disk -> BigQuery ─────────────────────────────────────────────
+    def _run_drainer(self) -> None:
+        failures = 0
+        while True:
+            self._spooled_event.wait(timeout=self.flush_interval_seconds)
+            self._spooled_event.clear()
+            while True:
+                records, position = self._spool.read_batch(self.batch_size)
+                if not records:
+                    if position != self._spool.checkpoint:
+                        self._spool.commit(position)  # Skip past emptied segments
+                    break
+                if not self._deliver(records):
+                    failures += 1
+                    time.sleep(min(self.backoff_base_seconds * (2 ** failures), 60))
+                    break
+                failures = 0
+                self._spool.commit(position)
+                self._delivered_ids.clear()
+
+    def _deliver(self, records: List[dict]) -> bool:
+        by_table: Dict[str, List[dict]] = {}
+        for record in records:
+            if record.get("insert_id") in self._delivered_ids:
+                self._count("duplicates_skipped")
+                continue
+            by_table.setdefault(record.get("table"), []).append(record)
+
+        for table, table_records in by_table.items():
+            if table not in TELEMETRY_TABLES:
+                logger.error("Discarding %d spooled rows for unknown table %s", len(table_records), table)
+                self._count("failed", len(table_records))
+                continue
+            if not self._insert_with_retry(table, table_records):
+                return False
+            self._delivered_ids.update(r["insert_id"] for r in table_records)
+        return True
+
+    def _insert_with_retry(self, table: str, records: List[dict]) -> bool:
+        rows = [r["row"] for r in records]
+        row_ids = [r["insert_id"] for r in records]
+        for attempt in range(self.max_retries + 1):
+            try:
+                client = self._client or self._client_factory()
+                errors = client.insert_rows_json(table, rows, row_ids=row_ids)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Telemetry insert into %s failed after %d attempts, will replay from spool: %s",
+                                 table, attempt + 1, e)
+                    return False
+                self._count("retries")
+                time.sleep(self.backoff_base_seconds * (2 ** attempt))
+                continue
+
+            self._count("batches")
+            if errors:
+                # Row-level errors (schema mismatches etc.) will not succeed on replay
+                logger.error("Telemetry insert into %s rejected %d rows: %s", table, len(errors), errors)
+                self._count("failed", len(errors))
+            self._count("written", len(rows) - len(errors))
+            return True
+        return False
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_telemetry_writer() -> TelemetryWriter:
+    """
+    Returns the process-wide telemetry writer, starting its background thread on first use.
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = TelemetryWriter()
+                atexit.register(_writer.flush)
+    return _writer
+
+def enqueue_telemetry_row(client: bigquery.Client, full_table_path: str, row: dict) -> bool:
+    """
+    Queues a single telemetry row for durable, batched background insertion into full_table_path.
+
+    Args:
+        client (bigquery.Client): The client used to perform the insert.
+        full_table_path (str): The full BigQuery table path (e.g., "project.dataset.table").
+        row (dict): The JSON-serializable row to insert.
+
+    Returns:
+        bool: False if the row was dropped because the queue is full.
+    """
+    return get_telemetry_writer().enqueue(client, full_table_path, row)
+
+def get_telemetry_stats() -> dict:
+    """
+    Returns enqueue/drop/spool/write/retry counters for the telemetry writer.
+    """
+    return get_telemetry_writer().stats()
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_PATTERN = re.compile(r"^segment-(\d{12})\.jsonl$")
+_CHECKPOINT_FILE = "checkpoint.json"
+
+
+class TelemetrySpool:
+    """
+    Append-only, segmented JSONL log of telemetry records on local disk.
+
+    Each record is one line: {"insert_id": ..., "table": ..., "row": {...}}.
+    append() writes a whole batch and fsyncs once, so durability costs one sync
+    per batch rather than one per event. Segments roll over at segment_max_bytes.
+    A checkpoint file stores the (segment, byte offset) up to which records have
+    been delivered; read_batch() resumes from it and commit() advances it and
+    deletes fully delivered segments.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self.corrupt_records = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._checkpoint = self._load_checkpoint()
+        segments = self._segment_numbers()
+        self._active_segment = segments[-1] if segments else max(self._checkpoint[0], 1)
+        self._repair_tail(self._active_segment)
+
+    # ── writing ───────────────────────────────────────────────────────────────
+    def append(self, records: List[dict]) -> None:
+        """
+        Appends records to the active segment and fsyncs once for the whole batch.
+        """
+        if not records:
+            return
+        payload = "".join(json.dumps(r, default=str, separators=(",", ":")) + "\n" for r in records)
+        data = payload.encode("utf-8")
+        with self._lock:
+            path = self._segment_path(self._active_segment)
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            if size >= self.segment_max_bytes:
+                self._active_segment += 1
+                open(self._segment_path(self._active_segment), "ab").close()
+                self._fsync_directory()
+
+    # ── reading / committing ──────────────────────────────────────────────────
+    def read_batch(self, max_records: int) -> Tuple[List[dict], Tuple[int, int]]:
+        """
+        Reads up to max_records complete records after the checkpoint.
+
+        Returns:
+            tuple: (records, position) where position is the (segment, offset) to pass
+                   to commit() once the records have been delivered.
+        """
+        with self._lock:
+            segment, offset = self._checkpoint
+            active = self._active_segment
+        records = []
+        while len(records) < max_records:
+            path = self._segment_path(segment)
+            if not os.path.exists(path):
+                if segment >= active:
+                    break
+                segment, offset = segment + 1, 0
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while len(records) < max_records:
+                    line = f.readline()
+                    if not line or not line.endswith(b"\n"):
+                        break  # End of file, or a record still being written
+                    offset += len(line)
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        self.corrupt_records += 1
+                        logger.error("Skipping corrupt telemetry record in %s at offset %d", path, offset - len(line))
+                at_eof = not f.read(1)
+            if len(records) >= max_records or not at_eof or segment >= active:
+                break
+            segment, offset = segment + 1, 0
+        return records, (segment, offset)
+
+    def commit(self, position: Tuple[int, int]) -> None:
+        """
+        Durably records that everything before position has been delivered and
+        removes segments that are now fully delivered.
+        """
+        with self._lock:
+            self._checkpoint = position
+            tmp_path = os.path.join(self.directory, _CHECKPOINT_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"segment": position[0], "offset": position[1]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, _CHECKPOINT_FILE))
+            for number in self._segment_numbers():
+                if number < position[0]:
+                    os.remove(self._segment_path(number))
+            self._fsync_directory()
+
+    @property
+    def checkpoint(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._checkpoint
+
+    def pending_bytes(self) -> int:
+        """
+        Returns the number of bytes on disk not yet committed as delivered.
+        """
+        with self._lock:
+            segment, offset = self._checkpoint
+            total = 0
+            for number in self._segment_numbers():
+                if number >= segment:
+                    total += os.path.getsize(self._segment_path(number))
+            return max(total - offset, 0)
+
+    # ── helpers ───────────────────────────────────────────────────────────────
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:012d}.jsonl")
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _load_checkpoint(self) -> Tuple[int, int]:
+        path = os.path.join(self.directory, _CHECKPOINT_FILE)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            segments = self._segment_numbers()
+            return (segments[0] if segments else 1), 0
+
+    def _repair_tail(self, number: int) -> None:
+        # A crash mid-append can leave a partial last line; drop it so the next
+        # append starts on a clean line boundary.
+        path = self._segment_path(number)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _fsync_directory(self) -> None:
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)